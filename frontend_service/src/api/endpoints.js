@@ -1,6 +1,21 @@
 import { userClient, teamClient, taskClient } from './axios';
 
 const USER_BASE_URL = 'http://localhost:8001';
+const TASK_BASE_URL = 'http://localhost:8003';
+
+// List endpoints are paginated: while there are more items, the response carries
+// an X-Next-Cursor header. This follows it and returns every page merged in `data`.
+const fetchAllPages = async (client, url, params = {}) => {
+    let response = await client.get(url, { params });
+    const data = [...response.data];
+    let cursor = response.headers['x-next-cursor'];
+    while (cursor) {
+        response = await client.get(url, { params: { ...params, cursor } });
+        data.push(...response.data);
+        cursor = response.headers['x-next-cursor'];
+    }
+    return { ...response, data };
+};
 
 export const api = {
     auth: {
@@ -17,9 +32,15 @@ export const api = {
         getMe: () => userClient.get('/users/me'),
     },
     users: {
-        getAll: () => userClient.get('/users'),
+        getAll: () => fetchAllPages(userClient, '/users'),
         getOne: (username) => userClient.get(`/users/${username}`),
+        // Typeahead: users whose username, name or email starts with prefix. params: { role, active, limit }
+        search: (prefix, params = {}) => userClient.get('/users/search', { params: { prefix, ...params } }),
         activate: (username) => userClient.patch(`/users/${username}/activate`),
+        // One request for many users: { activated, already_active, not_found }
+        batchActivate: (usernames) => userClient.post('/users/batch/activate', { usernames }),
+        // [{ username, exists, active, role }] in the order given
+        batchLookup: (usernames) => userClient.post('/users/batch/lookup', { usernames }),
         deactivate: (username) => userClient.patch(`/users/${username}/deactivate`),
         delete: (username) => userClient.delete(`/users/${username}`),
         updateRole: (username, newRole) => userClient.patch(`/users/${username}/role`, { role: newRole }),
@@ -29,11 +50,12 @@ export const api = {
             headers: { 'Content-Type': 'multipart/form-data' }
         }),
         // This function needs the constant defined above!
-        getAvatarUrl: (username) => `${USER_BASE_URL}/users/${username}/avatar`,
+        // size (px): the server picks the closest pre-rendered thumbnail that is at least that big
+        getAvatarUrl: (username, size) => `${USER_BASE_URL}/users/${username}/avatar${size ? `?size=${size}` : ''}`,
         deleteAvatar: () => userClient.delete('/users/me/avatar'),
     },
     teams: {
-        getAll: () => teamClient.get('/teams'),
+        getAll: () => fetchAllPages(teamClient, '/teams'),
         getOne: (id) => teamClient.get(`/teams/${id}`),
         create: (data) => teamClient.post('/teams', data),
         update: (id, data) => teamClient.patch(`/teams/${id}`, data),
@@ -44,16 +66,24 @@ export const api = {
         assignLeader: (teamId, username) => teamClient.patch(`/teams/${teamId}/assign-leader`, { new_leader_username: username }),    
     },
     tasks: {
-        getMyTasks: (filters = {}) => taskClient.get('/tasks/me', { params: filters }),
-        getByTeam: (teamId, filters = {}) => taskClient.get(`/tasks/team/${teamId}`, { params: filters }),
+        getMyTasks: (filters = {}) => fetchAllPages(taskClient, '/tasks/me', filters),
+        getByTeam: (teamId, filters = {}) => fetchAllPages(taskClient, `/tasks/team/${teamId}`, filters),
+        // { total, by_status, by_priority }, kept up to date by the task service (no listing needed)
+        getMyStats: () => taskClient.get('/tasks/stats/me'),
+        getTeamStats: (teamId) => taskClient.get(`/tasks/stats/team/${teamId}`),
+        // Tasks of all your teams by title / description / comments, best match first: { tasks, teams }
+        search: (q, params = {}) => taskClient.get('/tasks/search', { params: { q, ...params } }),
         create: (data) => taskClient.post('/tasks', data),
         getDetails: (id) => taskClient.get(`/tasks/${id}`),
         updateDetails: (id, data) => taskClient.patch(`/tasks/${id}`, data),
+        // Many tasks in one request, results per item: { succeeded, failed, results: [{ index, status_code, task, detail }] }
+        bulkCreate: (tasks) => taskClient.post('/tasks/bulk', { tasks }),
+        bulkUpdate: (updates) => taskClient.patch('/tasks/bulk', { updates }),
         updateStatus: (taskId, status) => taskClient.patch(`/tasks/${taskId}/status`, { status }),
         delete: (id) => taskClient.delete(`/tasks/${id}`),
         
         addComment: (taskId, text) => taskClient.post(`/tasks/${taskId}/comments`, { text }),
-        getComments: (taskId) => taskClient.get(`/tasks/${taskId}/comments`),
+        getComments: (taskId) => fetchAllPages(taskClient, `/tasks/${taskId}/comments`),
         deleteComment: (taskId, commentId) => taskClient.delete(`/tasks/${taskId}/comments/${commentId}`),
 
         uploadAttachment: (taskId, formData) => taskClient.post(`/tasks/${taskId}/attachments`, formData, {
@@ -65,8 +95,21 @@ export const api = {
         }), 
         deleteAttachment: (taskId, attachmentId) => taskClient.delete(`/tasks/${taskId}/attachments/${attachmentId}`),
 
-        getNotifications: () => taskClient.get('/tasks/notifications'),
+        // params.since = newest notification id we have: only newer ones come back (polling fallback)
+        getNotifications: (params = {}) => taskClient.get('/tasks/notifications', { params }),
+        // Server-Sent Events. EventSource can't send headers, so the token goes in the query string.
+        getNotificationStreamUrl: (lastEventId) => {
+            const params = new URLSearchParams({ token: localStorage.getItem('token') || '' });
+            if (lastEventId) params.append('last_event_id', lastEventId);
+            return `${TASK_BASE_URL}/tasks/notifications/stream?${params}`;
+        },
+        getUnreadCount: () => taskClient.get('/tasks/notifications/unread-count'), // { unread }
         markNotificationRead: (id) => taskClient.patch(`/tasks/notifications/${id}/read`),
+        markAllNotificationsRead: () => taskClient.patch('/tasks/notifications/read-all'),
         clearNotifications: () => taskClient.delete('/tasks/notifications'), // <--- ADD THIS
+    },
+    dashboard: {
+        // { total_tasks, by_status, by_priority, overdue, upcoming, teams, total_teams } in one call
+        getSummary: () => taskClient.get('/dashboard/summary'),
     }
 };
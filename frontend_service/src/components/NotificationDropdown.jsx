@@ -10,21 +10,100 @@ export default function NotificationDropdown() {
   const dropdownRef = useRef(null);
 
   // --- 1. FETCH NOTIFICATIONS ---
+  // The badge only needs the unread count; the list itself is loaded the first time the dropdown opens.
+  const [listLoaded, setListLoaded] = useState(false);
+  const newestIdRef = useRef(null);
+
+  // Adds new notifications on top of the list (newest first), ignoring ones we already have
+  const mergeNotifications = (incoming) => {
+    if (incoming.length === 0) return;
+    setNotifications(prev => {
+      const known = new Set(prev.map(n => n.id));
+      const fresh = incoming.filter(n => !known.has(n.id));
+      return fresh.length > 0 ? [...fresh.sort((a, b) => (a.id < b.id ? 1 : -1)), ...prev] : prev;
+    });
+  };
+
+  const fetchUnreadCount = async () => {
+    try {
+      const { data } = await api.tasks.getUnreadCount();
+      setUnreadCount(data.unread);
+    } catch (err) {
+      console.error("Failed to fetch unread notifications count", err);
+    }
+  };
+
   const fetchNotifications = async () => {
     try {
       const { data } = await api.tasks.getNotifications(); 
       setNotifications(data);
-      setUnreadCount(data.filter(n => !n.is_read).length);
+      if (data.length > 0) newestIdRef.current = data[0].id;
+      setListLoaded(true);
     } catch (err) {
       console.error("Failed to fetch notifications", err);
     }
   };
 
-  // --- 2. POLLING (Fake Real-Time) ---
   useEffect(() => {
-    fetchNotifications(); 
-    const interval = setInterval(fetchNotifications, 30000);
-    return () => clearInterval(interval);
+    if (isOpen && !listLoaded) fetchNotifications();
+  }, [isOpen]);
+
+  // --- 2. LIVE UPDATES ---
+  // New notifications are pushed over Server-Sent Events. The browser reconnects a dropped
+  // stream by itself and the server replays what was missed (Last-Event-ID).
+  // The stream only pushes what is created after it is open, so the count is read then:
+  // whatever was created before the connection is in it.
+  // Without EventSource, or if the stream is refused, we poll the count (and what's new since
+  // the newest notification we have, once the list is loaded).
+  useEffect(() => {
+    let source = null;
+    let interval = null;
+
+    const pollNewNotifications = async () => {
+      fetchUnreadCount();
+      if (!newestIdRef.current) return;
+      try {
+        const { data } = await api.tasks.getNotifications({ since: newestIdRef.current });
+        if (data.length > 0) newestIdRef.current = data[0].id;
+        mergeNotifications(data);
+      } catch (err) {
+        console.error("Failed to fetch notifications", err);
+      }
+    };
+
+    const startPolling = () => {
+      if (interval) return;
+      pollNewNotifications();
+      interval = setInterval(pollNewNotifications, 30000);
+    };
+
+    if (window.EventSource) {
+      let receivedEvent = false;
+      source = new EventSource(api.tasks.getNotificationStreamUrl());
+      source.onopen = () => {
+        // Until an event has been received the browser has no Last-Event-ID to resume from,
+        // so nothing is replayed: (re)read the count. After that the replay covers the gap.
+        if (!receivedEvent) fetchUnreadCount();
+      };
+      source.addEventListener('notification', (event) => {
+        const note = JSON.parse(event.data);
+        receivedEvent = true;
+        newestIdRef.current = note.id;
+        mergeNotifications([note]);
+        if (!note.is_read) setUnreadCount(prev => prev + 1);
+      });
+      source.onerror = () => {
+        // CLOSED means the browser gave up (e.g. 401): fall back to polling
+        if (source.readyState === EventSource.CLOSED) startPolling();
+      };
+    } else {
+      startPolling();
+    }
+
+    return () => {
+      if (source) source.close();
+      if (interval) clearInterval(interval);
+    };
   }, []);
 
   // --- 3. CLICK OUTSIDE TO CLOSE ---
@@ -39,19 +118,31 @@ export default function NotificationDropdown() {
   }, [dropdownRef]);
 
   // --- 4. MARK AS READ HANDLER ---
-  const handleMarkRead = async (noteId) => {
+  const handleMarkRead = async (note) => {
     try {
-      await api.tasks.markNotificationRead(noteId);
-      setNotifications(prev => prev.map(n => 
-        n.id === noteId ? { ...n, is_read: true } : n
-      ));
-      setUnreadCount(prev => Math.max(0, prev - 1));
+      if (!note.is_read) {
+        await api.tasks.markNotificationRead(note.id);
+        setNotifications(prev => prev.map(n => 
+          n.id === note.id ? { ...n, is_read: true } : n
+        ));
+        setUnreadCount(prev => Math.max(0, prev - 1));
+      }
       setIsOpen(false);
     } catch (err) {
       console.error("Failed to mark read");
     }
   };
 
+  const handleMarkAllRead = async () => {
+    try {
+      await api.tasks.markAllNotificationsRead();
+      setNotifications(prev => prev.map(n => ({ ...n, is_read: true })));
+      setUnreadCount(0);
+    } catch (err) {
+      console.error("Failed to mark notifications read", err);
+    }
+  };
+
   // --- 5. NEW: CLEAR ALL HANDLER ---
   const handleClearAll = async () => {
     try {
@@ -96,15 +187,26 @@ export default function NotificationDropdown() {
                 <span className="text-xs text-gray-500">({unreadCount} unread)</span>
             </div>
 
-            {/* NEW CLEAR ALL BUTTON */}
-            {notifications.length > 0 && (
-                <button 
-                    onClick={handleClearAll}
-                    className="text-[10px] flex items-center text-red-500 hover:text-red-700 hover:bg-red-50 px-2 py-1 rounded transition"
-                >
-                    <Trash2 className="w-3 h-3 mr-1" /> Clear all
-                </button>
-            )}
+            <div className="flex items-center gap-1">
+                {unreadCount > 0 && (
+                    <button 
+                        onClick={handleMarkAllRead}
+                        className="text-[10px] flex items-center text-blue-500 hover:text-blue-700 hover:bg-blue-50 px-2 py-1 rounded transition"
+                    >
+                        <Check className="w-3 h-3 mr-1" /> Mark all read
+                    </button>
+                )}
+
+                {/* NEW CLEAR ALL BUTTON */}
+                {notifications.length > 0 && (
+                    <button 
+                        onClick={handleClearAll}
+                        className="text-[10px] flex items-center text-red-500 hover:text-red-700 hover:bg-red-50 px-2 py-1 rounded transition"
+                    >
+                        <Trash2 className="w-3 h-3 mr-1" /> Clear all
+                    </button>
+                )}
+            </div>
           </div>
 
           {/* LIST */}
@@ -114,7 +216,7 @@ export default function NotificationDropdown() {
                 <Link 
                   key={note.id}
                   to={note.link}
-                  onClick={() => handleMarkRead(note.id)}
+                  onClick={() => handleMarkRead(note)}
                   className={`block p-3 hover:bg-gray-50 border-b border-gray-50 transition-colors
                     ${!note.is_read ? 'bg-blue-50/50' : 'bg-white'}
                   `}
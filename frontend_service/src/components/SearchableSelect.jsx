@@ -6,10 +6,14 @@ export default function SearchableSelect({
     value, 
     onChange, 
     placeholder = "Select...", 
-    multiple = false 
+    multiple = false,
+    // optional (term) => Promise<options>: the options come from the server as you type
+    // instead of filtering `options` (which then only labels the selected values)
+    loadOptions = null
 }) {
   const [isOpen, setIsOpen] = useState(false);
   const [searchTerm, setSearchTerm] = useState('');
+  const [loadedOptions, setLoadedOptions] = useState([]);
   const wrapperRef = useRef(null);
 
   // Κλείσιμο όταν κάνουμε κλικ έξω
@@ -23,9 +27,30 @@ export default function SearchableSelect({
     return () => document.removeEventListener("mousedown", handleClickOutside);
   }, [wrapperRef]);
 
-  const filteredOptions = options.filter(option =>
-    option.label.toLowerCase().includes(searchTerm.toLowerCase())
-  );
+  useEffect(() => {
+    if (!loadOptions || !isOpen) return;
+    if (!searchTerm.trim()) {
+      setLoadedOptions([]);
+      return;
+    }
+    // short pause so fast typing is one request; answers to older terms are dropped
+    let cancelled = false;
+    const timer = setTimeout(async () => {
+      try {
+        const result = await loadOptions(searchTerm.trim());
+        if (!cancelled) setLoadedOptions(result);
+      } catch (err) {
+        console.error("Failed to load options", err);
+      }
+    }, 150);
+    return () => { cancelled = true; clearTimeout(timer); };
+  }, [loadOptions, searchTerm, isOpen]);
+
+  const filteredOptions = loadOptions
+    ? loadedOptions
+    : options.filter(option =>
+        option.label.toLowerCase().includes(searchTerm.toLowerCase())
+      );
 
   // --- HANDLERS ---
   const handleSelect = (optionValue) => {
@@ -138,7 +163,7 @@ export default function SearchableSelect({
               })
             ) : (
               <div className="px-4 py-3 text-sm text-gray-500 text-center">
-                No results found.
+                {loadOptions && !searchTerm.trim() ? "Type a name, username or email..." : "No results found."}
               </div>
             )}
           </div>
@@ -15,8 +15,7 @@ export default function AdminTeamDetailsPage() {
   // Data States
   const [team, setTeam] = useState(null);
   const [tasks, setTasks] = useState([]);
-  const [leaders, setLeaders] = useState([]); 
-  const [allUsers, setAllUsers] = useState([]); 
+  const [taskStats, setTaskStats] = useState(null); // counts of all the team's tasks, whatever the filters
   
   // UI States
   const [loading, setLoading] = useState(true);
@@ -61,17 +60,15 @@ export default function AdminTeamDetailsPage() {
   useEffect(() => {
     const initData = async () => {
       try {
-        const [teamRes, usersRes] = await Promise.all([
+        const [teamRes, statsRes] = await Promise.all([
           api.teams.getOne(teamId),
-          api.users.getAll()
+          api.tasks.getTeamStats(teamId)
         ]);
         
         setTeam(teamRes.data);
+        setTaskStats(statsRes.data);
         setEditForm({ name: teamRes.data.name, description: teamRes.data.description });
         
-        setAllUsers(usersRes.data.filter(u => u.active));
-        setLeaders(usersRes.data.filter(u => u.role === 'team_leader'));
-        
         await fetchTasks();
 
       } catch (err) {
@@ -175,16 +172,17 @@ export default function AdminTeamDetailsPage() {
   if (loading) return <div className="p-8 text-center text-text-main">Loading Team...</div>;
   if (!team) return null;
 
-  const leaderOptions = allUsers
-    .filter(u => team.member_ids.includes(u.username))
-    .map(u => ({ 
-        value: u.username, 
-        label: `${u.username} (${u.first_name} ${u.last_name}) - [${u.role}]` 
-    }));
-  
-  const availableMembersOptions = allUsers
-    .filter(u => !team.member_ids.includes(u.username))
-    .map(u => ({ value: u.username, label: `${u.username} (${u.first_name} ${u.last_name})` }));
+  // only members can become leader: the team already lists them (team_service checks the user)
+  const leaderOptions = team.member_ids.map(member => ({ value: member, label: member }));
+
+  // active users that aren't in the team yet, searched on the server as the admin types
+  const searchAvailableUsers = async (prefix) => {
+    const { data } = await api.users.search(prefix, { active: true });
+    return data
+      .filter(u => !team.member_ids.includes(u.username))
+      .map(u => ({ value: u.username, label: `${u.username} (${u.first_name} ${u.last_name})` }));
+  };
+  const selectedUserOptions = selectedNewMember ? [{ value: selectedNewMember, label: selectedNewMember }] : [];
 
   return (
     <div>
@@ -229,7 +227,7 @@ export default function AdminTeamDetailsPage() {
         <div className="mt-6 flex flex-wrap gap-6 text-sm text-text-muted border-t pt-4">
             <div className="flex items-center"><Calendar className="w-4 h-4 mr-2" /> Created: {new Date(team.created_at).toLocaleDateString('en-GB')}</div>
             <div className="flex items-center"><Users className="w-4 h-4 mr-2" /> Members: {team.member_ids.length}</div>
-            <div className="flex items-center"><Briefcase className="w-4 h-4 mr-2" /> Total Tasks: {tasks.length}</div>
+            <div className="flex items-center"><Briefcase className="w-4 h-4 mr-2" /> Total Tasks: {taskStats?.total ?? tasks.length}</div>
         </div>
       </div>
 
@@ -271,7 +269,7 @@ export default function AdminTeamDetailsPage() {
 
                 {isAddingMember && (
                     <div className="mb-4 p-2 bg-gray-50 rounded border border-gray-200">
-                        <SearchableSelect options={availableMembersOptions} value={selectedNewMember} onChange={setSelectedNewMember} placeholder="Select user..." />
+                        <SearchableSelect options={selectedUserOptions} loadOptions={searchAvailableUsers} value={selectedNewMember} onChange={setSelectedNewMember} placeholder="Select user..." />
                         <div className="flex justify-end space-x-2 mt-2">
                             <button onClick={() => setIsAddingMember(false)} className="text-xs text-gray-500">Cancel</button>
                             <button onClick={handleAddMember} disabled={!selectedNewMember} className="text-xs bg-primary text-text-on-primary px-2 py-1 rounded">Add</button>
@@ -11,7 +11,6 @@ export default function AdminTeamsPage() {
   const { ask } = useConfirm(); 
 
   const [teams, setTeams] = useState([]);
-  const [allUsers, setAllUsers] = useState([]); 
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState('');
   
@@ -40,14 +39,8 @@ export default function AdminTeamsPage() {
   const fetchData = async () => {
     setLoading(true);
     try {
-      const [teamsRes, usersRes] = await Promise.all([
-        api.teams.getAll(),
-        api.users.getAll()
-      ]);
-
-      setTeams(teamsRes.data);
-      const activeUsers = usersRes.data.filter(u => u.active); 
-      setAllUsers(activeUsers);
+      const { data } = await api.teams.getAll();
+      setTeams(data);
 
     } catch (err) {
       console.error(err);
@@ -61,10 +54,22 @@ export default function AdminTeamsPage() {
     fetchData();
   }, []);
 
-  const userOptions = allUsers.map(user => ({
-    value: user.username,
-    label: `${user.username} (${user.first_name} ${user.last_name}) - [${user.role}]`
-  }));
+  // the filter only needs the current leaders, which the teams already tell us
+  const leaderOptions = [...new Set(teams.map(team => team.leader_id))]
+    .sort()
+    .map(username => ({ value: username, label: username }));
+
+  // any active user can lead a new team, searched on the server as the admin types
+  const searchActiveUsers = async (prefix) => {
+    const { data } = await api.users.search(prefix, { active: true });
+    return data.map(user => ({
+      value: user.username,
+      label: `${user.username} (${user.first_name} ${user.last_name}) - [${user.role}]`
+    }));
+  };
+  const selectedLeaderOptions = newTeam.leader_username
+    ? [{ value: newTeam.leader_username, label: newTeam.leader_username }]
+    : [];
 
   const handleCreateTeam = async (e) => {
     e.preventDefault();
@@ -134,7 +139,7 @@ export default function AdminTeamsPage() {
         
         <div className="md:col-span-2">
             <SearchableSelect 
-                options={userOptions}
+                options={leaderOptions}
                 value={selectedLeader}
                 onChange={(val) => setSelectedLeader(val)}
                 placeholder="Search leader..."
@@ -173,11 +178,7 @@ export default function AdminTeamsPage() {
                     <div className="flex items-center">
                         {/* --- AVATAR UPDATED: bg-blue-100 -> bg-brand/20 --- */}
                         <div className="h-8 w-8 rounded-full bg-brand/20 flex items-center justify-center text-brand font-bold text-xs mr-2 overflow-hidden border border-brand/20">
-                          {allUsers.find(u => u.username === team.leader_id)?.avatar_filename ? (
-                              <img src={api.users.getAvatarUrl(team.leader_id)} alt={team.leader_id} className="h-full w-full object-cover" />
-                          ) : (
-                              team.leader_id.substring(0, 2).toUpperCase()
-                          )}
+                          <LeaderAvatar username={team.leader_id} />
                       </div>
                         <span className="text-sm text-text-main font-medium">{team.leader_id}</span>
                     </div>
@@ -251,7 +252,8 @@ export default function AdminTeamsPage() {
                     <div>
                         <label className="block text-sm font-medium text-text-main mb-1">Assign Leader *</label>
                         <SearchableSelect 
-                            options={userOptions}
+                            options={selectedLeaderOptions}
+                            loadOptions={searchActiveUsers}
                             value={newTeam.leader_username} 
                             onChange={(val) => setNewTeam({...newTeam, leader_username: val})} 
                             placeholder="Search for a user..."
@@ -269,7 +271,7 @@ export default function AdminTeamsPage() {
                         {/* --- BUTTON UPDATED --- */}
                         <button 
                             type="submit"
-                            disabled={creating || allUsers.length === 0}
+                            disabled={creating}
                             className="px-4 py-2 text-sm font-medium text-text-on-primary bg-primary hover:bg-primary-hover rounded-md transition disabled:opacity-50"
                         >
                             {creating ? 'Creating...' : 'Create Team'}
@@ -281,4 +283,22 @@ export default function AdminTeamsPage() {
       )}
     </div>
   );
-}
\ No newline at end of file
+}
+
+// --- HELPER COMPONENT FOR AVATAR ---
+// The leader's picture, or their initials when they have none (the avatar URL answers 404)
+function LeaderAvatar({ username }) {
+    const [error, setError] = useState(false);
+
+    if (error) {
+        return username.substring(0, 2).toUpperCase();
+    }
+    return (
+        <img
+            src={api.users.getAvatarUrl(username, 64)}
+            alt={username}
+            className="h-full w-full object-cover"
+            onError={() => setError(true)}
+        />
+    );
+}
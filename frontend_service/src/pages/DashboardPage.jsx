@@ -11,8 +11,7 @@ export default function DashboardPage() {
   const { user, isAdmin } = useAuth();
   const navigate = useNavigate();
   
-  const [tasks, setTasks] = useState([]);
-  const [teams, setTeams] = useState([]);
+  const [summary, setSummary] = useState(null);
   const [loading, setLoading] = useState(true);
   const [currentTime, setCurrentTime] = useState(new Date()); // New State for Clock
 
@@ -56,12 +55,9 @@ const getSubtitle = () => {
 
     const loadData = async () => {
       try {
-        const [tasksRes, teamsRes] = await Promise.all([
-          api.tasks.getMyTasks(),
-          api.teams.getAll()
-        ]);
-        setTasks(tasksRes.data);
-        setTeams(teamsRes.data);
+        // counts, next due tasks and teams are aggregated by the task service
+        const res = await api.dashboard.getSummary();
+        setSummary(res.data);
       } catch (err) {
         console.error("Failed to load dashboard data", err);
       } finally {
@@ -80,9 +76,11 @@ const getSubtitle = () => {
   if (isAdmin) return null;
   if (loading) return <div className="p-8 text-center text-text-muted">Loading Dashboard...</div>;
 
-  const todoCount = tasks.filter(t => t.status === 'TODO').length;
-  const progressCount = tasks.filter(t => t.status === 'IN_PROGRESS').length;
-  const doneCount = tasks.filter(t => t.status === 'DONE').length;
+  const tasks = summary?.upcoming ?? [];
+  const teams = summary?.teams ?? [];
+  const todoCount = summary?.by_status.TODO ?? 0;
+  const progressCount = summary?.by_status.IN_PROGRESS ?? 0;
+  const doneCount = summary?.by_status.DONE ?? 0;
 
   const getPriorityColor = (p) => {
     if (p === 'URGENT') return 'border-l-red-500';
@@ -129,7 +127,7 @@ const getSubtitle = () => {
                 <StatCard icon={<Clock className="w-6 h-6 text-blue-500" />} label="To Do" value={todoCount} color="bg-blue-50" />
                 <StatCard icon={<Activity className="w-6 h-6 text-orange-500" />} label="In Progress" value={progressCount} color="bg-orange-50" />
                 <StatCard icon={<CheckCircle className="w-6 h-6 text-green-500" />} label="Completed" value={doneCount} color="bg-green-50" />
-                <StatCard icon={<Briefcase className="w-6 h-6 text-purple-500" />} label="your teams" value={teams.length} color="bg-purple-50" />
+                <StatCard icon={<Briefcase className="w-6 h-6 text-purple-500" />} label="your teams" value={summary?.total_teams ?? 0} color="bg-purple-50" />
             </div>
         </div>
 
@@ -137,14 +135,14 @@ const getSubtitle = () => {
         <div className="space-y-4">
             <div className="flex justify-between items-center mb-2">
                 <h2 className="text-lg font-bold text-text-main flex items-center">
-                    <TrendingUp className="w-5 h-5 mr-2 text-brand" /> Recent Tasks
+                    <TrendingUp className="w-5 h-5 mr-2 text-brand" /> Upcoming Tasks
                 </h2>
                 <Link to="/my-tasks" className="text-sm text-brand hover:underline font-medium">View All</Link>
             </div>
 
             <div className="space-y-3">
                 {tasks.length > 0 ? (
-                    tasks.slice(0, 5).map(task => (
+                    tasks.map(task => (
                         <Link 
                             key={task.id} 
                             to={`/teams/${task.team_id}/tasks/${task.id}`}
@@ -185,7 +183,7 @@ const getSubtitle = () => {
 
             <div className="space-y-3">
                 {teams.length > 0 ? (
-                    teams.slice(0, 6).map(team => (
+                    teams.map(team => (
                         <Link 
                             key={team.id} 
                             to={`/teams/${team.id}`}
@@ -196,7 +194,7 @@ const getSubtitle = () => {
                             </div>
                             <div className="flex-1 min-w-0">
                                 <h4 className="font-bold text-text-main text-sm truncate">{team.name}</h4>
-                                <p className="text-xs text-text-muted truncate">{team.member_ids.length} members</p>
+                                <p className="text-xs text-text-muted truncate">{team.member_count} members · {team.open_tasks} open tasks</p>
                             </div>
                             <ArrowRight className="w-4 h-4 text-gray-300 group-hover:text-brand" />
                         </Link>
@@ -1,7 +1,7 @@
 import { useEffect, useState } from 'react';
 import { Link } from 'react-router-dom';
 import { api } from '../api/endpoints';
-import { CheckCircle, Filter, ArrowUpDown, Briefcase, Calendar, Flag } from 'lucide-react';
+import { CheckCircle, Filter, ArrowUpDown, Briefcase, Calendar, Flag, Search } from 'lucide-react';
 
 export default function UserMyTasksPage() {
   const [tasks, setTasks] = useState([]);
@@ -13,6 +13,10 @@ export default function UserMyTasksPage() {
   const [teamFilter, setTeamFilter] = useState('');
   const [sortByDue, setSortByDue] = useState(false);
 
+  // Search (server side, over every team you're in)
+  const [query, setQuery] = useState('');
+  const [searchResults, setSearchResults] = useState(null);
+
   useEffect(() => {
     const fetchTeams = async () => {
       try {
@@ -45,6 +49,24 @@ export default function UserMyTasksPage() {
     fetchTasks();
   }, [statusFilter, sortByDue]);
 
+  useEffect(() => {
+    if (!query.trim()) {
+      setSearchResults(null);
+      return;
+    }
+    // wait for a pause in typing, and ignore the answer to an older query
+    let cancelled = false;
+    const timer = setTimeout(async () => {
+      try {
+        const { data } = await api.tasks.search(query);
+        if (!cancelled) setSearchResults(data);
+      } catch (err) {
+        console.error("Search failed", err);
+      }
+    }, 250);
+    return () => { cancelled = true; clearTimeout(timer); };
+  }, [query]);
+
   const getTeamName = (teamId) => {
     const team = teams.find(t => t.id === teamId);
     return team ? team.name : `Unknown Team (${teamId})`;
@@ -68,6 +90,39 @@ export default function UserMyTasksPage() {
         </h1>
       </div>
 
+      {/* SEARCH */}
+      <div className="relative mb-4">
+        <Search className="w-4 h-4 absolute left-3 top-3 text-text-muted pointer-events-none" />
+        <input
+          type="search"
+          value={query}
+          onChange={(e) => setQuery(e.target.value)}
+          placeholder="Search tasks and comments in your teams..."
+          className="w-full bg-bg-card/70 border-2 border-text-muted/40 text-text-main py-2 pl-9 pr-3 rounded focus:outline-none focus:border-brand text-sm"
+        />
+      </div>
+
+      {searchResults && (
+        <div className="bg-bg-card/95 p-4 rounded-lg shadow-sm border border-bg-card/40 mb-6 space-y-2">
+          {searchResults.teams.map(team => (
+            <Link key={team.id} to={`/teams/${team.id}`} className="flex items-center text-sm text-text-main hover:text-brand">
+              <Briefcase className="w-4 h-4 mr-2 text-text-muted" /> {team.name}
+            </Link>
+          ))}
+          {searchResults.tasks.map(task => (
+            <Link key={task.id} to={`/teams/${task.team_id}/tasks/${task.id}`} className="flex justify-between items-center text-sm text-text-main hover:text-brand">
+              <span className="truncate">{task.title}</span>
+              <span className="text-xs text-text-muted ml-4 flex-shrink-0">
+                {getTeamName(task.team_id)} · {task.matched_in.join(', ')}
+              </span>
+            </Link>
+          ))}
+          {searchResults.tasks.length === 0 && searchResults.teams.length === 0 && (
+            <div className="text-sm text-text-muted italic">Nothing matches "{query}".</div>
+          )}
+        </div>
+      )}
+
       {/* FILTERS */}
       <div className="bg-bg-card/95 p-4 rounded-lg shadow-sm border border-bg-card/40 mb-6 grid grid-cols-1 md:grid-cols-4 gap-4">
         
@@ -16,7 +16,6 @@ export default function UserTeamDetailsPage() {
 
   const [team, setTeam] = useState(null);
   const [tasks, setTasks] = useState([]);
-  const [allUsers, setAllUsers] = useState([]); 
   const [loading, setLoading] = useState(true);
 
   // Permissions
@@ -62,11 +61,7 @@ export default function UserTeamDetailsPage() {
         const [teamRes] = await Promise.all(promises);
         setTeam(teamRes.data);
         setEditForm({ name: teamRes.data.name, description: teamRes.data.description });
-        
-        if (teamRes.data.leader_id === user.username) {
-            const usersRes = await api.users.getAll();
-            setAllUsers(usersRes.data.filter(u => u.active));
-        }
+
 
         await fetchTasks();
 
@@ -158,9 +153,14 @@ export default function UserTeamDetailsPage() {
   if (loading) return <div className="p-8 text-center text-text-main">Loading Team...</div>;
   if (!team) return null;
 
-  const availableUsersOptions = allUsers
-    .filter(u => !team.member_ids.includes(u.username))
-    .map(u => ({ value: u.username, label: `${u.username} (${u.first_name} ${u.last_name})` }));
+  // active users that aren't in the team yet, searched on the server as the leader types
+  const searchAvailableUsers = async (prefix) => {
+    const { data } = await api.users.search(prefix, { active: true });
+    return data
+      .filter(u => !team.member_ids.includes(u.username))
+      .map(u => ({ value: u.username, label: `${u.username} (${u.first_name} ${u.last_name})` }));
+  };
+  const selectedUserOptions = selectedNewMember ? [{ value: selectedNewMember, label: selectedNewMember }] : [];
 
   return (
     <div>
@@ -212,7 +212,7 @@ export default function UserTeamDetailsPage() {
 
                 {isAddingMember && (
                     <div className="mb-4 p-2 bg-gray-50 rounded border border-gray-200">
-                        <SearchableSelect options={availableUsersOptions} value={selectedNewMember} onChange={setSelectedNewMember} placeholder="Select user..." />
+                        <SearchableSelect options={selectedUserOptions} loadOptions={searchAvailableUsers} value={selectedNewMember} onChange={setSelectedNewMember} placeholder="Select user..." />
                         <div className="flex justify-end space-x-2 mt-2">
                             <button onClick={() => setIsAddingMember(false)} className="text-xs text-gray-500">Cancel</button>
                             <button onClick={handleAddMember} disabled={!selectedNewMember} className="text-xs bg-primary text-text-on-primary px-2 py-1 rounded">Add</button>
@@ -429,7 +429,8 @@ function UserAvatar({ username, className }) {
     const [error, setError] = useState(false);
     
     // 2. Generate the image URL directly from the helper function in API
-    const url = api.users.getAvatarUrl(username);
+    // 64px thumbnail: sharp at h-8 (32px) on high-DPI screens
+    const url = api.users.getAvatarUrl(username, 64);
 
     // 3. Fallback: If image fails to load (404), show initials
     if (error) {
@@ -0,0 +1,97 @@
+import os
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from schemas import TeamAccess
+
+# --- Settings ---
+# TTL is the upper bound on how stale a decision can get if an invalidation event from
+# team_service is lost. 0 disables the cache (every check goes to the resolver).
+AUTH_CACHE_TTL_SECONDS = float(os.getenv("AUTH_CACHE_TTL_SECONDS", "30"))
+AUTH_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_CACHE_MAX_ENTRIES", "10000"))
+
+
+class TeamAccessCache:
+    """
+    TTL + LRU cache of (username, team_id) -> TeamAccess decisions.
+    The role from the token is stored with the decision, so a user whose role
+    changed (new token) never gets an old decision back.
+    """
+    def __init__(self, ttl_seconds: float, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._keys_by_team: dict[str, set] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_seconds > 0 and self.max_entries > 0
+
+    def get(self, username: str, role: str, team_id: str) -> Optional[TeamAccess]:
+        if not self.enabled:
+            return None
+        key = (username, team_id)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        cached_role, decision, expires_at = entry
+        if cached_role != role or expires_at <= time.monotonic():
+            self._remove(key)
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return decision
+
+    def set(self, username: str, role: str, team_id: str, decision: TeamAccess):
+        if not self.enabled:
+            return
+        key = (username, team_id)
+        self._entries[key] = (role, decision, time.monotonic() + self.ttl_seconds)
+        self._entries.move_to_end(key)
+        self._keys_by_team.setdefault(team_id, set()).add(key)
+
+        while len(self._entries) > self.max_entries:
+            oldest_key = next(iter(self._entries))
+            self._remove(oldest_key)
+            self.evictions += 1
+
+    def invalidate_team(self, team_id: str) -> int:
+        keys = self._keys_by_team.pop(team_id, set())
+        for key in keys:
+            self._entries.pop(key, None)
+        self.invalidations += 1
+        return len(keys)
+
+    def _remove(self, key: tuple):
+        self._entries.pop(key, None)
+        team_keys = self._keys_by_team.get(key[1])
+        if team_keys is not None:
+            team_keys.discard(key)
+            if not team_keys:
+                del self._keys_by_team[key[1]]
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "ttl_seconds": self.ttl_seconds,
+            "max_entries": self.max_entries,
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+team_access_cache = TeamAccessCache(AUTH_CACHE_TTL_SECONDS, AUTH_CACHE_MAX_ENTRIES)
@@ -0,0 +1,112 @@
+"""
+Task comments live in their own collection, one document per comment:
+    {_id, task_id, text, created_by, created_at}
+
+They used to be $push-ed into tasks.comments, so every read of a task carried its whole
+comment history and busy tasks kept growing towards Mongo's 16 MB document limit.
+Tasks written before the move still have an embedded "comments" array. It is moved out:
+  - online, the first time the comments of such a task are read or deleted (migrate_task_comments),
+  - in the background after startup, for every task (migrate_all_comments),
+  - or on demand:  python comments.py
+Moving a task is idempotent (upsert by the comment _id, then $pull), so an interrupted
+migration is simply run again.
+"""
+import asyncio
+import logging
+import os
+import sys
+from datetime import datetime
+
+from pymongo import UpdateOne
+
+logger = logging.getLogger("task_service")
+
+# --- Settings ---
+COMMENTS_COLLECTION = "task_comments"
+# oldest first, like the embedded array was; ends with _id for the pagination cursor
+COMMENT_SORT = [("created_at", 1), ("_id", 1)]
+COMMENT_MIGRATION_BATCH_SIZE = 100
+# Move the embedded comments of every task out in the background after startup
+COMMENT_MIGRATION_ON_STARTUP = os.getenv("COMMENT_MIGRATION_ON_STARTUP", "true").lower() == "true"
+
+# Projection that tells whether a task still has embedded comments, without reading them all
+LEGACY_COMMENTS_PROBE = {"comments": {"$slice": 1}}
+
+
+def has_legacy_comments(task_doc: dict) -> bool:
+    """ task_doc must have been read with LEGACY_COMMENTS_PROBE in its projection """
+    return bool(task_doc.get("comments"))
+
+
+async def migrate_task_comments(db, task_id) -> int:
+    """ Moves the embedded comments of one task to task_comments. Returns how many were moved. """
+    task_doc = await db["tasks"].find_one({"_id": task_id}, projection={"comments": 1})
+    comments = (task_doc or {}).get("comments") or []
+    if not comments:
+        return 0
+
+    await db[COMMENTS_COLLECTION].bulk_write([
+        UpdateOne(
+            {"_id": comment["_id"]},
+            {"$setOnInsert": {
+                "task_id": task_id,
+                "text": comment.get("text", ""),
+                "created_by": comment.get("created_by"),
+                "created_at": comment.get("created_at") or datetime.now(),
+            }},
+            upsert=True,
+        )
+        for comment in comments
+    ], ordered=False)
+
+    # only the comments we copied, then drop the array once it's empty
+    await db["tasks"].update_one(
+        {"_id": task_id},
+        {"$pull": {"comments": {"_id": {"$in": [comment["_id"] for comment in comments]}}}},
+    )
+    await db["tasks"].update_one({"_id": task_id, "comments": {"$size": 0}}, {"$unset": {"comments": ""}})
+    return len(comments)
+
+
+async def migrate_all_comments(db, batch_size: int = COMMENT_MIGRATION_BATCH_SIZE) -> int:
+    """ Moves the embedded comments of every task. Returns how many comments were moved. """
+    moved = 0
+    last_id = None
+    while True:
+        # walk the tasks in _id order, so each batch starts where the previous one stopped
+        query = {"comments.0": {"$exists": True}}
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        batch = await db["tasks"].find(query, projection={"_id": 1}).sort("_id", 1).to_list(length=batch_size)
+        if not batch:
+            return moved
+        for task_doc in batch:
+            moved += await migrate_task_comments(db, task_doc["_id"])
+        last_id = batch[-1]["_id"]
+
+
+async def run_comment_migration(db):
+    """ Background job started by main.py """
+    try:
+        moved = await migrate_all_comments(db)
+        if moved:
+            logger.info("Moved %s embedded comments to %s", moved, COMMENTS_COLLECTION)
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        # whatever is left is migrated on read, or at the next startup
+        logger.error("Comment migration failed: %s", e)
+
+
+async def _main() -> int:
+    from db import get_database
+    moved = await migrate_all_comments(get_database())
+    print(f"Moved {moved} embedded comments to {COMMENTS_COLLECTION}")
+    return 0
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s [%(name)s] %(message)s")
+    sys.exit(asyncio.run(_main()))
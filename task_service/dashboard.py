@@ -0,0 +1,177 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Annotated, Optional
+
+from fastapi import APIRouter, Depends, Response
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from db import get_database
+from schemas import DashboardSummary, TaskStatus, TokenData
+from security import get_current_user
+from task_stats import USER, get_task_stats
+
+# --- Settings ---
+# The summary is a few KB computed by two aggregations and a stats lookup; a user reloading the dashboard
+# within this many seconds gets the cached copy (and the browser may reuse it as well).
+# 0 disables the cache.
+DASHBOARD_CACHE_TTL_SECONDS = float(os.getenv("DASHBOARD_CACHE_TTL_SECONDS", "15"))
+DASHBOARD_CACHE_MAX_ENTRIES = int(os.getenv("DASHBOARD_CACHE_MAX_ENTRIES", "10000"))
+DASHBOARD_UPCOMING_TASKS = 5
+DASHBOARD_TEAMS = 6
+
+router = APIRouter(prefix="/dashboard")
+
+
+class DashboardCache:
+    """ TTL + LRU cache of username -> DashboardSummary. """
+    def __init__(self, ttl_seconds: float, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_seconds > 0 and self.max_entries > 0
+
+    def get(self, username: str) -> Optional[DashboardSummary]:
+        if not self.enabled:
+            return None
+        entry = self._entries.get(username)
+        if entry is None or entry[1] <= time.monotonic():
+            self._entries.pop(username, None)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(username)
+        self.hits += 1
+        return entry[0]
+
+    def set(self, username: str, summary: DashboardSummary):
+        if not self.enabled:
+            return
+        self._entries[username] = (summary, time.monotonic() + self.ttl_seconds)
+        self._entries.move_to_end(username)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "ttl_seconds": self.ttl_seconds,
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+        }
+
+dashboard_cache = DashboardCache(DASHBOARD_CACHE_TTL_SECONDS, DASHBOARD_CACHE_MAX_ENTRIES)
+
+
+def _task_summary_pipeline(username: str, now: datetime) -> list:
+    # one pass over the user's open tasks (tasks_assignee_* indexes); the counts by status
+    # and priority come from task_stats
+    not_done = {"status": {"$ne": TaskStatus.DONE.value}}
+    return [
+        {"$match": {"assigned_to": username}},
+        {"$facet": {
+            "overdue": [{"$match": {**not_done, "due_date": {"$lt": now}}}, {"$count": "count"}],
+            "upcoming": [
+                {"$match": not_done},
+                {"$sort": {"due_date": 1, "_id": 1}},
+                {"$limit": DASHBOARD_UPCOMING_TASKS},
+                {"$project": {"title": 1, "team_id": 1, "status": 1, "priority": 1, "due_date": 1}},
+            ],
+        }},
+    ]
+
+
+def _team_summary_pipeline(username: str) -> list:
+    # The teams collection belongs to team_service; like the "direct" membership resolver
+    # we only read it. Open tasks are counted per team on the tasks_team_status_due_id index.
+    return [
+        {"$match": {"$or": [{"leader_id": username}, {"member_ids": username}]}},
+        {"$facet": {
+            "total": [{"$count": "count"}],
+            "teams": [
+                {"$sort": {"_id": 1}},
+                {"$limit": DASHBOARD_TEAMS},
+                {"$lookup": {
+                    "from": "tasks",
+                    "let": {"team_id": {"$toString": "$_id"}},
+                    "pipeline": [
+                        {"$match": {"$expr": {"$and": [
+                            {"$eq": ["$team_id", "$$team_id"]},
+                            {"$ne": ["$status", TaskStatus.DONE.value]},
+                        ]}}},
+                        {"$count": "count"},
+                    ],
+                    "as": "open_tasks",
+                }},
+                {"$project": {
+                    "name": 1,
+                    "leader_id": 1,
+                    "member_count": {"$size": {"$ifNull": ["$member_ids", []]}},
+                    "open_tasks": 1,
+                }},
+            ],
+        }},
+    ]
+
+
+def _count(facet: list) -> int:
+    return facet[0]["count"] if facet else 0
+
+
+async def build_dashboard_summary(db, username: str) -> DashboardSummary:
+    now = datetime.now()
+    # the queries run concurrently: one round trip of latency
+    stats, task_facets, team_facets = await asyncio.gather(
+        get_task_stats(db, USER, username),
+        db["tasks"].aggregate(_task_summary_pipeline(username, now)).to_list(length=1),
+        db["teams"].aggregate(_team_summary_pipeline(username)).to_list(length=1),
+    )
+    tasks = task_facets[0] if task_facets else {}
+    teams = team_facets[0] if team_facets else {}
+
+    return DashboardSummary(
+        total_tasks=stats.total,
+        by_status=stats.by_status,
+        by_priority=stats.by_priority,
+        overdue=_count(tasks.get("overdue", [])),
+        upcoming=[{"id": str(task["_id"]), **task} for task in tasks.get("upcoming", [])],
+        total_teams=_count(teams.get("total", [])),
+        teams=[
+            {"id": str(team["_id"]), **team, "open_tasks": _count(team["open_tasks"])}
+            for team in teams.get("teams", [])
+        ],
+        generated_at=now,
+    )
+
+
+@router.get("/summary", response_model=DashboardSummary, tags=["dashboard"])
+async def get_dashboard_summary(
+    response: Response,
+    db: Annotated[AsyncIOMotorDatabase, Depends(get_database)],
+    current_user: Annotated[TokenData, Depends(get_current_user)],
+):
+    """
+    Everything the dashboard shows, in one call: the user's task counts by status and priority,
+    overdue count, next due open tasks, and their teams with the open tasks of each team.
+    May be up to DASHBOARD_CACHE_TTL_SECONDS old.
+    """
+    summary = dashboard_cache.get(current_user.username)
+    if summary is None:
+        summary = await build_dashboard_summary(db, current_user.username)
+        dashboard_cache.set(current_user.username, summary)
+
+    if dashboard_cache.enabled:
+        response.headers["Cache-Control"] = f"private, max-age={int(DASHBOARD_CACHE_TTL_SECONDS)}"
+    return summary
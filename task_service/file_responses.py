@@ -0,0 +1,139 @@
+import mimetypes
+import os
+from email.utils import formatdate, parsedate_to_datetime
+from pathlib import Path
+from typing import Optional
+from urllib.parse import quote
+
+from fastapi import Request, Response
+from fastapi.responses import FileResponse, StreamingResponse
+
+# --- Conditional GET (ETag / Last-Modified -> 304) and single Range requests (206) for files on disk ---
+
+RANGE_CHUNK_SIZE = 64 * 1024
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    # weak comparison, as RFC 9110 asks for If-None-Match
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return etag in candidates
+
+
+def _not_modified(request: Request, etag: str, mtime: float) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # If-None-Match wins over If-Modified-Since when both are sent
+        return _etag_matches(if_none_match, etag)
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return int(mtime) <= since
+    return False
+
+
+def _parse_range(range_header: str, size: int):
+    """
+    Returns (start, end) inclusive for a single "bytes=" range, None to ignore the header
+    (multiple ranges / other units: we just send the whole file), or "unsatisfiable".
+    """
+    unit, _, spec = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, sep, last = spec.strip().partition("-")
+    if not sep:
+        return None
+    try:
+        if first == "":
+            # suffix range: the last N bytes
+            length = int(last)
+            if length <= 0:
+                return "unsatisfiable"
+            return max(0, size - length), size - 1
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        return None
+    if start >= size or start > end:
+        return "unsatisfiable"
+    return start, min(end, size - 1)
+
+
+def _content_disposition(filename: str) -> str:
+    # same format FileResponse uses for full downloads
+    quoted = quote(filename)
+    if quoted != filename:
+        return f"attachment; filename*=utf-8''{quoted}"
+    return f'attachment; filename="{filename}"'
+
+
+def _iter_file_range(path: Path, start: int, end: int):
+    # sync generator: Starlette iterates it in the threadpool
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(RANGE_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def conditional_file_response(
+    request: Request,
+    path: Path,
+    cache_control: str,
+    media_type: Optional[str] = None,
+    etag_value: Optional[str] = None,
+    filename: Optional[str] = None,
+    headers: Optional[dict] = None,
+) -> Response:
+    """
+    Serves a file with a strong ETag (etag_value, e.g. the content hash, or mtime+size),
+    Last-Modified and Cache-Control, answering 304 to matching conditional requests and
+    206 to a single byte range (If-Range is honoured). `headers` are added to every response.
+    """
+    stat_result = os.stat(path)
+    media_type = media_type or mimetypes.guess_type(str(path))[0] or "application/octet-stream"
+    size = stat_result.st_size
+    etag = f'"{etag_value or f"{stat_result.st_mtime_ns:x}-{size:x}"}"'
+    headers = {
+        **(headers or {}),
+        "ETag": etag,
+        "Last-Modified": formatdate(stat_result.st_mtime, usegmt=True),
+        "Cache-Control": cache_control,
+        "Accept-Ranges": "bytes",
+    }
+
+    if _not_modified(request, etag, stat_result.st_mtime):
+        return Response(status_code=304, headers=headers)
+
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (if_range is None or if_range.strip() in (etag, headers["Last-Modified"])):
+        byte_range = _parse_range(range_header, size)
+        if byte_range == "unsatisfiable":
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+        if byte_range is not None:
+            start, end = byte_range
+            partial_headers = {
+                **headers,
+                "Content-Range": f"bytes {start}-{end}/{size}",
+                "Content-Length": str(end - start + 1),
+            }
+            if filename:
+                partial_headers["Content-Disposition"] = _content_disposition(filename)
+            return StreamingResponse(
+                _iter_file_range(path, start, end),
+                status_code=206,
+                media_type=media_type,
+                headers=partial_headers,
+            )
+
+    return FileResponse(path, media_type=media_type, filename=filename, headers=headers, stat_result=stat_result)
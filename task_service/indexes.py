@@ -0,0 +1,160 @@
+"""
+Mongo indexes for the collections owned by task_service (tasks, task_comments, notifications, notification_outbox, attachment_blobs).
+
+ensure_indexes() runs on startup and is idempotent: creating an index that already
+exists with the same keys/name is a no-op in Mongo.
+
+Run this file directly to get an explain() report of the queries behind our routes:
+    python indexes.py            # report only, exits with 1 if any query does a COLLSCAN
+    python indexes.py --create   # create the indexes first, then report
+"""
+import asyncio
+import logging
+import sys
+from datetime import datetime
+
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, IndexModel
+
+from outbox import OUTBOX_RETENTION_SECONDS
+
+logger = logging.getLogger("task_service")
+
+# Every listing is paginated with a keyset cursor that ends with _id (see pagination.py),
+# so the indexes end with _id too and pages come straight off the index, without a SORT stage.
+INDEXES = {
+    "tasks": [
+        # list_my_assigned_tasks, with and without ?status / ?sort_by_due
+        IndexModel([("assigned_to", ASCENDING), ("_id", ASCENDING)], name="tasks_assignee_id"),
+        IndexModel([("assigned_to", ASCENDING), ("due_date", ASCENDING), ("_id", ASCENDING)], name="tasks_assignee_due_id"),
+        IndexModel([("assigned_to", ASCENDING), ("status", ASCENDING), ("due_date", ASCENDING), ("_id", ASCENDING)], name="tasks_assignee_status_due_id"),
+        # list_tasks_by_team, with and without ?status / ?sort_by_due; cleanup_team_tasks
+        IndexModel([("team_id", ASCENDING), ("_id", ASCENDING)], name="tasks_team_id"),
+        IndexModel([("team_id", ASCENDING), ("due_date", ASCENDING), ("_id", ASCENDING)], name="tasks_team_due_id"),
+        IndexModel([("team_id", ASCENDING), ("status", ASCENDING), ("due_date", ASCENDING), ("_id", ASCENDING)], name="tasks_team_status_due_id"),
+        # search_tasks: a word (or word prefix) within the caller's teams (multikey, see search.py)
+        IndexModel([("search_terms", ASCENDING), ("team_id", ASCENDING)], name="tasks_search_terms_team"),
+    ],
+    "task_comments": [
+        # get_all_task_comments (oldest first), delete_task, cleanup_team_tasks
+        IndexModel([("task_id", ASCENDING), ("created_at", ASCENDING), ("_id", ASCENDING)], name="task_comments_task_created_id"),
+    ],
+    "notifications": [
+        # get_my_notifications (newest first), clear_all_notifications
+        IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)], name="notifications_user_created_id"),
+        # get_my_notifications?since=, replay of stream_my_notifications after Last-Event-ID
+        IndexModel([("user_id", ASCENDING), ("_id", ASCENDING)], name="notifications_user_id"),
+        # get_unread_notification_count (answered from the index alone), mark_all_notifications_read
+        IndexModel([("user_id", ASCENDING), ("is_read", ASCENDING)], name="notifications_user_read"),
+        # outbox dispatcher: an entry is delivered once, even when its batch is retried
+        # (notifications created before the outbox have no outbox_id)
+        IndexModel([("outbox_id", ASCENDING)], name="notifications_outbox_id", unique=True, sparse=True),
+    ],
+    "notification_outbox": [
+        # outbox dispatcher (pending entries, oldest first) and the queue depth / lag stats
+        IndexModel([("status", ASCENDING), ("_id", ASCENDING)], name="notification_outbox_status_id"),
+        # idempotency keys sent by other services (entries without a key aren't indexed)
+        IndexModel([("key", ASCENDING)], name="notification_outbox_key", unique=True, sparse=True),
+        # delivered entries are kept OUTBOX_RETENTION_SECONDS, for the deduplication above
+        IndexModel([("delivered_at", ASCENDING)], name="notification_outbox_ttl", expireAfterSeconds=OUTBOX_RETENTION_SECONDS),
+    ],
+    "attachment_blobs": [
+        # storage.collect_garbage: unreferenced blobs released before the grace cutoff
+        IndexModel([("refcount", ASCENDING), ("released_at", ASCENDING)], name="attachment_blobs_gc"),
+    ],
+}
+
+# Indexes created by earlier versions and replaced by the ones above
+OBSOLETE_INDEXES = {
+    "tasks": ["tasks_assignee_due", "tasks_assignee_status_due", "tasks_team_due", "tasks_team_status_due"],
+    "notifications": ["notifications_user_created"],
+}
+
+# (route, collection, filter, sort) - sample values, only the shape matters to the planner
+ROUTE_QUERIES = [
+    ("list_my_assigned_tasks", "tasks", {"assigned_to": "sample_user"}, [("_id", ASCENDING)]),
+    ("list_my_assigned_tasks?sort_by_due", "tasks", {"assigned_to": "sample_user"}, [("due_date", ASCENDING), ("_id", ASCENDING)]),
+    ("list_my_assigned_tasks?status&sort_by_due", "tasks", {"assigned_to": "sample_user", "status": "TODO"}, [("due_date", ASCENDING), ("_id", ASCENDING)]),
+    ("list_tasks_by_team", "tasks", {"team_id": "sample_team"}, [("_id", ASCENDING)]),
+    ("list_tasks_by_team?sort_by_due", "tasks", {"team_id": "sample_team"}, [("due_date", ASCENDING), ("_id", ASCENDING)]),
+    ("list_tasks_by_team?status&sort_by_due", "tasks", {"team_id": "sample_team", "status": "TODO"}, [("due_date", ASCENDING), ("_id", ASCENDING)]),
+    ("cleanup_team_tasks", "tasks", {"team_id": "sample_team"}, None),
+    ("get_all_task_comments", "task_comments", {"task_id": "sample_task"}, [("created_at", ASCENDING), ("_id", ASCENDING)]),
+    ("get_my_notifications", "notifications", {"user_id": "sample_user"}, [("created_at", DESCENDING), ("_id", DESCENDING)]),
+    ("get_my_notifications?since", "notifications", {"user_id": "sample_user", "_id": {"$gt": ObjectId("000000000000000000000000")}}, [("_id", DESCENDING)]),
+    ("stream_my_notifications (replay)", "notifications", {"user_id": "sample_user", "_id": {"$gt": ObjectId("000000000000000000000000")}}, [("_id", ASCENDING)]),
+    ("get_unread_notification_count", "notifications", {"user_id": "sample_user", "is_read": False}, None),
+    ("dispatch_batch (outbox)", "notification_outbox", {"status": "pending", "next_attempt_at": {"$lte": datetime(2000, 1, 1)}}, [("_id", ASCENDING)]),
+    ("clear_all_notifications", "notifications", {"user_id": "sample_user"}, None),
+]
+
+
+async def ensure_indexes(db):
+    for collection, names in OBSOLETE_INDEXES.items():
+        try:
+            existing = await db[collection].index_information()
+            for name in names:
+                if name in existing:
+                    await db[collection].drop_index(name)
+                    logger.info("Dropped obsolete index %s on %s", name, collection)
+        except Exception as e:
+            logger.error("Could not drop obsolete indexes on %s: %s", collection, e)
+
+    for collection, models in INDEXES.items():
+        try:
+            names = await db[collection].create_indexes(models)
+            logger.info("Indexes ensured on %s: %s", collection, ", ".join(names))
+        except Exception as e:
+            # Never block the service from starting because of an index problem
+            logger.error("Could not create indexes on %s: %s", collection, e)
+
+
+def _plan_stages(plan) -> list:
+    """ Collects every "stage" (and index name) found in an explain() winning plan. """
+    stages = []
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            stage = plan["stage"]
+            if plan.get("indexName"):
+                stage = f"{stage}({plan['indexName']})"
+            stages.append(stage)
+        for value in plan.values():
+            stages.extend(_plan_stages(value))
+    elif isinstance(plan, list):
+        for item in plan:
+            stages.extend(_plan_stages(item))
+    return stages
+
+
+async def explain_route_queries(db) -> list:
+    """ Returns (route, stages, has_collscan) for every query in ROUTE_QUERIES. """
+    report = []
+    for route, collection, query, sort in ROUTE_QUERIES:
+        find_cmd = {"find": collection, "filter": query}
+        if sort:
+            find_cmd["sort"] = dict(sort)
+        result = await db.command("explain", find_cmd, verbosity="queryPlanner")
+        stages = _plan_stages(result["queryPlanner"]["winningPlan"])
+        report.append((route, stages, any(s.startswith("COLLSCAN") for s in stages)))
+    return report
+
+
+async def _main(create: bool) -> int:
+    from db import get_database
+    db = get_database()
+    if create:
+        await ensure_indexes(db)
+
+    collscans = 0
+    for route, stages, has_collscan in await explain_route_queries(db):
+        flag = "COLLSCAN" if has_collscan else "ok"
+        collscans += has_collscan
+        print(f"{flag:<9} {route:<45} {' <- '.join(stages)}")
+    return 1 if collscans else 0
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s [%(name)s] %(message)s")
+    sys.exit(asyncio.run(_main(create="--create" in sys.argv[1:])))
@@ -1,21 +1,68 @@
 from dotenv import load_dotenv
 load_dotenv() # Load environment variables first
 
+import asyncio
 import logging
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 from routes import router as tasks_router
+from dashboard import router as dashboard_router, dashboard_cache
+import http_client
+import metrics
+from db import get_database
+from indexes import ensure_indexes
+from storage import UploadSizeLimitMiddleware, run_blob_gc_forever
+from comments import COMMENT_MIGRATION_ON_STARTUP, run_comment_migration
+from auth_cache import team_access_cache
+from security import resolver_latency
+from notification_hub import notification_hub
+from outbox import get_outbox_stats, run_outbox_dispatcher
+from task_stats import run_task_stats_reconcile_forever
+from search import SEARCH_BACKFILL_ON_STARTUP, run_search_backfill
 
 app = FastAPI(title="Task Management API", version="0.1.0")
 
+# added before CORS so it's inside it: the 413 gets the CORS headers
+app.add_middleware(UploadSizeLimitMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"], allow_credentials=True,
     allow_methods=["*"], allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"], # pagination cursor of list endpoints
 )
+# added last so it's the outermost: the latency includes CORS handling
+app.add_middleware(metrics.MetricsMiddleware)
 
 app.include_router(tasks_router)
+app.include_router(dashboard_router)
+
+# One pooled HTTP client for all calls to user_service / team_service, tied to the app lifecycle.
+# The Mongo indexes are (re)created on every startup, which is a no-op when they already exist.
+# The attachment blob garbage collector runs in the background for the lifetime of the app,
+# and comments still embedded in old tasks are moved to task_comments in the background.
+# The notification outbox dispatcher delivers queued notifications for the lifetime of the app.
+# The task stats are recounted at startup, then periodically, to fix any drift of the counters.
+# Tasks created before search existed get their search terms in the background.
+background_tasks = []
+
+@app.on_event("startup")
+async def on_startup():
+    http_client.get_http_client()
+    await ensure_indexes(get_database())
+    background_tasks.append(asyncio.create_task(run_blob_gc_forever(get_database())))
+    background_tasks.append(asyncio.create_task(run_outbox_dispatcher(get_database())))
+    background_tasks.append(asyncio.create_task(run_task_stats_reconcile_forever(get_database())))
+    if COMMENT_MIGRATION_ON_STARTUP:
+        background_tasks.append(asyncio.create_task(run_comment_migration(get_database())))
+    if SEARCH_BACKFILL_ON_STARTUP:
+        background_tasks.append(asyncio.create_task(run_search_backfill(get_database())))
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    for task in background_tasks:
+        task.cancel()
+    await http_client.close_http_client()
 
 logging.basicConfig(
     level=logging.INFO,
@@ -24,4 +71,19 @@ logging.basicConfig(
 
 @app.get("/health")
 def health():
-    return {"service": "Task Management API", "status": "running"}
\ No newline at end of file
+    return {"service": "Task Management API", "status": "running"}
+
+@app.get("/internal/stats", include_in_schema=False)
+async def internal_stats():
+    return {
+        "http_client": http_client.get_stats(),
+        "team_access_cache": team_access_cache.stats(),
+        "team_access_resolver": resolver_latency.stats(),
+        "dashboard_cache": dashboard_cache.stats(),
+        "notification_streams": notification_hub.stats(),
+        "notification_outbox": await get_outbox_stats(get_database()),
+    }
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
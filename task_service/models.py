@@ -19,9 +19,10 @@ class PyObjectId(ObjectId):
     def __get_pydantic_json_schema__(cls, field_schema, *args, **kwargs):
         field_schema.update(type="string")
 
-# --- Comment Entity ---
+# --- Comment Entity (stored in the task_comments collection, see comments.py) ---
 class Comment(BaseModel):
     id: PyObjectId = Field(default_factory=PyObjectId, alias="_id")
+    task_id: PyObjectId = Field(...)
     text: str = Field(...)
     created_by: str = Field(...) # Username
     created_at: datetime = Field(default_factory=datetime.now)
@@ -33,6 +34,8 @@ class Attachment(BaseModel):
     path: str = Field(...)            # Server-side path on disk
     uploaded_by: str = Field(...)     # Username of uploader
     uploaded_at: datetime = Field(default_factory=datetime.now)
+    size: Optional[int] = None        # Bytes (missing on attachments uploaded before it was recorded)
+    sha256: Optional[str] = None      # Hex digest of the content, computed while streaming the upload
 
 # --- Task Entity ---
 class Task(BaseModel):
@@ -50,9 +53,10 @@ class Task(BaseModel):
     priority: TaskPriority = Field(...) # USE ENUM
     due_date: datetime = Field(...)
     created_at: datetime = Field(default_factory=datetime.now)
-    comments: List[Comment] = Field(default_factory=list)
     # NEW:
     attachments: List[Attachment] = Field(default_factory=list)
+    # Words of the title, description and comments, for GET /tasks/search (see search.py)
+    search_terms: List[str] = Field(default_factory=list)
 
 
 class NotificationType(StrEnum):
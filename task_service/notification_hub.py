@@ -0,0 +1,86 @@
+import asyncio
+import os
+from collections import defaultdict
+from typing import Dict, Optional, Set
+
+from schemas import NotificationOut
+
+# --- Settings ---
+# Comment line sent on idle streams, so proxies and browsers don't close them
+SSE_HEARTBEAT_SECONDS = float(os.getenv("SSE_HEARTBEAT_SECONDS", "25"))
+# Browsers wait this long before reconnecting a dropped stream (sent as the SSE "retry" field)
+SSE_RETRY_MS = 5000
+# Events waiting for a slow client. When its queue is full the stream is closed: the browser
+# reconnects with Last-Event-ID and gets the missed notifications from Mongo instead.
+SUBSCRIBER_QUEUE_SIZE = 100
+
+
+class NotificationHub:
+    """
+    In-process fan-out of new notifications to the open SSE streams (GET /tasks/notifications/stream),
+    keyed by user_id. A user can have several streams (one per tab).
+    Notifications are created by this process only (team_service goes through
+    POST /tasks/notifications/internal), so every stream is fed without a message broker.
+    Only touched from the event loop, no locking needed.
+    """
+    def __init__(self, queue_size: int = SUBSCRIBER_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = defaultdict(set)
+        self.published = 0
+        self.delivered = 0
+        self.overflows = 0
+
+    def subscribe(self, user_id: str) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers[user_id].add(queue)
+        return queue
+
+    def unsubscribe(self, user_id: str, queue: asyncio.Queue):
+        queues = self._subscribers.get(user_id)
+        if queues is None:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self._subscribers[user_id]
+
+    def publish(self, user_id: str, event: dict):
+        """ event: {"id": <notification id>, "data": <NotificationOut JSON>} """
+        self.published += 1
+        for queue in list(self._subscribers.get(user_id, ())):
+            try:
+                queue.put_nowait(event)
+                self.delivered += 1
+            except asyncio.QueueFull:
+                # the stream is closed by the None below; the client resumes from Last-Event-ID
+                self.overflows += 1
+                self.unsubscribe(user_id, queue)
+                queue.get_nowait()
+                queue.put_nowait(None)
+
+    def stats(self) -> dict:
+        return {
+            "users": len(self._subscribers),
+            "streams": sum(len(queues) for queues in self._subscribers.values()),
+            "published": self.published,
+            "delivered": self.delivered,
+            "overflows": self.overflows,
+        }
+
+
+notification_hub = NotificationHub()
+
+
+def notification_event(doc: dict) -> dict:
+    """ Hub event for a notification document as stored in Mongo """
+    out = NotificationOut(id=str(doc["_id"]), **doc)
+    return {"id": out.id, "data": out.model_dump_json()}
+
+
+def format_sse(data: str, event_id: Optional[str] = None, event: Optional[str] = None) -> str:
+    lines = []
+    if event_id:
+        lines.append(f"id: {event_id}")
+    if event:
+        lines.append(f"event: {event}")
+    lines.extend(f"data: {line}" for line in data.splitlines() or [""])
+    return "\n".join(lines) + "\n\n"
@@ -0,0 +1,226 @@
+"""
+Durable notification outbox.
+
+Requests don't write notifications themselves: they enqueue them in notification_outbox
+(one insert_many per request, whatever the number of recipients) and respond.
+A background dispatcher (started by main.py) moves pending entries in batches into the
+notifications collection and pushes them to the open notification streams.
+
+- Each entry becomes a notification with outbox_id = the entry's _id (unique index), so
+  re-running a batch after a crash or a partial failure never creates duplicates.
+- The notification gets a new _id when it's delivered, not when it's queued: clients page and
+  resume the notifications by _id (?since=, Last-Event-ID), so a notification must never
+  appear with an _id older than one already delivered (a retried entry, or two entries
+  committed out of order, would).
+- Entries may carry an idempotency key (unique): other services send one with every delivery,
+  so a retried POST /tasks/notifications/internal is accepted once.
+- Failed entries are retried with exponential backoff; after OUTBOX_MAX_ATTEMPTS they are
+  marked "failed" and left in the collection for inspection.
+- Delivered entries are kept OUTBOX_RETENTION_SECONDS (TTL index) so late retries still dedupe.
+"""
+import asyncio
+import logging
+import os
+from collections import deque
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from models import Notification
+from notification_hub import notification_hub, notification_event
+
+logger = logging.getLogger("task_service")
+
+# --- Settings ---
+OUTBOX_COLLECTION = "notification_outbox"
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "200"))
+# The dispatcher is woken up by every enqueue; this is only the safety net (and the retry clock)
+OUTBOX_POLL_SECONDS = float(os.getenv("OUTBOX_POLL_SECONDS", "1"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "10"))
+OUTBOX_MAX_BACKOFF_SECONDS = 60
+# Delivered entries are kept this long for idempotency-key deduplication
+OUTBOX_RETENTION_SECONDS = int(os.getenv("OUTBOX_RETENTION_SECONDS", str(24 * 3600)))
+
+PENDING = "pending"
+DELIVERED = "delivered"
+FAILED = "failed"
+
+DUPLICATE_KEY = 11000
+
+
+class OutboxStats:
+    """ Counters of this process, reported with the queue depth by /internal/stats. """
+    def __init__(self, size: int = 1000):
+        self.enqueued = 0
+        self.duplicates = 0
+        self.delivered = 0
+        self.batches = 0
+        self.retries = 0
+        self.given_up = 0
+        self.delivery_lag = deque(maxlen=size)  # seconds from enqueue to delivery
+
+    def stats(self) -> dict:
+        ordered = sorted(self.delivery_lag)
+        def percentile(p):
+            if not ordered:
+                return 0.0
+            return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))] * 1000, 3)
+        return {
+            "enqueued": self.enqueued,
+            "duplicates": self.duplicates,
+            "delivered": self.delivered,
+            "batches": self.batches,
+            "retries": self.retries,
+            "given_up": self.given_up,
+            "delivery_lag_p50_ms": percentile(0.50),
+            "delivery_lag_p95_ms": percentile(0.95),
+        }
+
+stats = OutboxStats()
+
+# set by enqueue_notifications, so the dispatcher picks new entries up right away
+_wakeup = asyncio.Event()
+
+
+def _outbox_entry(notification: Notification, key: Optional[str], now: datetime) -> dict:
+    entry = {
+        "_id": notification.id,
+        "notification": notification.model_dump(exclude={"id"}),
+        "status": PENDING,
+        "attempts": 0,
+        "enqueued_at": now,
+        "next_attempt_at": now,
+    }
+    if key:
+        entry["key"] = key
+    return entry
+
+
+async def enqueue_notifications(db, notifications: List[Notification], keys: Optional[List[Optional[str]]] = None) -> int:
+    """
+    Queues the notifications for delivery in a single write. keys (same order) are optional
+    idempotency keys: an entry whose key was already queued is skipped. Returns how many were queued.
+    """
+    if not notifications:
+        return 0
+    now = datetime.now()
+    keys = keys or [None] * len(notifications)
+    entries = [_outbox_entry(note, key, now) for note, key in zip(notifications, keys)]
+
+    duplicates = 0
+    try:
+        await db[OUTBOX_COLLECTION].insert_many(entries, ordered=False)
+    except BulkWriteError as e:
+        errors = e.details.get("writeErrors", [])
+        duplicates = sum(1 for err in errors if err.get("code") == DUPLICATE_KEY)
+        if duplicates != len(errors):
+            raise
+    except DuplicateKeyError:
+        duplicates = len(entries)
+
+    stats.enqueued += len(entries) - duplicates
+    stats.duplicates += duplicates
+    _wakeup.set()
+    return len(entries) - duplicates
+
+
+async def dispatch_batch(db) -> int:
+    """ Delivers up to OUTBOX_BATCH_SIZE due entries. Returns how many entries were processed. """
+    now = datetime.now()
+    batch = await db[OUTBOX_COLLECTION].find(
+        {"status": PENDING, "next_attempt_at": {"$lte": now}}
+    ).sort("_id", 1).to_list(length=OUTBOX_BATCH_SIZE)
+    if not batch:
+        return 0
+
+    documents = [{"_id": ObjectId(), "outbox_id": entry["_id"], **entry["notification"]} for entry in batch]
+    failed = {}  # position -> error
+    already_there = set()
+    try:
+        await db["notifications"].insert_many(documents, ordered=False)
+    except BulkWriteError as e:
+        for err in e.details.get("writeErrors", []):
+            if err.get("code") == DUPLICATE_KEY:
+                # delivered by an earlier attempt that didn't get to mark the entry
+                already_there.add(err["index"])
+            else:
+                failed[err["index"]] = err.get("errmsg", "write failed")
+    except Exception as e:
+        failed = {position: str(e) for position in range(len(batch))}
+
+    delivered_ids = []
+    for position, entry in enumerate(batch):
+        if position in failed:
+            continue
+        delivered_ids.append(entry["_id"])
+        if position not in already_there:
+            notification_hub.publish(documents[position]["user_id"], notification_event(documents[position]))
+        stats.delivery_lag.append((now - entry["enqueued_at"]).total_seconds())
+
+    delivered_at = datetime.now()
+    if delivered_ids:
+        await db[OUTBOX_COLLECTION].update_many(
+            {"_id": {"$in": delivered_ids}},
+            {"$set": {"status": DELIVERED, "delivered_at": delivered_at}},
+        )
+    if failed:
+        await _schedule_retries(db, [(batch[position], error) for position, error in failed.items()], delivered_at)
+
+    stats.delivered += len(delivered_ids)
+    stats.batches += 1
+    return len(batch)
+
+
+async def _schedule_retries(db, failures: list, now: datetime):
+    updates = []
+    for entry, error in failures:
+        attempts = entry["attempts"] + 1
+        if attempts >= OUTBOX_MAX_ATTEMPTS:
+            stats.given_up += 1
+            logger.error("Notification outbox: giving up on %s after %s attempts: %s", entry["_id"], attempts, error)
+            update = {"$set": {"status": FAILED, "attempts": attempts, "last_error": error}}
+        else:
+            stats.retries += 1
+            backoff = min(OUTBOX_MAX_BACKOFF_SECONDS, 2 ** attempts)
+            update = {"$set": {
+                "attempts": attempts,
+                "last_error": error,
+                "next_attempt_at": now + timedelta(seconds=backoff),
+            }}
+        updates.append(UpdateOne({"_id": entry["_id"]}, update))
+    await db[OUTBOX_COLLECTION].bulk_write(updates, ordered=False)
+
+
+async def run_outbox_dispatcher(db):
+    """ Background job started by main.py """
+    while True:
+        _wakeup.clear()
+        try:
+            processed = await dispatch_batch(db)
+        except Exception as e:
+            logger.error("Notification outbox dispatch failed: %s", e)
+            processed = 0
+        if processed < OUTBOX_BATCH_SIZE:
+            # nothing more due: sleep until the next enqueue (or the poll interval for retries)
+            try:
+                await asyncio.wait_for(_wakeup.wait(), timeout=OUTBOX_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+
+async def get_outbox_stats(db) -> dict:
+    """ Queue depth and lag are read from Mongo, so they cover entries queued by any process """
+    depth = await db[OUTBOX_COLLECTION].count_documents({"status": PENDING})
+    oldest = await db[OUTBOX_COLLECTION].find_one(
+        {"status": PENDING}, projection={"enqueued_at": 1}, sort=[("_id", 1)]
+    )
+    lag = (datetime.now() - oldest["enqueued_at"]).total_seconds() if oldest else 0.0
+    return {
+        "depth": depth,
+        "oldest_pending_seconds": round(lag, 3),
+        "failed": await db[OUTBOX_COLLECTION].count_documents({"status": FAILED}),
+        **stats.stats(),
+    }
@@ -1,40 +1,65 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, Depends, HTTPException, status, Header, Query, Request, Response
+from fastapi.responses import FileResponse, StreamingResponse
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from typing import Annotated, List, Optional
+import asyncio
 import os
 from pathlib import Path
 from datetime import datetime # <--- Added datetime
 from bson import ObjectId     # <--- Added ObjectId
+from pydantic import ValidationError
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError
 
 from db import get_database
+from http_client import get_http_client
+from file_responses import conditional_file_response
+from storage import (
+    ATTACHMENT_CACHE_CONTROL, UPLOAD_BASE_DIR, STAGING_DIR, MultipartFileStream, save_upload,
+    add_blob_reference, release_blob_references, count_blob_references
+)
+from pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, fetch_page, set_next_cursor, encode_cursor, decode_cursor
+from serialization import parse_task_fields, task_list_projection, task_list_response
+from notification_hub import notification_hub, notification_event, format_sse, SSE_HEARTBEAT_SECONDS, SSE_RETRY_MS
+from outbox import enqueue_notifications
+from comments import COMMENTS_COLLECTION, COMMENT_SORT, LEGACY_COMMENTS_PROBE, has_legacy_comments, migrate_task_comments
+from task_stats import TASK_STATS_COLLECTION, TEAM, USER, TaskStatsDelta, apply_task_stats, get_task_stats, stats_id
+from search import (
+    SEARCH_MAX_CANDIDATES, task_search_terms, refresh_task_search_terms, add_comment_search_terms,
+    parse_query, search_filter, score_task, searchable_teams
+)
 from schemas import (
     TaskCreate, TaskOut, TokenData, TaskStatus, TaskUpdate,
-    TaskStatusUpdate, Role, CommentIn, CommentOut, AttachmentOut,
-    NotificationOut, NotificationCreateInternal # <--- Added Notification Schemas
+    TaskStatusUpdate, Role, CommentIn, CommentOut, AttachmentOut, TeamAccess,
+    TaskBulkCreate, TaskBulkUpdate, BulkItemResult, BulkResult, TaskStats,
+    SearchResults, TaskSearchHit, TeamSearchHit,
+    NotificationOut, NotificationCreateInternal, NotificationBatchInternal, NotificationBatchResult # <--- Added Notification Schemas
 )
 from models import (
     Task, PyObjectId, Comment, Attachment,
     Notification, NotificationType # <--- Added Notification Models
 )
 from security import (
-    get_current_user, get_validated_team_leader, get_team_access_for_tasks,
-    get_task_leader_only, authorize_comment_deletion
+    get_current_user, get_current_user_for_stream, get_validated_team_leader, get_team_access_for_tasks,
+    get_task_leader_only, authorize_comment_deletion, resolve_team_access
 )
+from auth_cache import team_access_cache
 import httpx
 import logging
 logger = logging.getLogger("task_service")
 
 router = APIRouter(prefix="/tasks")
 
-UPLOAD_BASE_DIR = Path("task_files")
-UPLOAD_BASE_DIR.mkdir(exist_ok=True)
+# TaskOut doesn't include the attachments (nor the comments still embedded in old tasks, nor the search terms),
+# no need to read them from Mongo
+TASK_OUT_PROJECTION = {"comments": 0, "attachments": 0, "search_terms": 0}
+
 
 # ---------------------------------------------------------
 # NOTIFICATION HELPER (NEW)
 # ---------------------------------------------------------
-async def create_notification(db, user_id: str, title: str, message: str, link: str, type: NotificationType):
-    note = Notification(
+def new_notification(user_id: str, title: str, message: str, link: str, type: NotificationType) -> Notification:
+    return Notification(
         user_id=user_id,
         title=title,
         message=message,
@@ -43,20 +68,122 @@ async def create_notification(db, user_id: str, title: str, message: str, link:
         is_read=False,
         created_at=datetime.now()
     )
-    await db["notifications"].insert_one(note.model_dump(by_alias=True))
+
+async def create_notification(db, user_id: str, title: str, message: str, link: str, type: NotificationType):
+    # queued in the outbox: the dispatcher stores it and pushes it to the user's open streams
+    # (GET /tasks/notifications/stream) in the background, see outbox.py
+    await enqueue_notifications(db, [new_notification(user_id, title, message, link, type)])
 
 # ---------------------------------------------------------
 # NOTIFICATION ENDPOINTS (NEW)
 # ---------------------------------------------------------
 @router.get("/notifications", response_model=List[NotificationOut], tags=["notifications"])
 async def get_my_notifications(
+    response: Response,
     db: Annotated[AsyncIOMotorDatabase, Depends(get_database)],
-    current_user: Annotated[TokenData, Depends(get_current_user)]
+    current_user: Annotated[TokenData, Depends(get_current_user)],
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    since: Optional[str] = Query(None, description="Id of the newest notification the client has: only newer ones are returned"),
 ):
-    cursor = db["notifications"].find({"user_id": current_user.username}).sort("created_at", -1).limit(50)
-    notifications = await cursor.to_list(length=50)
+    # newest first; the next page (X-Next-Cursor header) continues with older notifications
+    query = {"user_id": current_user.username}
+    sort = [("created_at", -1), ("_id", -1)]
+    if since:
+        # incremental polling (clients without the stream)
+        try:
+            query["_id"] = {"$gt": ObjectId(since)}
+        except Exception:
+            raise HTTPException(status_code=400, detail="Invalid ID")
+        sort = [("_id", -1)]
+
+    notifications, next_cursor = await fetch_page(
+        db["notifications"],
+        query,
+        sort=sort,
+        limit=limit,
+        cursor=cursor,
+    )
+    set_next_cursor(response, next_cursor)
     return [NotificationOut(id=str(n["_id"]), **n) for n in notifications]
 
+# The badge only needs this number: counted on the (user_id, is_read) index, no document is read
+@router.get("/notifications/unread-count", tags=["notifications"])
+async def get_unread_notification_count(
+    db: Annotated[AsyncIOMotorDatabase, Depends(get_database)],
+    current_user: Annotated[TokenData, Depends(get_current_user)]
+):
+    unread = await db["notifications"].count_documents({"user_id": current_user.username, "is_read": False})
+    return {"unread": unread}
+
+@router.patch("/notifications/read-all", status_code=status.HTTP_204_NO_CONTENT, tags=["notifications"])
+async def mark_all_notifications_read(
+    db: Annotated[AsyncIOMotorDatabase, Depends(get_database)],
+    current_user: Annotated[TokenData, Depends(get_current_user)]
+):
+    await db["notifications"].update_many(
+        {"user_id": current_user.username, "is_read": False},
+        {"$set": {"is_read": True}}
+    )
+    return None
+
+# Server-Sent Events: every new notification of the user is pushed as an event whose id is the
+# notification id. On reconnect the browser sends it back as Last-Event-ID and we replay what was
+# missed from Mongo. An idle stream only costs a heartbeat comment every SSE_HEARTBEAT_SECONDS.
+@router.get("/notifications/stream", tags=["notifications"])
+async def stream_my_notifications(
+    request: Request,
+    db: Annotated[AsyncIOMotorDatabase, Depends(get_database)],
+    current_user: Annotated[TokenData, Depends(get_current_user_for_stream)],
+    last_event_id: Optional[str] = Header(None),
+    resume_after: Optional[str] = Query(None, alias="last_event_id", description="Same as the Last-Event-ID header, for the first connection"),
+):
+    user_id = current_user.username
+    resume_id = last_event_id or resume_after
+    # an unreadable id just means no replay
+    last_sent = ObjectId(resume_id) if resume_id and ObjectId.is_valid(resume_id) else None
+
+    async def events():
+        # subscribe before replaying, so nothing created meanwhile falls in between
+        queue = notification_hub.subscribe(user_id)
+        try:
+            yield f"retry: {SSE_RETRY_MS}\n\n"
+            sent_up_to = last_sent
+            # replay page by page until caught up: a long offline client can have missed any number
+            while sent_up_to is not None:
+                missed = await db["notifications"].find(
+                    {"user_id": user_id, "_id": {"$gt": sent_up_to}}
+                ).sort("_id", 1).to_list(length=MAX_PAGE_SIZE)
+                for doc in missed:
+                    event = notification_event(doc)
+                    yield format_sse(event["data"], event["id"], "notification")
+                    sent_up_to = doc["_id"]
+                if len(missed) < MAX_PAGE_SIZE:
+                    break
+
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=SSE_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        return
+                    yield ": heartbeat\n\n"
+                    continue
+                if event is None:
+                    # too slow to keep up: close, the client reconnects and replays from Mongo
+                    return
+                if sent_up_to is not None and ObjectId(event["id"]) <= sent_up_to:
+                    continue # already sent by the replay
+                yield format_sse(event["data"], event["id"], "notification")
+        finally:
+            notification_hub.unsubscribe(user_id, queue)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @router.patch("/notifications/{note_id}/read", status_code=status.HTTP_204_NO_CONTENT, tags=["notifications"])
 async def mark_notification_read(
     note_id: str,
@@ -74,21 +201,54 @@ async def mark_notification_read(
     )
     return None
 
+def _internal_notification(payload: NotificationCreateInternal) -> Notification:
+    """ Raises ValueError for an unknown type """
+    try:
+        notification_type = NotificationType(payload.type)
+    except ValueError:
+        raise ValueError(f"Unknown notification type '{payload.type}'.")
+    return new_notification(payload.user_id, payload.title, payload.message, payload.link, notification_type)
+
+def _validation_error_message(error: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(str(part) for part in err['loc'])}: {err['msg']}" for err in error.errors())
+
+# Other services retry their deliveries: a payload with an idempotency_key already seen is
+# answered like the first time but queued only once
 @router.post("/notifications/internal", status_code=status.HTTP_201_CREATED, tags=["internal"])
 async def create_internal_notification(
     payload: NotificationCreateInternal,
     db: Annotated[AsyncIOMotorDatabase, Depends(get_database)],
 ):
-    await create_notification(
-        db, 
-        payload.user_id, 
-        payload.title, 
-        payload.message, 
-        payload.link, 
-        NotificationType(payload.type)
-    )
+    try:
+        notification = _internal_notification(payload)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    await enqueue_notifications(db, [notification], [payload.idempotency_key])
     return {"status": "ok"}
 
+# An invalid item doesn't fail the batch: the valid ones are queued and the invalid ones are
+# reported by index, so the sender gives up on those instead of retrying the whole batch
+@router.post("/notifications/internal/batch", response_model=NotificationBatchResult, status_code=status.HTTP_201_CREATED, tags=["internal"])
+async def create_internal_notifications(
+    payload: NotificationBatchInternal,
+    db: Annotated[AsyncIOMotorDatabase, Depends(get_database)],
+):
+    notifications, keys, rejected = [], [], []
+    for index, item in enumerate(payload.notifications):
+        try:
+            note = NotificationCreateInternal.model_validate(item)
+            notifications.append(_internal_notification(note))
+        except ValidationError as e:
+            rejected.append({"index": index, "error": _validation_error_message(e)})
+            continue
+        except ValueError as e:
+            rejected.append({"index": index, "error": str(e)})
+            continue
+        keys.append(note.idempotency_key)
+
+    queued = await enqueue_notifications(db, notifications, keys)
+    return NotificationBatchResult(queued=queued, duplicates=len(notifications) - queued, rejected=rejected)
+
 @router.delete("/notifications", status_code=status.HTTP_204_NO_CONTENT, tags=["notifications"])
 async def clear_all_notifications(
     db: Annotated[AsyncIOMotorDatabase, Depends(get_database)],
@@ -107,6 +267,9 @@ async def clear_all_notifications(
 # EXISTING TASK ROUTES
 # ---------------------------------------------------------
 
+# The listings return a plain JSON list built from the projected documents (see serialization.py);
+# ?fields= trims every item to the requested TaskOut fields.
+
 # User can view all the tasks assigned to them, from all teams
 @router.get("/me", response_model=List[TaskOut], tags=["tasks"])
 async def list_my_assigned_tasks(
@@ -114,27 +277,27 @@ async def list_my_assigned_tasks(
     current_user: Annotated[TokenData, Depends(get_current_user)],
     status: Optional[TaskStatus] = None, 
     sort_by_due: Optional[bool] = False, 
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = Query(None, description="Comma separated TaskOut fields to return, e.g. title,status,due_date (id is always included)"),
 ):
+    task_fields = parse_task_fields(fields)
     query = {"assigned_to": current_user.username}
     
     if status:
         query["status"] = status.value 
         
+    # _id is always the last sort key, so the pagination cursor points to a unique position
     sort_criteria = []
     if sort_by_due:
         sort_criteria.append(("due_date", 1))
+    sort_criteria.append(("_id", 1))
 
-    tasks_cursor = db["tasks"].find(query)
-    
-    if sort_criteria: 
-        tasks_cursor = tasks_cursor.sort(sort_criteria)
-
-    tasks = await tasks_cursor.to_list(length=100)
-    
-    if not tasks:
-        return []
-
-    return [TaskOut(id=str(task["_id"]), **task) for task in tasks]
+    tasks, next_cursor = await fetch_page(
+        db["tasks"], query, sort_criteria, limit, cursor,
+        projection=task_list_projection(task_fields, sort_criteria)
+    )
+    return task_list_response(tasks, task_fields, next_cursor)
 
 # User can see all the tasks of their team
 @router.get("/team/{team_id}", response_model=List[TaskOut], tags=["tasks"])
@@ -143,7 +306,11 @@ async def list_tasks_by_team(
     validated_team_id: Annotated[str, Depends(get_team_access_for_tasks)], 
     status: Optional[TaskStatus] = None, 
     sort_by_due: Optional[bool] = False,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = Query(None, description="Comma separated TaskOut fields to return, e.g. title,status,due_date (id is always included)"),
 ):
+    task_fields = parse_task_fields(fields)
     query = {"team_id": validated_team_id}
     
     if status:
@@ -152,18 +319,76 @@ async def list_tasks_by_team(
     sort_criteria = []
     if sort_by_due:
         sort_criteria.append(("due_date", 1))
+    sort_criteria.append(("_id", 1))
 
-    tasks_cursor = db["tasks"].find(query)
-    
-    if sort_criteria: 
-        tasks_cursor = tasks_cursor.sort(sort_criteria)
+    tasks, next_cursor = await fetch_page(
+        db["tasks"], query, sort_criteria, limit, cursor,
+        projection=task_list_projection(task_fields, sort_criteria)
+    )
+    return task_list_response(tasks, task_fields, next_cursor)
 
-    tasks = await tasks_cursor.to_list(length=100)
-    
-    if not tasks:
-        return []
 
-    return [TaskOut(id=str(task["_id"]), **task) for task in tasks]
+# Counts of tasks by status and priority, read from the task_stats collection (see task_stats.py)
+@router.get("/stats/me", response_model=TaskStats, tags=["tasks"])
+async def get_my_task_stats(
+    db: Annotated[AsyncIOMotorDatabase, Depends(get_database)],
+    current_user: Annotated[TokenData, Depends(get_current_user)],
+):
+    return await get_task_stats(db, USER, current_user.username)
+
+@router.get("/stats/team/{team_id}", response_model=TaskStats, tags=["tasks"])
+async def get_team_task_stats(
+    db: Annotated[AsyncIOMotorDatabase, Depends(get_database)],
+    validated_team_id: Annotated[str, Depends(get_team_access_for_tasks)],
+):
+    return await get_task_stats(db, TEAM, validated_team_id)
+
+
+# Search over the title, description and comments of the tasks of the caller's teams (see search.py).
+# Best match first; the teams whose name matches come with the first page.
+SEARCH_SORT = [("score", -1), ("_id", -1)]
+
+@router.get("/search", response_model=SearchResults, tags=["tasks"])
+async def search_tasks(
+    response: Response,
+    db: Annotated[AsyncIOMotorDatabase, Depends(get_database)],
+    current_user: Annotated[TokenData, Depends(get_current_user)],
+    q: str = Query(..., min_length=1, max_length=200, description="Words to find; the last one also matches as a prefix"),
+    limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+):
+    terms, prefix = parse_query(q)
+    if not terms and not prefix:
+        return SearchResults(tasks=[], teams=[])
+
+    team_ids, teams = await searchable_teams(db, current_user, terms, prefix)
+    if team_ids == []:
+        return SearchResults(tasks=[], teams=[])
+
+    candidates = await db["tasks"].find(
+        search_filter(terms, prefix, team_ids),
+        projection={"title": 1, "description": 1, "team_id": 1, "assigned_to": 1, "status": 1, "priority": 1, "due_date": 1},
+    ).sort("_id", -1).limit(SEARCH_MAX_CANDIDATES).to_list(length=SEARCH_MAX_CANDIDATES)
+
+    hits = []
+    for doc in candidates:
+        score, matched_in = score_task(doc, terms, prefix)
+        hits.append({**doc, "score": score, "matched_in": matched_in})
+    hits.sort(key=lambda hit: (hit["score"], hit["_id"]), reverse=True)
+
+    if cursor:
+        last_score, last_id = decode_cursor(cursor, SEARCH_SORT)
+        # a cursor of another listing can have the same number of values
+        if isinstance(last_score, bool) or not isinstance(last_score, (int, float)) or not isinstance(last_id, ObjectId):
+            raise HTTPException(status_code=400, detail="Invalid pagination cursor.")
+        hits = [hit for hit in hits if (hit["score"], hit["_id"]) < (last_score, last_id)]
+    page = hits[:limit]
+    set_next_cursor(response, encode_cursor(page[-1], SEARCH_SORT) if len(hits) > limit else None)
+
+    return SearchResults(
+        tasks=[TaskSearchHit(id=str(hit["_id"]), **hit) for hit in page],
+        teams=[] if cursor else [TeamSearchHit(id=str(team["_id"]), name=team["name"]) for team in teams],
+    )
 
 
 @router.post("", response_model=TaskOut, status_code=status.HTTP_201_CREATED, tags=["tasks"])
@@ -176,10 +401,10 @@ async def create_task(
     assigned_user_url = f"http://user_service:8001/users/{task_data.assigned_to}"
     
     try:
-        async with httpx.AsyncClient() as client:
-            headers = {"Authorization": f"Bearer {current_user.token}"}
-            response = await client.get(assigned_user_url, headers=headers)
-        
+        client = get_http_client()
+        headers = {"Authorization": f"Bearer {current_user.token}"}
+        response = await client.get(assigned_user_url, headers=headers)
+
         if response.status_code == 404:
             raise HTTPException(status_code=404, detail=f"User '{task_data.assigned_to}' not found in the system.")
         
@@ -201,11 +426,15 @@ async def create_task(
         status=task_data.status,
         priority=task_data.priority,
         due_date=task_data.due_date,
-        comments=[]
+        search_terms=task_search_terms(task_data.title, task_data.description),
     )
     
-    result = await db["tasks"].insert_one(new_task.model_dump(by_alias=True))
-    created_task = await db["tasks"].find_one({"_id": result.inserted_id})
+    created_task = new_task.model_dump(by_alias=True)
+    result = await db["tasks"].insert_one(created_task)
+
+    stats_delta = TaskStatsDelta()
+    stats_delta.add(created_task)
+    await apply_task_stats(db, stats_delta)
 
     # --- TRIGGER: NOTIFY ASSIGNEE ---
     if task_data.assigned_to != current_user.username:
@@ -231,6 +460,263 @@ async def create_task(
         **created_task
     )
 
+# ---------------------------------------------------------
+# BULK ENDPOINTS (declared before the /{task_id} routes)
+# ---------------------------------------------------------
+# Same rules as create_task / update_task_details, but every check is batched:
+# one access check per distinct team, one user_service call for all the assignees,
+# one write for all the tasks and one for all the notifications.
+# Each item gets its own result; a bad item doesn't fail the others.
+
+async def _lookup_users(usernames: set, current_user: TokenData) -> dict:
+    """ username -> {"exists", "active", "role"} with one call to user_service's batch lookup """
+    if not usernames:
+        return {}
+    try:
+        client = get_http_client()
+        headers = {"Authorization": f"Bearer {current_user.token}"}
+        response = await client.post(
+            "http://user_service:8001/users/batch/lookup",
+            json={"usernames": sorted(usernames)},
+            headers=headers,
+        )
+        response.raise_for_status()
+        return {user["username"]: user for user in response.json()}
+    except (httpx.ConnectError, httpx.TimeoutException):
+        raise HTTPException(status_code=503, detail="User service is unreachable.")
+    except (httpx.HTTPError, ValueError, KeyError, TypeError):
+        # error status, broken connection, or an answer that isn't the expected JSON
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Error during user assignment validation.")
+
+
+async def _team_access_by_team(team_ids: set, current_user: TokenData) -> dict:
+    """ team_id -> TeamAccess, resolved once per team (and cached by resolve_team_access) """
+    access = {}
+    for team_id in team_ids:
+        try:
+            access[team_id] = await resolve_team_access(team_id, current_user)
+        except httpx.ConnectError:
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Team service is unreachable.")
+        except Exception:
+            access[team_id] = TeamAccess.DENIED
+    return access
+
+
+# TaskUpdate fields are Optional so they can be left out, but a task always has these:
+# an explicit null would be written, and break the TaskOut built from the result
+NON_NULLABLE_UPDATE_FIELDS = ("title", "assigned_to", "status", "priority", "due_date")
+
+
+def _assignee_error(user: Optional[dict], username: str) -> Optional[tuple]:
+    if user is None or not user.get("exists"):
+        return 404, f"User '{username}' not found in the system."
+    if not user.get("active"):
+        return 400, "Assigned user is not active and cannot be assigned a task."
+    return None
+
+
+def _bulk_result(results: List[BulkItemResult]) -> BulkResult:
+    results.sort(key=lambda r: r.index)
+    succeeded = sum(1 for r in results if r.status_code < 400)
+    return BulkResult(succeeded=succeeded, failed=len(results) - succeeded, results=results)
+
+
+@router.post("/bulk", response_model=BulkResult, tags=["tasks"])
+async def create_tasks_bulk(
+    payload: TaskBulkCreate,
+    db: Annotated[AsyncIOMotorDatabase, Depends(get_database)],
+    current_user: Annotated[TokenData, Depends(get_current_user)],
+):
+    """
+    (Team Leader Only) Creates many tasks at once, e.g. importing a sprint plan.
+    Per item: 201 with the task, or the error create_task would have returned.
+    """
+    if current_user.role != Role.TEAM_LEADER:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only the Team Leader is authorized to create tasks."
+        )
+
+    results: List[BulkItemResult] = []
+    access = await _team_access_by_team({t.team_id for t in payload.tasks}, current_user)
+
+    pending = []
+    for index, task_data in enumerate(payload.tasks):
+        team_access = access[task_data.team_id]
+        if team_access == TeamAccess.DENIED:
+            results.append(BulkItemResult(index=index, status_code=400, detail="Team assignment failed. The specified Team ID is invalid or inaccessible."))
+        elif team_access != TeamAccess.LEADER:
+            results.append(BulkItemResult(index=index, status_code=403, detail="You can only create tasks for the team you lead."))
+        else:
+            pending.append((index, task_data))
+
+    users = await _lookup_users({t.assigned_to for _, t in pending}, current_user)
+
+    new_tasks = []
+    for index, task_data in pending:
+        error = _assignee_error(users.get(task_data.assigned_to), task_data.assigned_to)
+        if error:
+            results.append(BulkItemResult(index=index, status_code=error[0], detail=error[1]))
+            continue
+        new_tasks.append((index, Task(
+            team_id=task_data.team_id,
+            title=task_data.title,
+            description=task_data.description,
+            created_by=current_user.username,
+            assigned_to=task_data.assigned_to,
+            status=task_data.status,
+            priority=task_data.priority,
+            due_date=task_data.due_date,
+            search_terms=task_search_terms(task_data.title, task_data.description),
+        )))
+
+    task_docs = [task.model_dump(by_alias=True) for _, task in new_tasks]
+    failed_positions = {}
+    if task_docs:
+        try:
+            await db["tasks"].insert_many(task_docs, ordered=False)
+        except BulkWriteError as e:
+            # unordered: everything else was inserted, only these positions failed
+            failed_positions = {err["index"]: err.get("errmsg", "Write failed.") for err in e.details.get("writeErrors", [])}
+
+    notifications = []
+    stats_delta = TaskStatsDelta()
+    for position, (index, task) in enumerate(new_tasks):
+        if position in failed_positions:
+            logger.error("Bulk task insert failed: index=%s, error=%s", index, failed_positions[position])
+            results.append(BulkItemResult(index=index, status_code=500, detail="Failed to save the task."))
+            continue
+        stats_delta.add(task_docs[position])
+        # built from what we inserted, no need to read it back
+        results.append(BulkItemResult(index=index, status_code=201, task=TaskOut(id=str(task.id), **task_docs[position])))
+        if task.assigned_to != current_user.username:
+            notifications.append(new_notification(
+                user_id=task.assigned_to,
+                title="New Task Assigned",
+                message=f"You were assigned to '{task.title}' by {current_user.username}",
+                link=f"/teams/{task.team_id}/tasks/{task.id}",
+                type=NotificationType.TASK_ASSIGNED
+            ))
+
+    await apply_task_stats(db, stats_delta)
+    if notifications:
+        try:
+            await enqueue_notifications(db, notifications)
+        except Exception as e:
+            # the tasks exist, a missing notification shouldn't turn them into errors
+            logger.error("Bulk task notifications failed: %s", e)
+
+    result = _bulk_result(results)
+    logger.info("Bulk task create : created_by=%s, succeeded=%s, failed=%s",
+        current_user.username, result.succeeded, result.failed)
+    return result
+
+
+@router.patch("/bulk", response_model=BulkResult, tags=["tasks"])
+async def update_tasks_bulk(
+    payload: TaskBulkUpdate,
+    db: Annotated[AsyncIOMotorDatabase, Depends(get_database)],
+    current_user: Annotated[TokenData, Depends(get_current_user)],
+):
+    """
+    (Team Leader Only) Updates many tasks at once, each item is {id, ...fields of TaskUpdate}.
+    Per item: 200 with the updated task, or the error update_task_details would have returned.
+    """
+    results: List[BulkItemResult] = []
+
+    # 1. Parse the ids and load every task with one query
+    items = []
+    seen = set()
+    for index, item in enumerate(payload.updates):
+        try:
+            obj_id = ObjectId(item.id)
+        except Exception:
+            results.append(BulkItemResult(index=index, status_code=400, detail="Invalid task ID format"))
+            continue
+        if obj_id in seen:
+            results.append(BulkItemResult(index=index, status_code=400, detail="This task is already updated by another item of the request."))
+            continue
+        update_data = item.model_dump(exclude_unset=True, exclude={"id"})
+        nulls = [field for field in NON_NULLABLE_UPDATE_FIELDS if field in update_data and update_data[field] is None]
+        if nulls:
+            results.append(BulkItemResult(index=index, status_code=400, detail=f"These fields cannot be null: {', '.join(nulls)}."))
+            continue
+        seen.add(obj_id)
+        items.append((index, obj_id, update_data))
+
+    task_docs = {}
+    if seen:
+        async for doc in db["tasks"].find({"_id": {"$in": list(seen)}}, projection=TASK_OUT_PROJECTION):
+            task_docs[doc["_id"]] = doc
+
+    # 2. Authorization, as get_task_leader_only: a team leader who created the task or leads its team
+    access = {}
+    if current_user.role == Role.TEAM_LEADER:
+        teams_to_check = {
+            task_docs[obj_id]["team_id"] for _, obj_id, _ in items
+            if obj_id in task_docs and task_docs[obj_id]["created_by"] != current_user.username
+        }
+        access = await _team_access_by_team(teams_to_check, current_user)
+
+    authorized = []
+    for index, obj_id, update_data in items:
+        doc = task_docs.get(obj_id)
+        if doc is None:
+            results.append(BulkItemResult(index=index, status_code=404, detail="Task not found"))
+        elif current_user.role != Role.TEAM_LEADER or (
+            doc["created_by"] != current_user.username and access.get(doc["team_id"]) != TeamAccess.LEADER
+        ):
+            results.append(BulkItemResult(index=index, status_code=403, detail="Only the Team Leader of the relevant team is authorized to edit/delete this task."))
+        elif not update_data:
+            results.append(BulkItemResult(index=index, status_code=400, detail="No update data provided."))
+        else:
+            authorized.append((index, obj_id, update_data))
+
+    # 3. New assignees, validated with one call
+    users = await _lookup_users({u["assigned_to"] for _, _, u in authorized if "assigned_to" in u}, current_user)
+
+    updates = []
+    for index, obj_id, update_data in authorized:
+        if "assigned_to" in update_data:
+            error = _assignee_error(users.get(update_data["assigned_to"]), update_data["assigned_to"])
+            if error:
+                results.append(BulkItemResult(index=index, status_code=error[0], detail=error[1]))
+                continue
+        updates.append((index, obj_id, update_data))
+
+    # 4. One unordered bulk_write for all of them
+    failed_positions = {}
+    if updates:
+        try:
+            await db["tasks"].bulk_write(
+                [UpdateOne({"_id": obj_id}, {"$set": update_data}) for _, obj_id, update_data in updates],
+                ordered=False,
+            )
+        except BulkWriteError as e:
+            failed_positions = {err["index"]: err.get("errmsg", "Write failed.") for err in e.details.get("writeErrors", [])}
+
+    stats_delta = TaskStatsDelta()
+    retokenize = []
+    for position, (index, obj_id, update_data) in enumerate(updates):
+        if position in failed_positions:
+            logger.error("Bulk task update failed: index=%s, error=%s", index, failed_positions[position])
+            results.append(BulkItemResult(index=index, status_code=500, detail="Failed to update the task."))
+            continue
+        # the stored document is what we read plus the fields we set, no need to read it again
+        updated = {**task_docs[obj_id], **update_data}
+        stats_delta.update(task_docs[obj_id], updated)
+        if "title" in update_data or "description" in update_data:
+            retokenize.append(obj_id)
+        results.append(BulkItemResult(index=index, status_code=200, task=TaskOut(id=str(obj_id), **updated)))
+    await apply_task_stats(db, stats_delta)
+    await refresh_task_search_terms(db, retokenize)
+
+    result = _bulk_result(results)
+    logger.info("Bulk task update : updated_by=%s, succeeded=%s, failed=%s",
+        current_user.username, result.succeeded, result.failed)
+    return result
+
+
 @router.get("/{task_id}", response_model=TaskOut, tags=["tasks"])
 async def get_task_details(
     task_id: str,
@@ -242,7 +728,7 @@ async def get_task_details(
     except Exception:
         raise HTTPException(status_code=400, detail="Invalid task ID format.")
 
-    task_doc = await db["tasks"].find_one({"_id": obj_id})
+    task_doc = await db["tasks"].find_one({"_id": obj_id}, projection=TASK_OUT_PROJECTION)
     if not task_doc:
         raise HTTPException(status_code=404, detail="Task not found.")
     
@@ -269,10 +755,10 @@ async def update_task_details(
         user_service_url = f"http://user_service:8001/users/{assigned_user}"
         
         try:
-            async with httpx.AsyncClient() as client:
-                headers = {"Authorization": f"Bearer {current_user.token}"}
-                response = await client.get(user_service_url, headers=headers)
-            
+            client = get_http_client()
+            headers = {"Authorization": f"Bearer {current_user.token}"}
+            response = await client.get(user_service_url, headers=headers)
+
             if response.status_code == 404:
                 raise HTTPException(status_code=404, detail=f"User '{assigned_user}' is either invalid or not part of the team.")
             
@@ -283,12 +769,23 @@ async def update_task_details(
         except httpx.ConnectError:
             raise HTTPException(status_code=503, detail="User service is unreachable.")
             
-    await db["tasks"].update_one(
+    # update and read back the previous version in one round trip: the new one is that plus
+    # the fields we set, and the task stats need both
+    previous_task_doc = await db["tasks"].find_one_and_update(
         {"_id": task_to_update.id}, 
-        {"$set": update_data}
+        {"$set": update_data},
+        projection=TASK_OUT_PROJECTION,
+        return_document=ReturnDocument.BEFORE,
     )
-    
-    updated_task_doc = await db["tasks"].find_one({"_id": task_to_update.id})
+    if not previous_task_doc:
+        raise HTTPException(status_code=404, detail="Task not found")
+    updated_task_doc = {**previous_task_doc, **update_data}
+
+    stats_delta = TaskStatsDelta()
+    stats_delta.update(previous_task_doc, updated_task_doc)
+    await apply_task_stats(db, stats_delta)
+    if "title" in update_data or "description" in update_data:
+        await refresh_task_search_terms(db, [task_to_update.id])
     return TaskOut(id=str(updated_task_doc["_id"]), **updated_task_doc)
 
 @router.patch("/{task_id}/status", response_model=TaskOut, tags=["tasks"])
@@ -303,33 +800,36 @@ async def update_task_status(
     except Exception:
         raise HTTPException(status_code=400, detail="Invalid task ID format.")
 
-    task_doc = await db["tasks"].find_one({"_id": obj_id})
-    if not task_doc:
-        raise HTTPException(status_code=404, detail="Task not found.")
-    
-    task = Task(**task_doc)
-
-    if current_user.username != task.assigned_to:
+    # Only the assigned user can change the status: the check is part of the update filter,
+    # so the usual case is a single round trip that also returns the previous version of the task
+    previous_task_doc = await db["tasks"].find_one_and_update(
+        {"_id": obj_id, "assigned_to": current_user.username},
+        {"$set": {"status": status_data.status}},
+        projection=TASK_OUT_PROJECTION,
+        return_document=ReturnDocument.BEFORE,
+    )
+    if not previous_task_doc:
+        # nothing matched: find out why
+        if not await db["tasks"].find_one({"_id": obj_id}, projection={"_id": 1}):
+            raise HTTPException(status_code=404, detail="Task not found.")
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="You are not authorized to change the status; only the assigned user can."
         )
+    updated_task_doc = {**previous_task_doc, "status": status_data.status}
 
-    await db["tasks"].update_one(
-        {"_id": task.id},
-        {"$set": {"status": status_data.status}}
-    )
-    
-    updated_task_doc = await db["tasks"].find_one({"_id": task.id})
+    stats_delta = TaskStatsDelta()
+    stats_delta.update(previous_task_doc, updated_task_doc)
+    await apply_task_stats(db, stats_delta)
     
     # --- TRIGGER: NOTIFY CREATOR ---
-    if current_user.username != task.created_by:
+    if current_user.username != updated_task_doc["created_by"]:
         await create_notification(
             db,
-            user_id=task.created_by,
+            user_id=updated_task_doc["created_by"],
             title="Task Status Changed",
-            message=f"Task '{task.title}' marked as {status_data.status} by {current_user.username}",
-            link=f"/teams/{task.team_id}/tasks/{task_id}",
+            message=f"Task '{updated_task_doc['title']}' marked as {status_data.status} by {current_user.username}",
+            link=f"/teams/{updated_task_doc['team_id']}/tasks/{task_id}",
             type=NotificationType.TASK_STATUS_CHANGED
         )
     # -------------------------------
@@ -342,7 +842,18 @@ async def delete_task(
     db: Annotated[AsyncIOMotorDatabase, Depends(get_database)],
     task_to_delete: Task = Depends(get_task_leader_only) 
 ):
-    await db["tasks"].delete_one({"_id": task_to_delete.id})
+    # the deleted document (as it was when deleted) gives the task stats to decrement
+    deleted_task_doc = await db["tasks"].find_one_and_delete(
+        {"_id": task_to_delete.id},
+        projection={"team_id": 1, "assigned_to": 1, "status": 1, "priority": 1},
+    )
+    if deleted_task_doc:
+        stats_delta = TaskStatsDelta()
+        stats_delta.remove(deleted_task_doc)
+        await apply_task_stats(db, stats_delta)
+        await db[COMMENTS_COLLECTION].delete_many({"task_id": task_to_delete.id})
+        attachments = [att.model_dump() for att in task_to_delete.attachments]
+        await release_blob_references(db, count_blob_references(attachments))
     return None
 
 @router.post("/{task_id}/comments", response_model=CommentOut, status_code=status.HTTP_201_CREATED, tags=["comments"])
@@ -357,7 +868,11 @@ async def add_comment_to_task(
     except Exception:
         raise HTTPException(status_code=400, detail="Invalid task ID format.")
 
-    task_doc = await db["tasks"].find_one({"_id": obj_id}, projection={"team_id": 1})
+    # also the fields the notifications need, so the task isn't read again after the update
+    task_doc = await db["tasks"].find_one(
+        {"_id": obj_id},
+        projection={"team_id": 1, "assigned_to": 1, "created_by": 1, "title": 1}
+    )
     if not task_doc:
         raise HTTPException(status_code=404, detail="Task not found.")
     
@@ -365,45 +880,41 @@ async def add_comment_to_task(
     await get_team_access_for_tasks(team_id, current_user)
 
     new_comment = Comment(
+        task_id=obj_id,
         text=comment_data.text,
         created_by=current_user.username,
     )
     
-    result = await db["tasks"].update_one(
-        {"_id": obj_id},
-        {"$push": {"comments": new_comment.model_dump(by_alias=True)}}
-    )
-    
-    if result.modified_count == 0:
+    try:
+        await db[COMMENTS_COLLECTION].insert_one(new_comment.model_dump(by_alias=True))
+    except Exception:
         raise HTTPException(status_code=500, detail="Failed to add comment.")
+    await add_comment_search_terms(db, obj_id, new_comment.text)
     
     # --- TRIGGER: NOTIFY ASSIGNEE & CREATOR ---
-    task_full = await db["tasks"].find_one({"_id": obj_id})
-    assigned_to = task_full.get("assigned_to")
-    created_by = task_full.get("created_by")
-    task_title = task_full.get("title")
+    assigned_to = task_doc.get("assigned_to")
+    created_by = task_doc.get("created_by")
+    task_title = task_doc.get("title")
 
+    recipients = []
     # Notify Assignee (if it's not them commenting)
     if assigned_to and assigned_to != current_user.username:
-        await create_notification(
-            db,
-            user_id=assigned_to,
-            title="New Comment",
-            message=f"{current_user.username} commented on '{task_title}'",
-            link=f"/teams/{team_id}/tasks/{task_id}",
-            type=NotificationType.NEW_COMMENT
-        )
-    
+        recipients.append(assigned_to)
     # Notify Creator (if it's not them commenting AND they aren't the assignee)
     if created_by and created_by != current_user.username and created_by != assigned_to:
-        await create_notification(
-            db,
-            user_id=created_by,
+        recipients.append(created_by)
+
+    # both notifications are queued in a single write
+    await enqueue_notifications(db, [
+        new_notification(
+            user_id=recipient,
             title="New Comment",
             message=f"{current_user.username} commented on '{task_title}'",
             link=f"/teams/{team_id}/tasks/{task_id}",
             type=NotificationType.NEW_COMMENT
         )
+        for recipient in recipients
+    ])
     # ------------------------------------------
 
     return CommentOut(
@@ -423,37 +934,72 @@ async def cleanup_team_tasks(
     added because the tasks were still showing up for each user,
     even if the team the task belonged to had been deleted.
     """
+    # release the attachment blobs of every task of the team, then delete the tasks
+    blob_refs = await db["tasks"].aggregate([
+        {"$match": {"team_id": team_id, "attachments.sha256": {"$exists": True}}},
+        {"$unwind": "$attachments"},
+        {"$match": {"attachments.sha256": {"$exists": True}}},
+        {"$group": {"_id": "$attachments.sha256", "count": {"$sum": 1}}},
+    ]).to_list(length=None)
+    task_ids = await db["tasks"].distinct("_id", {"team_id": team_id})
+    # what the team's tasks counted for each assignee
+    assignee_counts = await db["tasks"].aggregate([
+        {"$match": {"team_id": team_id}},
+        {"$group": {"_id": {"assigned_to": "$assigned_to", "status": "$status", "priority": "$priority"}, "count": {"$sum": 1}}},
+    ]).to_list(length=None)
+
     await db["tasks"].delete_many({"team_id": team_id})
+    await db[COMMENTS_COLLECTION].delete_many({"task_id": {"$in": task_ids}})
+
+    stats_delta = TaskStatsDelta()
+    for group in assignee_counts:
+        stats_delta.remove(group["_id"], group["count"])
+    await apply_task_stats(db, stats_delta)
+    await db[TASK_STATS_COLLECTION].delete_one({"_id": stats_id(TEAM, team_id)})
+    await release_blob_references(db, {ref["_id"]: ref["count"] for ref in blob_refs})
+    team_access_cache.invalidate_team(team_id)
+    return None
+
+@router.delete("/internal/team-access/{team_id}", status_code=status.HTTP_204_NO_CONTENT, include_in_schema=False)
+async def invalidate_team_access(team_id: str):
+    """ called by team service whenever the members or the leader of a team change.
+    drops the cached access decisions for that team, so the next check asks team service again.
+    """
+    team_access_cache.invalidate_team(team_id)
     return None
 
 
+# Oldest first, paginated like the task listings (next page cursor in the X-Next-Cursor header)
 @router.get("/{task_id}/comments", response_model=List[CommentOut], tags=["comments"])
 async def get_all_task_comments(
     task_id: str,
+    response: Response,
     db: Annotated[AsyncIOMotorDatabase, Depends(get_database)],
-    current_user: Annotated[TokenData, Depends(get_current_user)]
+    current_user: Annotated[TokenData, Depends(get_current_user)],
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
 ):
     try:
         obj_id = PyObjectId(task_id)
     except Exception:
         raise HTTPException(status_code=400, detail="Invalid task ID format.")
 
-    task_doc = await db["tasks"].find_one({"_id": obj_id}, projection={"team_id": 1})
+    task_doc = await db["tasks"].find_one({"_id": obj_id}, projection={"team_id": 1, **LEGACY_COMMENTS_PROBE})
     if not task_doc:
         raise HTTPException(status_code=404, detail="Task not found.")
     
     team_id = task_doc["team_id"]
     await get_team_access_for_tasks(team_id, current_user)
+
+    # comments still embedded in an old task are moved to their collection first
+    if has_legacy_comments(task_doc):
+        await migrate_task_comments(db, obj_id)
     
-    task_with_comments = await db["tasks"].find_one(
-        {"_id": obj_id}, 
-        projection={"comments": 1}
+    comments_list, next_cursor = await fetch_page(
+        db[COMMENTS_COLLECTION], {"task_id": obj_id}, COMMENT_SORT, limit, cursor,
+        projection={"task_id": 0}
     )
-    
-    if not task_with_comments or 'comments' not in task_with_comments:
-        return []
-        
-    comments_list = task_with_comments['comments']
+    set_next_cursor(response, next_cursor)
     return [CommentOut(id=str(comment["_id"]), **comment) for comment in comments_list]
 
 @router.delete("/{task_id}/comments/{comment_id}", status_code=status.HTTP_204_NO_CONTENT, tags=["comments"])
@@ -463,20 +1009,32 @@ async def delete_comment(
     comment_id: str 
 ):
     comment_obj_id = PyObjectId(comment_id)
-    result = await db["tasks"].update_one(
-        {"_id": task_id}, 
-        {"$pull": {"comments": {"_id": comment_obj_id}}}
-    )
+    result = await db[COMMENTS_COLLECTION].delete_one({"_id": comment_obj_id, "task_id": task_id})
     
-    if result.modified_count == 0:
+    if result.deleted_count == 0:
         raise HTTPException(status_code=500, detail="Failed to delete comment.")
+    # its words may be in no other comment: recompute the task's terms
+    await refresh_task_search_terms(db, [task_id])
         
     return None
 
-@router.post("/{task_id}/attachments", response_model=AttachmentOut, status_code=status.HTTP_201_CREATED, tags=["attachments"])
+# The body is parsed by the route itself (MultipartFileStream), so document it for the OpenAPI schema
+_UPLOAD_REQUEST_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {"multipart/form-data": {"schema": {
+            "type": "object",
+            "properties": {"file": {"type": "string", "format": "binary"}},
+            "required": ["file"],
+        }}},
+    }
+}
+
+@router.post("/{task_id}/attachments", response_model=AttachmentOut, status_code=status.HTTP_201_CREATED,
+             tags=["attachments"], openapi_extra=_UPLOAD_REQUEST_BODY)
 async def upload_task_attachment(
     task_id: str,
-    file: UploadFile = File(...),
+    request: Request,
     db: AsyncIOMotorDatabase = Depends(get_database),
     current_user: TokenData = Depends(get_current_user),
 ):
@@ -492,19 +1050,16 @@ async def upload_task_attachment(
     team_id = task_doc["team_id"]
     await get_team_access_for_tasks(team_id, current_user)
 
-    task_dir = UPLOAD_BASE_DIR / str(task_id)
-    task_dir.mkdir(parents=True, exist_ok=True)
-
     attachment_id = PyObjectId()
-    safe_filename = file.filename or "attachment"
-    stored_path = task_dir / f"{attachment_id}_{safe_filename}"
 
-    file_bytes = await file.read()
-    try:
-        with open(stored_path, "wb") as f:
-            f.write(file_bytes)
-    except Exception:
-        raise HTTPException(status_code=500, detail="Failed to save file on server.")
+    # The body is only read now, after the checks above: the file part is streamed straight to the
+    # staging file (never fully in memory, no spooled copy), size limit and sha256 on the fly.
+    # UploadSizeLimitMiddleware caps the whole body, with or without a Content-Length.
+    file = MultipartFileStream(request, "file")
+    stored = await save_upload(file, STAGING_DIR / str(attachment_id))
+    safe_filename = file.filename or "attachment"
+    # content-addressed: if the same content was uploaded before, this only adds a reference
+    stored_path = await add_blob_reference(db, stored)
 
     attachment = Attachment(
         id=attachment_id,
@@ -512,6 +1067,8 @@ async def upload_task_attachment(
         content_type=file.content_type or "application/octet-stream",
         path=str(stored_path),
         uploaded_by=current_user.username,
+        size=stored.size,
+        sha256=stored.sha256,
     )
 
     result = await db["tasks"].update_one(
@@ -520,10 +1077,7 @@ async def upload_task_attachment(
     )
 
     if result.modified_count == 0:
-        try:
-            os.remove(stored_path)
-        except OSError:
-            pass
+        await release_blob_references(db, {stored.sha256: 1})
         raise HTTPException(status_code=500, detail="Failed to attach file to task.")
 
     return AttachmentOut(
@@ -532,6 +1086,8 @@ async def upload_task_attachment(
         content_type=attachment.content_type,
         uploaded_by=attachment.uploaded_by,
         uploaded_at=attachment.uploaded_at,
+        size=attachment.size,
+        sha256=attachment.sha256,
     )
 
 @router.get("/{task_id}/attachments", response_model=List[AttachmentOut], tags=["attachments"])
@@ -563,6 +1119,8 @@ async def list_task_attachments(
             content_type=att["content_type"],
             uploaded_by=att["uploaded_by"],
             uploaded_at=att["uploaded_at"],
+            size=att.get("size"),
+            sha256=att.get("sha256"),
         )
         for att in attachments
     ]
@@ -571,6 +1129,7 @@ async def list_task_attachments(
 async def download_task_attachment(
     task_id: str,
     attachment_id: str,
+    request: Request,
     db: AsyncIOMotorDatabase = Depends(get_database),
     current_user: TokenData = Depends(get_current_user),
 ):
@@ -605,9 +1164,14 @@ async def download_task_attachment(
     if base not in resolved.parents and resolved != base:
         raise HTTPException(status_code=500, detail="Invalid attachment path on server.")
 
-    return FileResponse(
-        path=file_path,
+    # ETag is the content hash for blob-store attachments (mtime+size for older ones).
+    # "no-cache": browsers keep a copy but revalidate every time, since access depends on team membership.
+    return conditional_file_response(
+        request,
+        Path(file_path),
+        cache_control=ATTACHMENT_CACHE_CONTROL,
         media_type=attachment.get("content_type", "application/octet-stream"),
+        etag_value=attachment.get("sha256"),
         filename=attachment.get("filename", "download"),
     )
 
@@ -644,14 +1208,8 @@ async def delete_task_attachment(
     if current_user.role == Role.TEAM_LEADER:
         team_id = task_doc["team_id"]
         try:
-            team_service_url = f"http://team_service:8002/teams/{team_id}"
-            async with httpx.AsyncClient() as client:
-                headers = {"Authorization": f"Bearer {current_user.token}"}
-                response = await client.get(team_service_url, headers=headers)
-                if response.status_code == 200:
-                    team_data = response.json()
-                    if team_data.get("leader_id") == current_user.username:
-                        is_leader = True
+            if await resolve_team_access(team_id, current_user) == TeamAccess.LEADER:
+                is_leader = True
         except Exception:
             pass 
 
@@ -661,17 +1219,25 @@ async def delete_task_attachment(
             detail="You are not authorized to delete this file."
         )
 
-    file_path = Path(target_attachment["path"])
-    try:
-        if file_path.exists():
-            os.remove(file_path)
-    except Exception as e:
-        logger.error(f"Failed to delete file from disk: {e}")
-
-    await db["tasks"].update_one(
+    result = await db["tasks"].update_one(
         {"_id": task_obj_id},
         {"$pull": {"attachments": {"_id": attachment_obj_id}}}
     )
+    if result.modified_count == 0:
+        # already removed by a concurrent request, which also released the file
+        return None
+
+    if target_attachment.get("sha256"):
+        # shared blob: drop our reference, the background sweep removes it once unused
+        await release_blob_references(db, {target_attachment["sha256"]: 1})
+    else:
+        # attachments uploaded before the blob store have their own file
+        file_path = Path(target_attachment["path"])
+        try:
+            if file_path.exists():
+                os.remove(file_path)
+        except Exception as e:
+            logger.error(f"Failed to delete file from disk: {e}")
 
     return None
 
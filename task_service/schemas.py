@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field, ConfigDict
-from typing import List, Optional
+from typing import Dict, List, Optional
 from enum import StrEnum
 from datetime import datetime # ADD THIS IMPORT
 
@@ -20,6 +20,12 @@ class Role(StrEnum):
     TEAM_LEADER = "team_leader"
     MEMBER = "member"
 
+# --- Result of a team membership check (cached by auth_cache.py) ---
+class TeamAccess(StrEnum):
+    LEADER = "leader"   # leader of the team (can also read it)
+    MEMBER = "member"   # member of the team, or an admin
+    DENIED = "denied"   # not a member, or the team does not exist
+
 class TokenData(BaseModel):
     username: str | None = None
     role: Role | None = None
@@ -78,6 +84,33 @@ class TaskUpdate(BaseModel):
     priority: Optional[TaskPriority] = None # Uses the Enum
     due_date: Optional[datetime] = None
 
+# --- Bulk Task Schemas (POST / PATCH /tasks/bulk) ---
+MAX_BULK_TASKS = 500
+
+class TaskBulkCreate(BaseModel):
+    tasks: List[TaskCreate] = Field(..., min_length=1, max_length=MAX_BULK_TASKS)
+
+class TaskBulkUpdateItem(TaskUpdate):
+    id: str = Field(...) # the task to update, the other fields as in TaskUpdate
+
+class TaskBulkUpdate(BaseModel):
+    updates: List[TaskBulkUpdateItem] = Field(..., min_length=1, max_length=MAX_BULK_TASKS)
+
+class BulkItemResult(BaseModel):
+    """
+    Outcome of one item of a bulk request, in request order (index).
+    status_code is what the single-task endpoint would have answered.
+    """
+    index: int
+    status_code: int
+    task: Optional[TaskOut] = None
+    detail: Optional[str] = None
+
+class BulkResult(BaseModel):
+    succeeded: int
+    failed: int
+    results: List[BulkItemResult]
+
 # This is for the ASSIGNED USER update, only allows state update to the task
 class TaskStatusUpdate(BaseModel):
     """
@@ -114,6 +147,8 @@ class AttachmentOut(BaseModel):
     content_type: str
     uploaded_by: str
     uploaded_at: datetime
+    size: Optional[int] = None
+    sha256: Optional[str] = None
 
     model_config = ConfigDict(json_encoders={datetime: lambda v: v.isoformat()})
     
@@ -137,4 +172,92 @@ class NotificationCreateInternal(BaseModel):
     title: str
     message: str
     link: str
-    type: str
\ No newline at end of file
+    type: str
+    # Set by the sender so that a retried delivery is only queued once
+    idempotency_key: Optional[str] = Field(None, max_length=200)
+
+MAX_INTERNAL_NOTIFICATIONS = 500
+
+class NotificationBatchInternal(BaseModel):
+    """
+    Several notifications in one call (team_service's outbox dispatcher).
+    Each item is a NotificationCreateInternal, validated on its own: an invalid item is
+    rejected (and reported), the others are still queued.
+    """
+    notifications: List[dict] = Field(..., min_length=1, max_length=MAX_INTERNAL_NOTIFICATIONS)
+
+class RejectedNotification(BaseModel):
+    index: int # position in the batch
+    error: str
+
+class NotificationBatchResult(BaseModel):
+    queued: int
+    duplicates: int
+    rejected: List[RejectedNotification]
+
+# --- Search (GET /tasks/search) ---
+class TaskSearchHit(BaseModel):
+    id: str
+    team_id: str
+    title: str
+    assigned_to: str
+    status: str
+    priority: str
+    due_date: datetime
+    score: float
+    matched_in: List[str]  # "title", "description", "comments"
+
+class TeamSearchHit(BaseModel):
+    id: str
+    name: str
+
+class SearchResults(BaseModel):
+    """
+    Tasks best match first (paginated, next page cursor in the X-Next-Cursor header).
+    The teams whose name matches are only on the first page.
+    """
+    tasks: List[TaskSearchHit]
+    teams: List[TeamSearchHit]
+
+    model_config = ConfigDict(json_encoders={datetime: lambda v: v.isoformat()})
+
+class TaskStats(BaseModel):
+    """
+    Task counts of a team or an assignee (GET /tasks/stats/...), read from the task_stats collection
+    """
+    total: int
+    by_status: Dict[str, int]
+    by_priority: Dict[str, int]
+    updated_at: Optional[datetime] = None
+
+    model_config = ConfigDict(json_encoders={datetime: lambda v: v.isoformat()})
+
+class DashboardTask(BaseModel):
+    id: str
+    team_id: str
+    title: str
+    status: str
+    priority: str
+    due_date: datetime
+
+class DashboardTeam(BaseModel):
+    id: str
+    name: str
+    leader_id: str
+    member_count: int
+    open_tasks: int
+
+class DashboardSummary(BaseModel):
+    """
+    GET /dashboard/summary: what the dashboard page shows, for the current user
+    """
+    total_tasks: int
+    by_status: Dict[str, int]
+    by_priority: Dict[str, int]
+    overdue: int
+    upcoming: List[DashboardTask]  # next due tasks that aren't done
+    total_teams: int
+    teams: List[DashboardTeam]
+    generated_at: datetime
+
+    model_config = ConfigDict(json_encoders={datetime: lambda v: v.isoformat()})
@@ -0,0 +1,254 @@
+"""
+Keyword search over tasks (title, description and comments), for GET /tasks/search.
+
+Every task carries `search_terms`: the distinct normalized words of its title, description
+and comments. The tasks_search_terms_team index (multikey) turns a query into index lookups:
+- full words must all be present: {"search_terms": {"$all": [...]}}
+- the last word of the query, while it's being typed, is a prefix: an anchored regex
+  ({"$regex": "^pre"}), which is a range scan on the same index
+- the caller's teams are part of the filter (admins see every team)
+The newest SEARCH_MAX_CANDIDATES matches are ranked here (title > description > comments)
+and paginated with a cursor on (score, _id).
+
+The terms are kept up to date by routes.py (task create/update, comment add/delete).
+Tasks created before have none: backfill_search_terms computes them, at startup in the
+background (SEARCH_BACKFILL_ON_STARTUP) or with `python search.py`.
+"""
+import asyncio
+import logging
+import os
+import re
+import sys
+import unicodedata
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from pymongo import UpdateOne
+
+from comments import COMMENTS_COLLECTION
+from schemas import Role, TokenData
+
+logger = logging.getLogger("task_service")
+
+# --- Settings ---
+SEARCH_TERMS_FIELD = "search_terms"
+SEARCH_BACKFILL_ON_STARTUP = os.getenv("SEARCH_BACKFILL_ON_STARTUP", "true").lower() == "true"
+# Matches ranked per query. A query matching more tasks ranks the newest ones only.
+SEARCH_MAX_CANDIDATES = int(os.getenv("SEARCH_MAX_CANDIDATES", "1000"))
+SEARCH_MAX_TEAMS = 20
+BACKFILL_BATCH_SIZE = 500
+MIN_TERM_LENGTH = 2
+MAX_TERM_LENGTH = 40
+# bounds the index entries of a task with a very long description / many comments
+MAX_SEARCH_TERMS = 1000
+
+# score of a query word found in each part of a task
+TITLE_WEIGHT = 3.0
+DESCRIPTION_WEIGHT = 1.0
+COMMENT_WEIGHT = 0.5
+
+_WORD = re.compile(r"\w+")
+
+
+def _normalize(text: str) -> str:
+    # case and accents don't matter: "Réunion" is found by "reunion"
+    decomposed = unicodedata.normalize("NFKD", text.casefold())
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """ Distinct normalized words of the text, in order of appearance """
+    if not text:
+        return []
+    words = (w[:MAX_TERM_LENGTH] for w in _WORD.findall(_normalize(text)))
+    return list(dict.fromkeys(w for w in words if len(w) >= MIN_TERM_LENGTH))
+
+
+def task_search_terms(title: Optional[str], description: Optional[str], comment_texts: Iterable[str] = ()) -> List[str]:
+    terms = dict.fromkeys(tokenize(title))
+    terms.update(dict.fromkeys(tokenize(description)))
+    for text in comment_texts:
+        if len(terms) >= MAX_SEARCH_TERMS:
+            break
+        terms.update(dict.fromkeys(tokenize(text)))
+    return list(terms)[:MAX_SEARCH_TERMS]
+
+
+async def load_comment_texts(db, task_ids: list) -> Dict[object, List[str]]:
+    """ task_id -> texts of its comments, in one query """
+    texts = {task_id: [] for task_id in task_ids}
+    if task_ids:
+        async for comment in db[COMMENTS_COLLECTION].find(
+            {"task_id": {"$in": task_ids}}, projection={"task_id": 1, "text": 1}
+        ):
+            texts[comment["task_id"]].append(comment.get("text", ""))
+    return texts
+
+
+def _terms_of(task_doc: dict, comment_texts: List[str]) -> List[str]:
+    # comments still embedded in a task that wasn't migrated yet count as well
+    embedded = [c.get("text", "") for c in task_doc.get("comments") or []]
+    return task_search_terms(task_doc.get("title"), task_doc.get("description"), [*comment_texts, *embedded])
+
+
+async def refresh_task_search_terms(db, task_ids: list):
+    """ Recomputes the terms of the tasks from their current title, description and comments """
+    if not task_ids:
+        return
+    tasks = await db["tasks"].find(
+        {"_id": {"$in": task_ids}}, projection={"title": 1, "description": 1, "comments.text": 1}
+    ).to_list(length=None)
+    texts = await load_comment_texts(db, [task["_id"] for task in tasks])
+    if tasks:
+        await db["tasks"].bulk_write([
+            UpdateOne({"_id": task["_id"]}, {"$set": {SEARCH_TERMS_FIELD: _terms_of(task, texts[task["_id"]])}})
+            for task in tasks
+        ], ordered=False)
+
+
+async def add_comment_search_terms(db, task_id, text: str):
+    """ A new comment only adds words: no need to recompute the whole task """
+    terms = tokenize(text)
+    if terms:
+        await db["tasks"].update_one(
+            {"_id": task_id, f"{SEARCH_TERMS_FIELD}.{MAX_SEARCH_TERMS - 1}": {"$exists": False}},
+            {"$addToSet": {SEARCH_TERMS_FIELD: {"$each": terms}}},
+        )
+
+
+# --- Query ---
+
+def parse_query(q: str) -> Tuple[List[str], Optional[str]]:
+    """
+    "fix login pa" -> (["fix", "login"], "pa"): the last word is a prefix unless the query
+    ends with a space (the user finished typing it).
+    Words shorter than MIN_TERM_LENGTH are dropped, like tokenize() does: they're never in
+    search_terms. That goes for the prefix too (a one-letter prefix matches a large part of the index).
+    """
+    words = [w[:MAX_TERM_LENGTH] for w in _WORD.findall(_normalize(q))]
+    if not words:
+        return [], None
+    prefix = None
+    if not q[-1:].isspace():
+        *words, prefix = words
+        if len(prefix) < MIN_TERM_LENGTH:
+            prefix = None
+    return list(dict.fromkeys(w for w in words if len(w) >= MIN_TERM_LENGTH)), prefix
+
+
+def search_filter(terms: List[str], prefix: Optional[str], team_ids: Optional[List[str]]) -> dict:
+    query = {}
+    if terms:
+        query[SEARCH_TERMS_FIELD] = {"$all": terms}
+    if prefix:
+        query.setdefault("$and", []).append({SEARCH_TERMS_FIELD: {"$regex": f"^{re.escape(prefix)}"}})
+    if team_ids is not None:
+        query["team_id"] = {"$in": team_ids}
+    return query
+
+
+def _word_matches(word: str, tokens: List[str], is_prefix: bool) -> bool:
+    if is_prefix:
+        return any(token.startswith(word) for token in tokens)
+    return word in tokens
+
+
+def score_task(task_doc: dict, terms: List[str], prefix: Optional[str]) -> Tuple[float, List[str]]:
+    """ (score, parts that matched) of a task the filter returned """
+    title = tokenize(task_doc.get("title"))
+    description = tokenize(task_doc.get("description"))
+    score = 0.0
+    matched_in = set()
+    words = [(word, False) for word in terms] + ([(prefix, True)] if prefix else [])
+    for word, is_prefix in words:
+        if _word_matches(word, title, is_prefix):
+            score += TITLE_WEIGHT
+            matched_in.add("title")
+        elif _word_matches(word, description, is_prefix):
+            score += DESCRIPTION_WEIGHT
+            matched_in.add("description")
+        else:
+            # it's in search_terms, so it comes from a comment
+            score += COMMENT_WEIGHT
+            matched_in.add("comments")
+    # a whole word matches better than the same word as a prefix
+    if prefix and prefix in title:
+        score += 0.5
+    return score, [part for part in ("title", "description", "comments") if part in matched_in]
+
+
+def team_matches(name: str, terms: List[str], prefix: Optional[str]) -> bool:
+    tokens = tokenize(name)
+    return all(word in tokens for word in terms) and (not prefix or _word_matches(prefix, tokens, True))
+
+
+async def searchable_teams(db, current_user: TokenData, terms: List[str], prefix: Optional[str]) -> Tuple[Optional[List[str]], List[dict]]:
+    """
+    (ids of the teams whose tasks the user can search - None for an admin, who can see all -,
+     the teams whose name matches the query)
+    Read straight from the teams collection, like the "direct" team access resolver.
+    """
+    if current_user.role == Role.ADMIN:
+        first = terms[0] if terms else prefix
+        candidates = await db["teams"].find(
+            {"name": {"$regex": rf"(^|\W){re.escape(first)}", "$options": "i"}}, projection={"name": 1}
+        ).limit(SEARCH_MAX_TEAMS * 5).to_list(length=None)
+        team_ids = None
+    else:
+        candidates = await db["teams"].find(
+            {"$or": [{"leader_id": current_user.username}, {"member_ids": current_user.username}]},
+            projection={"name": 1},
+        ).to_list(length=None)
+        team_ids = [str(team["_id"]) for team in candidates]
+    matching = [team for team in candidates if team_matches(team.get("name", ""), terms, prefix)]
+    return team_ids, matching[:SEARCH_MAX_TEAMS]
+
+
+# --- Backfill ---
+
+async def backfill_search_terms(db) -> int:
+    """ Computes the terms of every task that has none, in batches. Returns how many were updated. """
+    updated = 0
+    last_id = None
+    while True:
+        query = {SEARCH_TERMS_FIELD: {"$exists": False}}
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        batch = await db["tasks"].find(
+            query, projection={"title": 1, "description": 1, "comments.text": 1}
+        ).sort("_id", 1).limit(BACKFILL_BATCH_SIZE).to_list(length=BACKFILL_BATCH_SIZE)
+        if not batch:
+            return updated
+        texts = await load_comment_texts(db, [task["_id"] for task in batch])
+        await db["tasks"].bulk_write([
+            UpdateOne(
+                {"_id": task["_id"], SEARCH_TERMS_FIELD: {"$exists": False}},
+                {"$set": {SEARCH_TERMS_FIELD: _terms_of(task, texts[task["_id"]])}},
+            )
+            for task in batch
+        ], ordered=False)
+        updated += len(batch)
+        last_id = batch[-1]["_id"]
+
+
+async def run_search_backfill(db):
+    """ Background job started by main.py """
+    try:
+        updated = await backfill_search_terms(db)
+        if updated:
+            logger.info("Search backfill: indexed %s tasks", updated)
+    except Exception as e:
+        logger.error("Search backfill failed: %s", e)
+
+
+async def _main() -> int:
+    from db import get_database
+    updated = await backfill_search_terms(get_database())
+    print(f"Indexed {updated} tasks for search")
+    return 0
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s [%(name)s] %(message)s")
+    sys.exit(asyncio.run(_main()))
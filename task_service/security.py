@@ -2,20 +2,57 @@ from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from jose import JWTError, jwt
 from pydantic import ValidationError
-import os, httpx # Add httpx
-from typing import Annotated 
+import os, time, httpx # Add httpx
+from collections import deque
+from typing import Annotated, Optional
 from db import get_database # <--- ADD THIS LINE
+from http_client import get_http_client
 from bson import ObjectId  # <--- ADD THIS
 
 from motor.motor_asyncio import AsyncIOMotorClient # <-- (or similar line for motor)
 from motor.motor_asyncio import AsyncIOMotorDatabase # <--- ADD THIS LINE
-from schemas import TokenData, Role, TaskCreate # Import TaskCreate
+from schemas import TokenData, Role, TaskCreate, TeamAccess # Import TaskCreate
+from auth_cache import team_access_cache
 from models import Task, PyObjectId # You'll need to import this once you write the model
+from comments import COMMENTS_COLLECTION, LEGACY_COMMENTS_PROBE, has_legacy_comments, migrate_task_comments
 
 # --- Settings (MUST be the same as user_service) ---
 SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = "HS256"
 
+# How team membership is resolved, picked once at startup:
+#  - "http":   ask team_service (GET /teams/{team_id}) with the user's token
+#  - "direct": read the team straight from the shared pms_db "teams" collection (read-only)
+TEAM_MEMBERSHIP_RESOLVER = os.getenv("TEAM_MEMBERSHIP_RESOLVER", "http").lower()
+if TEAM_MEMBERSHIP_RESOLVER not in ("http", "direct"):
+    raise Exception(f"Unknown TEAM_MEMBERSHIP_RESOLVER '{TEAM_MEMBERSHIP_RESOLVER}', use 'http' or 'direct'")
+
+class LatencyWindow:
+    """ Keeps the last N resolver latencies so the two resolver modes can be compared (p50/p99). """
+    def __init__(self, size: int = 1000):
+        self.samples = deque(maxlen=size)
+        self.count = 0
+
+    def record(self, seconds: float):
+        self.samples.append(seconds)
+        self.count += 1
+
+    def stats(self) -> dict:
+        ordered = sorted(self.samples)
+        def percentile(p):
+            if not ordered:
+                return 0.0
+            return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))] * 1000, 3)
+        return {
+            "mode": TEAM_MEMBERSHIP_RESOLVER,
+            "calls": self.count,
+            "p50_ms": percentile(0.50),
+            "p95_ms": percentile(0.95),
+            "p99_ms": percentile(0.99),
+        }
+
+resolver_latency = LatencyWindow()
+
 bearer_scheme = HTTPBearer()
 credentials_exception = HTTPException(
     status_code=status.HTTP_401_UNAUTHORIZED,
@@ -32,15 +69,19 @@ async def get_current_user(token: HTTPAuthorizationCredentials = Depends(bearer_
     # -------------------------------------------------------------------------------------------------
     
     # Placeholder for security.py logic based on previous successful implementation:
+    return _decode_token(token.credentials)
+# -------------------------------------------------------------------------------------------------
+
+def _decode_token(credentials: str) -> TokenData:
     if SECRET_KEY is None:
         raise Exception("SECRET_KEY not set in environment")
         
     try:
-        payload = jwt.decode(token.credentials, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = jwt.decode(credentials, SECRET_KEY, algorithms=[ALGORITHM])
         token_data = TokenData(
             username=payload.get("sub"), 
             role=payload.get("role"),
-            token=token.credentials
+            token=credentials
         )
         if token_data.username is None or token_data.role is None:
             raise credentials_exception
@@ -49,7 +90,83 @@ async def get_current_user(token: HTTPAuthorizationCredentials = Depends(bearer_
         raise credentials_exception
 
     return token_data
-# -------------------------------------------------------------------------------------------------
+
+async def get_current_user_for_stream(
+    token: Optional[str] = None,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(HTTPBearer(auto_error=False)),
+) -> TokenData:
+    """
+    Same as get_current_user, for the notification stream: the browser's EventSource
+    can't send an Authorization header, so the token may also come as ?token=
+    """
+    if credentials is not None:
+        return _decode_token(credentials.credentials)
+    if token:
+        return _decode_token(token)
+    raise credentials_exception
+
+async def _resolve_team_access_http(team_id: str, current_user: TokenData) -> TeamAccess:
+    team_service_url = f"http://team_service:8002/teams/{team_id}"
+    client = get_http_client()
+    # We must send the user's token so the Team Service can run its security check
+    headers = {"Authorization": f"Bearer {current_user.token}"}
+    response = await client.get(team_service_url, headers=headers)
+
+    # 400 invalid id, 403 not a member (team_service also hides missing teams behind 403), 404 not found
+    if response.status_code in (400, 403, 404):
+        return TeamAccess.DENIED
+
+    response.raise_for_status() # 5xx, don't cache
+    team_data = response.json()
+    if team_data.get("leader_id") == current_user.username:
+        return TeamAccess.LEADER
+    return TeamAccess.MEMBER
+
+
+async def _resolve_team_access_direct(team_id: str, current_user: TokenData) -> TeamAccess:
+    # Same rules as team_service's get_team_access_or_admin, one indexed lookup by _id
+    try:
+        obj_id = ObjectId(team_id)
+    except Exception:
+        return TeamAccess.DENIED
+
+    db = get_database()
+    team_doc = await db["teams"].find_one(
+        {"_id": obj_id},
+        projection={"_id": 0, "leader_id": 1, "member_ids": 1}
+    )
+    if not team_doc:
+        return TeamAccess.DENIED
+
+    if current_user.role != Role.ADMIN and current_user.username not in team_doc.get("member_ids", []):
+        return TeamAccess.DENIED
+    if team_doc.get("leader_id") == current_user.username:
+        return TeamAccess.LEADER
+    return TeamAccess.MEMBER
+
+
+async def resolve_team_access(team_id: str, current_user: TokenData) -> TeamAccess:
+    """
+    Finds out what the user can do in the team (leader / member / denied), either through
+    Team Service or directly from Mongo (see TEAM_MEMBERSHIP_RESOLVER).
+    Decisions are cached per (username, team_id) for AUTH_CACHE_TTL_SECONDS and dropped
+    early when team_service reports a membership change.
+    Raises if the resolver fails (nothing is cached then).
+    """
+    cached = team_access_cache.get(current_user.username, current_user.role, team_id)
+    if cached is not None:
+        return cached
+
+    started = time.perf_counter()
+    if TEAM_MEMBERSHIP_RESOLVER == "direct":
+        decision = await _resolve_team_access_direct(team_id, current_user)
+    else:
+        decision = await _resolve_team_access_http(team_id, current_user)
+    resolver_latency.record(time.perf_counter() - started)
+
+    team_access_cache.set(current_user.username, current_user.role, team_id, decision)
+    return decision
+
 
 async def get_validated_team_leader(
     task_data: TaskCreate,
@@ -67,35 +184,27 @@ async def get_validated_team_leader(
         )
 
     # 2. Check if the user is the leader of the specific team_id
-    team_service_url = f"http://team_service:8002/teams/{team_id}"
-    
     try:
-        async with httpx.AsyncClient() as client:
-            # We use the current user's token (which is already a Leader token)
-            headers = {"Authorization": f"Bearer {current_user.token}"}
-            response = await client.get(team_service_url, headers=headers)
-        
-        # If the user is NOT the leader of this team, team_service returns 403
-        if response.status_code == 403:
-            raise HTTPException(
-                status_code=403,
-                detail="You can only create tasks for the team you lead."
-            )
-        
-        # Team not found (404) or service is down (e.g., 500)
-        response.raise_for_status() 
-        
-    # 3. Handle errors from the team_service call (merging 403 and 404)
+        access = await resolve_team_access(team_id, current_user)
     except httpx.ConnectError:
         raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Team service is unreachable.")
     except Exception:
-        # This catches 404 Not Found (Team ID doesn't exist)
-        # This catches 403 Forbidden (User is not the leader of that team)
         # This catches 500 Internal Server Error (Something broke)
+        access = TeamAccess.DENIED
+
+    # 3. Team ID doesn't exist or the user can't see it (merging 403 and 404)
+    if access == TeamAccess.DENIED:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST, # <-- Use 400 for a bad request
             detail="Team assignment failed. The specified Team ID is invalid or inaccessible."
         )
+
+    # The user is a member of the team, but not its leader
+    if access != TeamAccess.LEADER:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You can only create tasks for the team you lead."
+        )
     
     # 4. If all checks passed, the team_id is valid, and the user is the leader.
     return team_id
@@ -109,29 +218,15 @@ async def get_team_access_for_tasks(
     Checks with Team Service if the user is an Admin or a Member of the target team.
     If authorized, returns the team_id.
     """
-    # Prepare for inter-service call
-    team_service_url = f"http://team_service:8002/teams/{team_id}"
-    
     try:
-        async with httpx.AsyncClient() as client:
-            # We must send the user's token so the Team Service can run its security check
-            headers = {"Authorization": f"Bearer {current_user.token}"}
-            response = await client.get(team_service_url, headers=headers)
-        
-        # Team service will return 403 Forbidden if the user is not a member
-        if response.status_code == 403:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Not authorized to view tasks for this team."
-            )
-            
-        # This catches 404 Not Found (Team ID doesn't exist) and 5xx errors
-        response.raise_for_status() 
-        
+        access = await resolve_team_access(team_id, current_user)
     except httpx.ConnectError:
         raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Team service is unreachable.")
-    except Exception as e:
-        # Merge 404 Not Found errors into 403 Forbidden
+    except Exception:
+        access = TeamAccess.DENIED
+
+    # Merge 404 Not Found errors into 403 Forbidden
+    if access == TeamAccess.DENIED:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="The specified team was not found or is inaccessible."
@@ -158,7 +253,8 @@ async def get_task_leader_only(
     except Exception:
         raise HTTPException(status_code=400, detail="Invalid task ID format")
 
-    task_doc = await db["tasks"].find_one({"_id": obj_id})
+    # the attachments are needed (delete_task releases their blobs), the old embedded comments aren't
+    task_doc = await db["tasks"].find_one({"_id": obj_id}, projection={"comments": 0, "search_terms": 0})
     
     if not task_doc:
         raise HTTPException(status_code=404, detail="Task not found")
@@ -176,17 +272,8 @@ async def get_task_leader_only(
     # Check B: User is a Team Leader of the TEAM this task belongs to
     # (This covers the case where a leader wants to edit a task created by a previous leader)
     if current_user.role == Role.TEAM_LEADER:
-        team_id = task.team_id
         try:
-            # Internal Service Call to Team Service
-            team_service_url = f"http://team_service:8002/teams/{team_id}/internal/is-leader/{current_user.username}"
-            async with httpx.AsyncClient() as client:
-                # Forward the user's token so the Team Service accepts the request
-                headers = {"Authorization": f"Bearer {current_user.token}"}
-                response = await client.get(team_service_url, headers=headers)
-            
-            # If Team Service confirms they are the leader, allow access
-            if response.status_code == 200 and response.json().get("is_leader"):
+            if await resolve_team_access(task.team_id, current_user) == TeamAccess.LEADER:
                 return task 
         except Exception:
             # If the internal call fails, we just fall through to the 403 error below
@@ -219,15 +306,19 @@ async def authorize_comment_deletion(
     # 2. Find the Task and Comment
     task_doc = await db["tasks"].find_one(
         {"_id": task_obj_id}, 
-        projection={"team_id": 1, "comments": 1}
+        projection={"team_id": 1, **LEGACY_COMMENTS_PROBE}
     )
     if not task_doc:
         raise HTTPException(status_code=404, detail="Task not found.")
     
-    comments = task_doc.get("comments", [])
-    
-    # Find the specific comment within the list
-    target_comment = next((c for c in comments if c["_id"] == comment_obj_id), None)
+    # comments still embedded in an old task are moved to their collection first
+    if has_legacy_comments(task_doc):
+        await migrate_task_comments(db, task_obj_id)
+
+    target_comment = await db[COMMENTS_COLLECTION].find_one(
+        {"_id": comment_obj_id, "task_id": task_obj_id},
+        projection={"created_by": 1}
+    )
     if not target_comment:
         raise HTTPException(status_code=404, detail="Comment not found.")
 
@@ -240,13 +331,7 @@ async def authorize_comment_deletion(
     team_id = task_doc["team_id"]
     if current_user.role == Role.TEAM_LEADER:
         try:
-            team_service_url = f"http://team_service:8002/teams/{team_id}/internal/is-leader/{current_user.username}"
-            async with httpx.AsyncClient() as client:
-                headers = {"Authorization": f"Bearer {current_user.token}"}
-                response = await client.get(team_service_url, headers=headers)
-            
-            # Team Service returns 200 if the user is the leader of that team, 404/403 otherwise
-            if response.status_code == 200 and response.json().get("is_leader"):
+            if await resolve_team_access(team_id, current_user) == TeamAccess.LEADER:
                 user_is_leader = True
         except Exception:
             # Service error, assume not authorized for safety
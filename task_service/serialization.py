@@ -0,0 +1,49 @@
+from typing import List, Optional, Tuple
+
+from fastapi import HTTPException, Response
+from pydantic_core import to_json
+
+from pagination import set_next_cursor
+from schemas import TaskOut
+
+# --- Lean serialization of task listings ---
+# List pages can hold hundreds of tasks. Building a TaskOut per document only re-validates
+# what we wrote ourselves, so listings read just the TaskOut fields from Mongo and encode
+# the plain dicts straight to JSON (same encoder pydantic uses, so the output is identical).
+
+TASK_OUT_FIELDS = tuple(TaskOut.model_fields)  # ("id", "team_id", "title", ...)
+
+
+def parse_task_fields(fields: Optional[str]) -> Tuple[str, ...]:
+    """
+    ?fields=title,status,due_date -> the TaskOut fields to return, in TaskOut order.
+    id is always included; no parameter means every field. Unknown names are a 400.
+    """
+    if not fields:
+        return TASK_OUT_FIELDS
+    requested = {name.strip() for name in fields.split(",") if name.strip()}
+    unknown = requested - set(TASK_OUT_FIELDS)
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown task field(s): {', '.join(sorted(unknown))}. Allowed: {', '.join(TASK_OUT_FIELDS)}."
+        )
+    requested.add("id")
+    return tuple(name for name in TASK_OUT_FIELDS if name in requested)
+
+
+def task_list_projection(fields: Tuple[str, ...], sort: List[Tuple[str, int]]) -> dict:
+    # the sort fields are read too, the pagination cursor is built from them
+    projection = {name: 1 for name in fields if name != "id"}
+    projection.update({name: 1 for name, _ in sort if name != "_id"})
+    return projection
+
+
+def task_list_response(docs: list, fields: Tuple[str, ...], next_cursor: Optional[str] = None) -> Response:
+    items = [
+        {name: (str(doc["_id"]) if name == "id" else doc.get(name)) for name in fields}
+        for doc in docs
+    ]
+    response = Response(content=to_json(items), media_type="application/json")
+    set_next_cursor(response, next_cursor)
+    return response
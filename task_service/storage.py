@@ -0,0 +1,340 @@
+import asyncio
+import hashlib
+import logging
+import os
+import re
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import AsyncIterable, AsyncIterator, Dict, List, NamedTuple, Optional
+
+import multipart
+from fastapi import HTTPException, Request
+from fastapi.responses import JSONResponse
+from multipart.exceptions import MultipartParseError
+from multipart.multipart import parse_options_header
+from pymongo import ReturnDocument
+from starlette.concurrency import run_in_threadpool
+
+logger = logging.getLogger("task_service")
+
+# --- Settings ---
+MAX_ATTACHMENT_BYTES = int(os.getenv("MAX_ATTACHMENT_BYTES", str(50 * 1024 * 1024))) # 50 MB
+UPLOAD_CHUNK_SIZE = 1024 * 1024 # 1 MB
+# room for the multipart boundaries and part headers around the file in the request body
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+# Unreferenced blobs are deleted by a background sweep every BLOB_GC_INTERVAL_SECONDS,
+# once they have been unreferenced for at least BLOB_GC_GRACE_SECONDS
+BLOB_GC_INTERVAL_SECONDS = float(os.getenv("BLOB_GC_INTERVAL_SECONDS", "600"))
+BLOB_GC_GRACE_SECONDS = float(os.getenv("BLOB_GC_GRACE_SECONDS", "600"))
+# Cache-Control for downloads: browsers may keep a copy but must revalidate it (cheap 304s)
+ATTACHMENT_CACHE_CONTROL = os.getenv("ATTACHMENT_CACHE_CONTROL", "private, no-cache")
+
+UPLOAD_BASE_DIR = Path("task_files")
+BLOB_DIR = UPLOAD_BASE_DIR / "blobs"        # content-addressed files, one per distinct content
+STAGING_DIR = UPLOAD_BASE_DIR / ".staging"  # uploads in progress, before we know their hash
+BLOB_DIR.mkdir(parents=True, exist_ok=True)
+STAGING_DIR.mkdir(parents=True, exist_ok=True)
+
+# Mongo collection with one document per blob: {_id: sha256, refcount, size, path, released_at}
+BLOBS_COLLECTION = "attachment_blobs"
+
+
+class StoredUpload(NamedTuple):
+    path: Path     # final location on disk
+    size: int      # bytes
+    sha256: str    # hex digest of the content
+
+
+def too_large_error(max_bytes: int = MAX_ATTACHMENT_BYTES) -> HTTPException:
+    return HTTPException(
+        status_code=413,
+        detail=f"File is too large. The maximum size is {round(max_bytes / (1024 * 1024), 1):g} MB."
+    )
+
+# POST /tasks/{task_id}/attachments
+_UPLOAD_PATH = re.compile(r"^/tasks/[^/]+/attachments/?$")
+
+
+class UploadSizeLimitMiddleware:
+    """
+    Caps the request body of attachment uploads at max_bytes (plus the multipart overhead).
+    A too large Content-Length is rejected before the body is read; otherwise the body is counted
+    as it is received (chunked uploads have no Content-Length) and a 413 is raised as soon
+    as it goes over, so an oversized body is never read in full.
+    """
+    def __init__(self, app, max_bytes: int = MAX_ATTACHMENT_BYTES):
+        self.app = app
+        self.max_body_bytes = max_bytes + MULTIPART_OVERHEAD_BYTES
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or not _UPLOAD_PATH.match(scope["path"]):
+            await self.app(scope, receive, send)
+            return
+
+        length = dict(scope["headers"]).get(b"content-length")
+        if length is not None and length.isdigit() and int(length) > self.max_body_bytes:
+            error = too_large_error()
+            response = JSONResponse({"detail": error.detail}, status_code=error.status_code)
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def receive_with_limit():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body_bytes:
+                    # raised inside the route while it reads the body: answered by the exception handlers
+                    raise too_large_error()
+            return message
+
+        await self.app(scope, receive_with_limit, send)
+
+
+class MultipartFileStream:
+    """
+    The data of one file field of a multipart/form-data request, parsed from the body as it
+    is received: iterating it yields the file content in chunks of about UPLOAD_CHUNK_SIZE
+    (the other fields are skipped). filename and content_type are set once the part's headers
+    have been read, i.e. after the first chunk. Unlike an UploadFile parameter, nothing is
+    spooled to a temp file first and the route can run its checks before the body is read.
+    Raises 400 if the body is not valid multipart, 422 if it has no such file field.
+    """
+    def __init__(self, request: Request, field_name: str = "file"):
+        self.request = request
+        self.field_name = field_name.encode()
+        self.filename: Optional[str] = None
+        self.content_type: Optional[str] = None
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        media_type, params = parse_options_header(self.request.headers.get("content-type", ""))
+        if media_type != b"multipart/form-data" or not params.get(b"boundary"):
+            raise HTTPException(status_code=422, detail="Expected a multipart/form-data body.")
+
+        headers: List[tuple] = []
+        header = [b"", b""]
+        in_file = False
+        found = False
+        pending: List[bytes] = []
+        pending_size = 0
+
+        def on_part_begin():
+            headers.clear()
+
+        def on_header_field(data, start, end):
+            header[0] += data[start:end]
+
+        def on_header_value(data, start, end):
+            header[1] += data[start:end]
+
+        def on_header_end():
+            headers.append((header[0].lower(), header[1]))
+            header[0] = header[1] = b""
+
+        def on_headers_finished():
+            nonlocal in_file, found
+            part_headers = dict(headers)
+            _, disposition = parse_options_header(part_headers.get(b"content-disposition", b""))
+            # the first file with that name only
+            if not found and disposition.get(b"name") == self.field_name and b"filename" in disposition:
+                in_file = found = True
+                self.filename = disposition[b"filename"].decode("utf-8", "replace")
+                self.content_type = part_headers.get(b"content-type", b"").decode("latin-1") or None
+
+        def on_part_data(data, start, end):
+            nonlocal pending_size
+            if in_file:
+                pending.append(data[start:end])
+                pending_size += end - start
+
+        def on_part_end():
+            nonlocal in_file
+            in_file = False
+
+        parser = multipart.MultipartParser(params[b"boundary"], {
+            "on_part_begin": on_part_begin,
+            "on_header_field": on_header_field,
+            "on_header_value": on_header_value,
+            "on_header_end": on_header_end,
+            "on_headers_finished": on_headers_finished,
+            "on_part_data": on_part_data,
+            "on_part_end": on_part_end,
+        })
+        try:
+            async for body in self.request.stream():
+                parser.write(body)
+                if pending_size >= UPLOAD_CHUNK_SIZE:
+                    yield b"".join(pending)
+                    pending.clear()
+                    pending_size = 0
+            parser.finalize()
+        except MultipartParseError:
+            raise HTTPException(status_code=400, detail="Malformed multipart body.")
+        if not found:
+            raise HTTPException(status_code=422, detail=f"The form has no '{self.field_name.decode()}' file field.")
+        if pending:
+            yield b"".join(pending)
+
+
+def _write_chunk(f, digest, chunk: bytes):
+    # runs in the threadpool: the disk write and the hashing stay off the event loop
+    f.write(chunk)
+    digest.update(chunk)
+
+def _discard(path: Path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+async def save_upload(chunks: AsyncIterable[bytes], destination: Path, max_bytes: int = MAX_ATTACHMENT_BYTES) -> StoredUpload:
+    """
+    Streams an upload (e.g. a MultipartFileStream) to `destination` chunk by chunk, enforcing
+    max_bytes and computing the SHA-256 on the way. The data goes to a temp file in the same directory
+    and is renamed into place only when complete, so a partial upload is never visible.
+    Raises 413 if the file is too large, 500 if it can't be written.
+    """
+    temp_path = destination.with_name(f".{destination.name}.part")
+    digest = hashlib.sha256()
+    size = 0
+
+    try:
+        f = await run_in_threadpool(open, temp_path, "wb")
+    except OSError:
+        raise HTTPException(status_code=500, detail="Failed to save file on server.")
+
+    try:
+        async for chunk in chunks:
+            size += len(chunk)
+            if size > max_bytes:
+                raise too_large_error(max_bytes)
+            await run_in_threadpool(_write_chunk, f, digest, chunk)
+        await run_in_threadpool(f.close)
+        await run_in_threadpool(os.replace, temp_path, destination)
+    except HTTPException:
+        await run_in_threadpool(f.close)
+        await run_in_threadpool(_discard, temp_path)
+        raise
+    except Exception:
+        await run_in_threadpool(f.close)
+        await run_in_threadpool(_discard, temp_path)
+        raise HTTPException(status_code=500, detail="Failed to save file on server.")
+
+    return StoredUpload(path=destination, size=size, sha256=digest.hexdigest())
+
+
+# ---------------------------------------------------------
+# CONTENT-ADDRESSED BLOB STORE
+# ---------------------------------------------------------
+# Every attachment subdocument with a sha256 holds one reference to the blob with that hash.
+# Uploading content that already exists only bumps the refcount (the new file is discarded),
+# and deletes only decrement it. Blobs that stay at refcount 0 are removed by collect_garbage().
+
+def blob_path(sha256: str) -> Path:
+    # two levels of fan-out so no directory ends up with millions of entries
+    return BLOB_DIR / sha256[:2] / sha256[2:4] / sha256
+
+def _move_into_store(staged: Path, target: Path):
+    if target.exists():
+        # same hash, same content: keep the existing file
+        _discard(staged)
+    else:
+        target.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(staged, target)
+
+
+async def add_blob_reference(db, stored: StoredUpload) -> Path:
+    """
+    Takes a staged upload (see save_upload) into the blob store and returns the blob path.
+    The reference is counted first and the file moved afterwards, so a concurrent
+    garbage collection can never remove a blob we just started referencing (see collect_garbage).
+    """
+    target = blob_path(stored.sha256)
+    await db[BLOBS_COLLECTION].update_one(
+        {"_id": stored.sha256},
+        {
+            "$inc": {"refcount": 1},
+            "$unset": {"released_at": ""},
+            "$setOnInsert": {"size": stored.size, "path": str(target), "created_at": datetime.now()},
+        },
+        upsert=True,
+    )
+    try:
+        await run_in_threadpool(_move_into_store, stored.path, target)
+    except Exception:
+        await release_blob_references(db, {stored.sha256: 1})
+        await run_in_threadpool(_discard, stored.path)
+        raise HTTPException(status_code=500, detail="Failed to save file on server.")
+    return target
+
+
+async def release_blob_references(db, counts: Dict[str, int]):
+    """ Drops references ({sha256: how many}). Blobs reaching 0 are left for the background sweep. """
+    for sha256, count in counts.items():
+        blob = await db[BLOBS_COLLECTION].find_one_and_update(
+            {"_id": sha256},
+            {"$inc": {"refcount": -count}},
+            projection={"refcount": 1},
+            return_document=ReturnDocument.AFTER,
+        )
+        if blob is not None and blob["refcount"] <= 0:
+            await db[BLOBS_COLLECTION].update_one(
+                {"_id": sha256, "refcount": {"$lte": 0}},
+                {"$set": {"released_at": datetime.now()}},
+            )
+
+
+def count_blob_references(attachments: list) -> Dict[str, int]:
+    counts = {}
+    for att in attachments:
+        if att.get("sha256"):
+            counts[att["sha256"]] = counts.get(att["sha256"], 0) + 1
+    return counts
+
+
+async def collect_garbage(db, grace_seconds: float = BLOB_GC_GRACE_SECONDS) -> int:
+    """
+    Deletes blobs that have been unreferenced for longer than grace_seconds. Returns how many.
+    The file is first renamed aside, then the document is deleted only if still unreferenced;
+    if an upload re-referenced the blob in between, the file is put back.
+    """
+    cutoff = datetime.now() - timedelta(seconds=grace_seconds)
+    candidates = await db[BLOBS_COLLECTION].find(
+        {"refcount": {"$lte": 0}, "released_at": {"$lte": cutoff}},
+        projection={"_id": 1},
+    ).to_list(length=1000)
+
+    removed = 0
+    for blob in candidates:
+        target = blob_path(blob["_id"])
+        trash = target.with_name(f".{target.name}.deleting")
+        try:
+            await run_in_threadpool(os.replace, target, trash)
+        except FileNotFoundError:
+            trash = None
+
+        result = await db[BLOBS_COLLECTION].delete_one({"_id": blob["_id"], "refcount": {"$lte": 0}})
+        if trash is None:
+            removed += result.deleted_count
+        elif result.deleted_count:
+            await run_in_threadpool(_discard, trash)
+            removed += 1
+        else:
+            # re-referenced meanwhile: restore it (unless the new upload already put the same content back)
+            await run_in_threadpool(_move_into_store, trash, target)
+    return removed
+
+
+async def run_blob_gc_forever(db):
+    """ Background sweep started by main.py """
+    while True:
+        await asyncio.sleep(BLOB_GC_INTERVAL_SECONDS)
+        try:
+            removed = await collect_garbage(db)
+            if removed:
+                logger.info("Blob GC removed %s unreferenced attachment blobs", removed)
+        except Exception as e:
+            logger.error("Blob GC failed: %s", e)
@@ -0,0 +1,224 @@
+"""
+Materialized task counts, per team and per assignee.
+
+One document per team ("team:<team_id>") and per user ("user:<username>") in task_stats:
+    {"_id", "scope", "key", "total", "by_status": {...}, "by_priority": {...}, "updated_at"}
+so GET /tasks/stats/team/{team_id} and /tasks/stats/me are a single _id lookup instead of
+a scan of the tasks.
+
+Every write to tasks (routes.py) applies the matching $inc right after it, in one bulk_write.
+The increments aren't in a transaction with the task write: a crash in between, or a failed
+stats write, leaves a counter off. reconcile_task_stats recounts everything from the tasks
+collection, fixes the documents and reports the drift it found. It runs every
+TASK_STATS_RECONCILE_SECONDS in the background, and on demand with `python task_stats.py`.
+(A task written while a reconcile runs can leave a counter off until the next one.)
+"""
+import asyncio
+import logging
+import os
+import sys
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Optional
+
+from pymongo import DeleteOne, ReplaceOne, UpdateOne
+
+from schemas import TaskPriority, TaskStatus, TaskStats
+
+logger = logging.getLogger("task_service")
+
+# --- Settings ---
+TASK_STATS_COLLECTION = "task_stats"
+# 0: only the reconcile at startup (it can still be run by hand)
+TASK_STATS_RECONCILE_SECONDS = float(os.getenv("TASK_STATS_RECONCILE_SECONDS", "3600"))
+# how many drifted documents are logged / printed by a reconcile
+DRIFT_EXAMPLES = 20
+
+TEAM = "team"
+USER = "user"
+
+
+def stats_id(scope: str, key: str) -> str:
+    return f"{scope}:{key}"
+
+
+def _counters(task: dict, amount: int) -> Dict[str, int]:
+    counters = {"total": amount}
+    if task.get("status"):
+        counters[f"by_status.{task['status']}"] = amount
+    if task.get("priority"):
+        counters[f"by_priority.{task['priority']}"] = amount
+    return counters
+
+
+class TaskStatsDelta:
+    """
+    The $inc to apply for a set of task writes: add() the tasks created, remove() the ones
+    deleted, both for an update (old version removed, new one added). Only the keys present
+    count: a task without team_id only changes its assignee's counters. Opposite increments
+    cancel out, so e.g. a title change writes nothing.
+    """
+    def __init__(self):
+        self._incs: Dict[tuple, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+
+    def _apply(self, task: dict, amount: int):
+        for scope, key in ((TEAM, task.get("team_id")), (USER, task.get("assigned_to"))):
+            if key:
+                for field, value in _counters(task, amount).items():
+                    self._incs[(scope, key)][field] += value
+
+    def add(self, task: dict, count: int = 1):
+        self._apply(task, count)
+
+    def remove(self, task: dict, count: int = 1):
+        self._apply(task, -count)
+
+    def update(self, before: dict, after: dict):
+        self.remove(before)
+        self.add(after)
+
+    def operations(self, now: datetime) -> list:
+        operations = []
+        for (scope, key), counters in self._incs.items():
+            inc = {field: value for field, value in counters.items() if value}
+            if inc:
+                operations.append(UpdateOne(
+                    {"_id": stats_id(scope, key)},
+                    {"$inc": inc, "$set": {"updated_at": now}, "$setOnInsert": {"scope": scope, "key": key}},
+                    upsert=True,
+                ))
+        return operations
+
+
+async def apply_task_stats(db, delta: TaskStatsDelta):
+    """
+    Writes the delta in one bulk_write. A failure is only logged: the task write already
+    happened, and the next reconcile fixes the counters.
+    """
+    operations = delta.operations(datetime.now())
+    if not operations:
+        return
+    try:
+        await db[TASK_STATS_COLLECTION].bulk_write(operations, ordered=False)
+    except Exception as e:
+        logger.error("Task stats update failed, counters will be fixed by the next reconcile: %s", e)
+
+
+async def get_task_stats(db, scope: str, key: str) -> TaskStats:
+    doc = await db[TASK_STATS_COLLECTION].find_one({"_id": stats_id(scope, key)}) or {}
+    by_status = {s.value: 0 for s in TaskStatus}
+    by_status.update(doc.get("by_status", {}))
+    by_priority = {p.value: 0 for p in TaskPriority}
+    by_priority.update(doc.get("by_priority", {}))
+    return TaskStats(
+        total=doc.get("total", 0),
+        by_status=by_status,
+        by_priority=by_priority,
+        updated_at=doc.get("updated_at"),
+    )
+
+
+# --- Reconcile ---
+
+async def _count_tasks(db, field: str, scope: str, now: datetime) -> Dict[str, dict]:
+    """ Recounts the tasks grouped by `field` (team_id or assigned_to): stats _id -> document """
+    expected = {}
+    pipeline = [
+        {"$group": {"_id": {"key": f"${field}", "status": "$status", "priority": "$priority"}, "count": {"$sum": 1}}},
+    ]
+    async for group in db["tasks"].aggregate(pipeline):
+        key = group["_id"].get("key")
+        if not key:
+            continue
+        doc = expected.setdefault(stats_id(scope, key), {
+            "_id": stats_id(scope, key), "scope": scope, "key": key,
+            "total": 0, "by_status": {}, "by_priority": {}, "updated_at": now,
+        })
+        count = group["count"]
+        doc["total"] += count
+        for counter, value in (("by_status", group["_id"].get("status")), ("by_priority", group["_id"].get("priority"))):
+            if value:
+                doc[counter][value] = doc[counter].get(value, 0) + count
+    return expected
+
+
+def _nonzero(counts: Optional[dict]) -> dict:
+    return {name: value for name, value in (counts or {}).items() if value}
+
+
+def _drifted(stored: Optional[dict], expected: Optional[dict]) -> bool:
+    stored, expected = stored or {}, expected or {}
+    return (
+        stored.get("total", 0) != expected.get("total", 0)
+        or _nonzero(stored.get("by_status")) != _nonzero(expected.get("by_status"))
+        or _nonzero(stored.get("by_priority")) != _nonzero(expected.get("by_priority"))
+    )
+
+
+async def reconcile_task_stats(db) -> dict:
+    """
+    Rebuilds task_stats from the tasks collection. Only the documents that differ are written
+    (documents of teams/users without tasks anymore are deleted). Returns a drift report.
+    """
+    now = datetime.now()
+    expected = await _count_tasks(db, "team_id", TEAM, now)
+    expected.update(await _count_tasks(db, "assigned_to", USER, now))
+
+    stored = {doc["_id"]: doc async for doc in db[TASK_STATS_COLLECTION].find({})}
+
+    operations = []
+    drifted = []
+    for _id in expected.keys() | stored.keys():
+        if not _drifted(stored.get(_id), expected.get(_id)):
+            continue
+        drifted.append({
+            "id": _id,
+            "stored_total": stored.get(_id, {}).get("total", 0),
+            "expected_total": expected.get(_id, {}).get("total", 0),
+        })
+        if _id in expected:
+            operations.append(ReplaceOne({"_id": _id}, expected[_id], upsert=True))
+        else:
+            operations.append(DeleteOne({"_id": _id}))
+
+    if operations:
+        await db[TASK_STATS_COLLECTION].bulk_write(operations, ordered=False)
+
+    drifted.sort(key=lambda d: d["id"])
+    report = {
+        "checked": len(expected.keys() | stored.keys()),
+        "drifted": len(drifted),
+        "examples": drifted[:DRIFT_EXAMPLES],
+    }
+    if drifted:
+        logger.warning("Task stats reconcile fixed %s drifted documents: %s", len(drifted), report["examples"])
+    return report
+
+
+async def run_task_stats_reconcile_forever(db):
+    """ Background job started by main.py: a first pass at startup (builds the collection
+    on existing data), then one every TASK_STATS_RECONCILE_SECONDS """
+    while True:
+        try:
+            await reconcile_task_stats(db)
+        except Exception as e:
+            logger.error("Task stats reconcile failed: %s", e)
+        if TASK_STATS_RECONCILE_SECONDS <= 0:
+            return
+        await asyncio.sleep(TASK_STATS_RECONCILE_SECONDS)
+
+
+async def _main() -> int:
+    from db import get_database
+    report = await reconcile_task_stats(get_database())
+    print(f"Checked {report['checked']} task stats documents, {report['drifted']} drifted (fixed)")
+    for drift in report["examples"]:
+        print(f"  {drift['id']}: stored total {drift['stored_total']}, expected {drift['expected_total']}")
+    return 0
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s [%(name)s] %(message)s")
+    sys.exit(asyncio.run(_main()))
@@ -2,6 +2,8 @@ import os
 from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
 from functools import lru_cache
 
+from metrics import MongoCommandTimer
+
 # This is the single client for the entire application
 # Motor handles connection pooling automatically.
 client: AsyncIOMotorClient = None
@@ -17,7 +19,8 @@ def get_database() -> AsyncIOMotorDatabase:
     """
     global client
     if client is None:
-        client = AsyncIOMotorClient(get_mongo_uri())
+        # the listener adds the time of each command to the current request's metrics
+        client = AsyncIOMotorClient(get_mongo_uri(), event_listeners=[MongoCommandTimer()])
         
     # "pms_db" is the database name we defined in our .env
     return client["pms_db"]
\ No newline at end of file
@@ -0,0 +1,115 @@
+"""
+Mongo indexes for the collections owned by team_service (teams, team_notification_outbox).
+
+ensure_indexes() runs on startup and is idempotent: creating an index that already
+exists with the same keys/name is a no-op in Mongo.
+
+Run this file directly to get an explain() report of the queries behind our routes:
+    python indexes.py            # report only, exits with 1 if any query does a COLLSCAN
+    python indexes.py --create   # create the indexes first, then report
+"""
+import asyncio
+import logging
+import sys
+
+from pymongo import ASCENDING, IndexModel
+
+logger = logging.getLogger("team_service")
+
+# list_teams is paginated with a keyset cursor on _id (see pagination.py), so the indexes
+# end with _id and each $or branch is read in _id order (SORT_MERGE instead of a blocking SORT).
+INDEXES = {
+    "teams": [
+        # list_teams ($or on leader_id / member_ids), list_teams_led_by_user, _is_user_still_leader
+        IndexModel([("leader_id", ASCENDING), ("_id", ASCENDING)], name="teams_leader_id"),
+        # multikey index: one entry per member username
+        IndexModel([("member_ids", ASCENDING), ("_id", ASCENDING)], name="teams_members_id"),
+    ],
+    "team_notification_outbox": [
+        # outbox dispatcher (pending entries, oldest first) and the queue depth / lag stats
+        IndexModel([("status", ASCENDING), ("_id", ASCENDING)], name="team_notification_outbox_status_id"),
+    ],
+}
+
+# Indexes created by earlier versions and replaced by the ones above
+OBSOLETE_INDEXES = {
+    "teams": ["teams_leader", "teams_members"],
+}
+
+# (route, collection, filter, sort) - sample values, only the shape matters to the planner
+ROUTE_QUERIES = [
+    ("list_teams", "teams", {"$or": [{"leader_id": "sample_user"}, {"member_ids": "sample_user"}]}, [("_id", ASCENDING)]),
+    ("list_teams_led_by_user", "teams", {"leader_id": "sample_user"}, None),
+    ("_is_user_still_leader", "teams", {"leader_id": "sample_user"}, None),
+]
+
+
+async def ensure_indexes(db):
+    for collection, names in OBSOLETE_INDEXES.items():
+        try:
+            existing = await db[collection].index_information()
+            for name in names:
+                if name in existing:
+                    await db[collection].drop_index(name)
+                    logger.info("Dropped obsolete index %s on %s", name, collection)
+        except Exception as e:
+            logger.error("Could not drop obsolete indexes on %s: %s", collection, e)
+
+    for collection, models in INDEXES.items():
+        try:
+            names = await db[collection].create_indexes(models)
+            logger.info("Indexes ensured on %s: %s", collection, ", ".join(names))
+        except Exception as e:
+            # Never block the service from starting because of an index problem
+            logger.error("Could not create indexes on %s: %s", collection, e)
+
+
+def _plan_stages(plan) -> list:
+    """ Collects every "stage" (and index name) found in an explain() winning plan. """
+    stages = []
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            stage = plan["stage"]
+            if plan.get("indexName"):
+                stage = f"{stage}({plan['indexName']})"
+            stages.append(stage)
+        for value in plan.values():
+            stages.extend(_plan_stages(value))
+    elif isinstance(plan, list):
+        for item in plan:
+            stages.extend(_plan_stages(item))
+    return stages
+
+
+async def explain_route_queries(db) -> list:
+    """ Returns (route, stages, has_collscan) for every query in ROUTE_QUERIES. """
+    report = []
+    for route, collection, query, sort in ROUTE_QUERIES:
+        find_cmd = {"find": collection, "filter": query}
+        if sort:
+            find_cmd["sort"] = dict(sort)
+        result = await db.command("explain", find_cmd, verbosity="queryPlanner")
+        stages = _plan_stages(result["queryPlanner"]["winningPlan"])
+        report.append((route, stages, any(s.startswith("COLLSCAN") for s in stages)))
+    return report
+
+
+async def _main(create: bool) -> int:
+    from db import get_database
+    db = get_database()
+    if create:
+        await ensure_indexes(db)
+
+    collscans = 0
+    for route, stages, has_collscan in await explain_route_queries(db):
+        flag = "COLLSCAN" if has_collscan else "ok"
+        collscans += has_collscan
+        print(f"{flag:<9} {route:<45} {' <- '.join(stages)}")
+    return 1 if collscans else 0
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s [%(name)s] %(message)s")
+    sys.exit(asyncio.run(_main(create="--create" in sys.argv[1:])))
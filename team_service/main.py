@@ -1,10 +1,17 @@
 from dotenv import load_dotenv
 load_dotenv() # This reads the root .env file
 
+import asyncio
+import logging
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 from routes import router as teams_router
+import http_client
+import metrics
+from db import get_database
+from indexes import ensure_indexes
+from outbox import get_outbox_stats, run_outbox_dispatcher
 
 app = FastAPI(title="Team Management API", version="0.1.0")
 
@@ -14,10 +21,46 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"], # pagination cursor of list endpoints
 )
+# added last so it's the outermost: the latency includes CORS handling
+app.add_middleware(metrics.MetricsMiddleware)
 
 app.include_router(teams_router)
 
+# One pooled HTTP client for all calls to user_service / task_service, tied to the app lifecycle.
+# The Mongo indexes are (re)created on every startup, which is a no-op when they already exist.
+# The notification outbox dispatcher sends queued notifications for the lifetime of the app.
+background_tasks = []
+
+@app.on_event("startup")
+async def on_startup():
+    http_client.get_http_client()
+    await ensure_indexes(get_database())
+    background_tasks.append(asyncio.create_task(run_outbox_dispatcher(get_database())))
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    for task in background_tasks:
+        task.cancel()
+    await http_client.close_http_client()
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s %(levelname)s [%(name)s] %(message)s",
+)
+
 @app.get("/health")
 def health():
-    return {"service": "Team Management API", "status": "running"}
\ No newline at end of file
+    return {"service": "Team Management API", "status": "running"}
+
+@app.get("/internal/stats", include_in_schema=False)
+async def internal_stats():
+    return {
+        "http_client": http_client.get_stats(),
+        "notification_outbox": await get_outbox_stats(get_database()),
+    }
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
@@ -0,0 +1,180 @@
+"""
+Outbox for the notifications team_service asks task_service to create (e.g. TEAM_ADD).
+
+add_member_to_team used to POST to task_service before answering, so its latency included
+that call, and a notification was lost whenever task_service was down. Now the route inserts
+an entry in team_notification_outbox and responds. A background dispatcher (started by main.py)
+sends the pending entries in batches to POST /tasks/notifications/internal/batch.
+
+- Every entry is sent with idempotency_key "team_service:<entry id>": if the call succeeded
+  but we didn't get to mark the entry, task_service queues it only once when it's sent again.
+- Failed sends are retried with exponential backoff; after OUTBOX_MAX_ATTEMPTS the entries
+  are marked "failed" and left in the collection for inspection.
+- Entries task_service rejects (the batch response lists them by index) are marked "failed"
+  right away; the other entries of the batch are delivered.
+- Delivered entries are deleted.
+"""
+import asyncio
+import os
+from collections import deque
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from pymongo import UpdateOne
+
+from http_client import get_http_client
+
+# --- Settings ---
+OUTBOX_COLLECTION = "team_notification_outbox"
+NOTIFY_BATCH_URL = "http://task_service:8003/tasks/notifications/internal/batch"
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "200"))
+# The dispatcher is woken up by every enqueue; this is only the safety net (and the retry clock)
+OUTBOX_POLL_SECONDS = float(os.getenv("OUTBOX_POLL_SECONDS", "1"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "10"))
+OUTBOX_MAX_BACKOFF_SECONDS = 60
+
+PENDING = "pending"
+FAILED = "failed"
+
+
+class OutboxStats:
+    """ Counters of this process, reported with the queue depth by /internal/stats. """
+    def __init__(self, size: int = 1000):
+        self.enqueued = 0
+        self.delivered = 0
+        self.batches = 0
+        self.retries = 0
+        self.given_up = 0
+        self.delivery_lag = deque(maxlen=size)  # seconds from enqueue to delivery
+
+    def stats(self) -> dict:
+        ordered = sorted(self.delivery_lag)
+        def percentile(p):
+            if not ordered:
+                return 0.0
+            return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))] * 1000, 3)
+        return {
+            "enqueued": self.enqueued,
+            "delivered": self.delivered,
+            "batches": self.batches,
+            "retries": self.retries,
+            "given_up": self.given_up,
+            "delivery_lag_p50_ms": percentile(0.50),
+            "delivery_lag_p95_ms": percentile(0.95),
+        }
+
+stats = OutboxStats()
+
+# set by enqueue_notification, so the dispatcher sends new entries right away
+_wakeup = asyncio.Event()
+
+
+async def enqueue_notification(db, user_id: str, title: str, message: str, link: str, type: str):
+    now = datetime.now()
+    await db[OUTBOX_COLLECTION].insert_one({
+        "_id": ObjectId(),
+        "notification": {"user_id": user_id, "title": title, "message": message, "link": link, "type": type},
+        "status": PENDING,
+        "attempts": 0,
+        "enqueued_at": now,
+        "next_attempt_at": now,
+    })
+    stats.enqueued += 1
+    _wakeup.set()
+
+
+async def dispatch_batch(db) -> int:
+    """ Sends up to OUTBOX_BATCH_SIZE due entries in one call. Returns how many entries were processed. """
+    now = datetime.now()
+    batch = await db[OUTBOX_COLLECTION].find(
+        {"status": PENDING, "next_attempt_at": {"$lte": now}}
+    ).sort("_id", 1).to_list(length=OUTBOX_BATCH_SIZE)
+    if not batch:
+        return 0
+
+    payload = {"notifications": [
+        {**entry["notification"], "idempotency_key": f"team_service:{entry['_id']}"}
+        for entry in batch
+    ]}
+    try:
+        response = await get_http_client().post(NOTIFY_BATCH_URL, json=payload)
+        response.raise_for_status()
+    except Exception as e:
+        await _schedule_retries(db, batch, str(e), datetime.now())
+        return len(batch)
+
+    # entries task_service refused (e.g. an unknown type) won't be accepted on a retry either:
+    # only those are marked failed, the rest of the batch was queued
+    rejected = {item["index"]: item["error"] for item in response.json().get("rejected", [])}
+    if rejected:
+        await _mark_rejected(db, [(entry, rejected[i]) for i, entry in enumerate(batch) if i in rejected])
+    delivered = [entry for i, entry in enumerate(batch) if i not in rejected]
+
+    if delivered:
+        await db[OUTBOX_COLLECTION].delete_many({"_id": {"$in": [entry["_id"] for entry in delivered]}})
+    stats.delivered += len(delivered)
+    stats.batches += 1
+    stats.delivery_lag.extend((now - entry["enqueued_at"]).total_seconds() for entry in delivered)
+    return len(batch)
+
+
+async def _mark_rejected(db, rejected: list):
+    """ rejected: [(entry, error)] """
+    await db[OUTBOX_COLLECTION].bulk_write([
+        UpdateOne({"_id": entry["_id"]}, {"$set": {"status": FAILED, "attempts": entry["attempts"] + 1, "last_error": error}})
+        for entry, error in rejected
+    ], ordered=False)
+    stats.given_up += len(rejected)
+    print(f"Warning: Task service rejected {len(rejected)} notifications, marked as failed: {rejected[0][1]}")
+
+
+async def _schedule_retries(db, batch: list, error: str, now: datetime):
+    updates = []
+    for entry in batch:
+        attempts = entry["attempts"] + 1
+        if attempts >= OUTBOX_MAX_ATTEMPTS:
+            stats.given_up += 1
+            update = {"$set": {"status": FAILED, "attempts": attempts, "last_error": error}}
+        else:
+            stats.retries += 1
+            backoff = min(OUTBOX_MAX_BACKOFF_SECONDS, 2 ** attempts)
+            update = {"$set": {
+                "attempts": attempts,
+                "last_error": error,
+                "next_attempt_at": now + timedelta(seconds=backoff),
+            }}
+        updates.append(UpdateOne({"_id": entry["_id"]}, update))
+    await db[OUTBOX_COLLECTION].bulk_write(updates, ordered=False)
+    print(f"Warning: Could not deliver {len(batch)} notifications to task service, will retry: {error}")
+
+
+async def run_outbox_dispatcher(db):
+    """ Background job started by main.py """
+    while True:
+        _wakeup.clear()
+        try:
+            processed = await dispatch_batch(db)
+        except Exception as e:
+            print(f"Warning: Notification outbox dispatch failed: {e}")
+            processed = 0
+        if processed < OUTBOX_BATCH_SIZE:
+            # nothing more due: sleep until the next enqueue (or the poll interval for retries)
+            try:
+                await asyncio.wait_for(_wakeup.wait(), timeout=OUTBOX_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+
+async def get_outbox_stats(db) -> dict:
+    """ Queue depth and lag are read from Mongo, so they cover entries queued by any process """
+    depth = await db[OUTBOX_COLLECTION].count_documents({"status": PENDING})
+    oldest = await db[OUTBOX_COLLECTION].find_one(
+        {"status": PENDING}, projection={"enqueued_at": 1}, sort=[("_id", 1)]
+    )
+    lag = (datetime.now() - oldest["enqueued_at"]).total_seconds() if oldest else 0.0
+    return {
+        "depth": depth,
+        "oldest_pending_seconds": round(lag, 3),
+        "failed": await db[OUTBOX_COLLECTION].count_documents({"status": FAILED}),
+        **stats.stats(),
+    }
@@ -0,0 +1,91 @@
+import base64
+import json
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from bson import ObjectId
+from fastapi import HTTPException, Response
+
+# --- Keyset (cursor) pagination for Mongo listings ---
+# A page is fetched with `sort` (which must end with _id, so every position is unique)
+# and the cursor is the sort values of the last document, base64 encoded (opaque to clients).
+# The next page continues strictly after that position, so the cost of a page doesn't grow
+# with how deep we are in the listing (no skip()).
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def _encode_value(value):
+    if isinstance(value, ObjectId):
+        return {"$oid": str(value)}
+    if isinstance(value, datetime):
+        return {"$dt": value.isoformat()}
+    return value
+
+def _decode_value(value):
+    if isinstance(value, dict):
+        if "$oid" in value:
+            return ObjectId(value["$oid"])
+        if "$dt" in value:
+            return datetime.fromisoformat(value["$dt"])
+    return value
+
+
+def encode_cursor(doc: dict, sort: List[Tuple[str, int]]) -> str:
+    values = [_encode_value(doc[field]) for field, _ in sort]
+    raw = json.dumps(values, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str, sort: List[Tuple[str, int]]) -> list:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = [_decode_value(v) for v in json.loads(raw)]
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor.")
+    if len(values) != len(sort):
+        # cursor from a listing with a different sort order
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor.")
+    return values
+
+
+def keyset_filter(sort: List[Tuple[str, int]], values: list) -> dict:
+    """
+    Builds "position > cursor" for a compound sort, e.g. for [(due_date, 1), (_id, 1)]:
+    {"$or": [{"due_date": {"$gt": d}}, {"due_date": d, "_id": {"$gt": i}}]}
+    """
+    clauses = []
+    for i, (field, direction) in enumerate(sort):
+        clause = {sort[j][0]: values[j] for j in range(i)}
+        clause[field] = {"$gt" if direction > 0 else "$lt": values[i]}
+        clauses.append(clause)
+    return clauses[0] if len(clauses) == 1 else {"$or": clauses}
+
+
+async def fetch_page(
+    collection,
+    query: dict,
+    sort: List[Tuple[str, int]],
+    limit: int,
+    cursor: Optional[str] = None,
+    projection: Optional[dict] = None,
+) -> Tuple[list, Optional[str]]:
+    """ Returns (documents, next_cursor). next_cursor is None on the last page. """
+    if cursor:
+        query = {"$and": [query, keyset_filter(sort, decode_cursor(cursor, sort))]}
+
+    # fetch one extra document to know if there's a next page
+    docs = await collection.find(query, projection).sort(sort).limit(limit + 1).to_list(length=limit + 1)
+
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        next_cursor = encode_cursor(docs[-1], sort)
+    return docs, next_cursor
+
+
+def set_next_cursor(response: Response, next_cursor: Optional[str]):
+    # The body stays a plain list (so existing clients keep working), the cursor travels in a header
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
@@ -1,12 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
 from motor.motor_asyncio import AsyncIOMotorDatabase
-from typing import List
+from typing import List, Optional
 
 from db import get_database
+from http_client import get_http_client
+from outbox import enqueue_notification
+from pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, fetch_page, set_next_cursor
 from schemas import TeamCreate, TeamOut, TokenData, Role, TeamUpdate, MemberAdd, LeaderAssign
 from models import Team
 from security import get_current_user, get_current_admin_user, get_team_leader_or_admin, get_team_leader_only, get_team_access_or_admin
 from bson import ObjectId # For querying by ID
+from pymongo import ReturnDocument
 import httpx
 
 router = APIRouter(prefix="/teams")
@@ -42,13 +46,13 @@ async def create_team(
     user_service_url = f"http://user_service:8001/users/{new_leader_username}"
     
     try:
-        async with httpx.AsyncClient() as client:
-            # We need to send our *own* admin token to prove we can access this
-            auth_header = f"Bearer {admin_user.token}" # <-- We need to add this!
-            headers = {"Authorization": auth_header}
-            
-            response = await client.get(user_service_url, headers=headers)
+        client = get_http_client()
+        # We need to send our *own* admin token to prove we can access this
+        auth_header = f"Bearer {admin_user.token}" # <-- We need to add this!
+        headers = {"Authorization": auth_header}
         
+        response = await client.get(user_service_url, headers=headers)
+
         if response.status_code == 404:
             raise HTTPException(status_code=404, detail="Team Leader username not found.")
         response.raise_for_status() # Catch other errors
@@ -66,7 +70,8 @@ async def create_team(
         leader_id=user_data["username"], # Use the verified username
         member_ids=[user_data["username"]] # The leader is also a member
     )
-    result = await db["teams"].insert_one(new_team.model_dump(by_alias=True))
+    created_team = new_team.model_dump(by_alias=True)
+    await db["teams"].insert_one(created_team)
     
     # --- 3. Implement Your Plan (Point 1 & 2) ---
     # Now, promote the user to "team_leader" in the user_service
@@ -76,29 +81,32 @@ async def create_team(
         role_payload = {"role": "team_leader"}
         
         try:
-            async with httpx.AsyncClient() as client:
-                headers = {"Authorization": f"Bearer {admin_user.token}"} # Use admin token
-                await client.patch(promote_url, json=role_payload, headers=headers)
-                
+            client = get_http_client()
+            headers = {"Authorization": f"Bearer {admin_user.token}"} # Use admin token
+            await client.patch(promote_url, json=role_payload, headers=headers)
+            
         except Exception:
             # If this fails, we can just log it. The team is created,
             # but the role wasn't updated.
             print(f"Warning: Could not promote user {new_leader_username} in user_service.")
 
-    # --- 4. Return the new team ---
-    created_team = await db["teams"].find_one({"_id": result.inserted_id})
+    # --- 4. Return the new team (what we inserted, no need to read it back) ---
     return TeamOut(id=str(created_team["_id"]), **created_team)
 
 
 @router.get("", response_model=List[TeamOut], tags=["list teams"])
 async def list_teams(
+    response: Response,
     db: AsyncIOMotorDatabase = Depends(get_database),
-    current_user: TokenData = Depends(get_current_user)
+    current_user: TokenData = Depends(get_current_user),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
 ):
     """
     List all teams.
     - Admins see all teams.
     - Other users see only teams they are a member of.
+    Paginated by _id: if there are more teams, the X-Next-Cursor header holds the cursor of the next page.
     """
     query = {}
     if current_user.role != Role.ADMIN:
@@ -110,8 +118,8 @@ async def list_teams(
             ]
         }
     
-    teams_cursor = db["teams"].find(query)
-    teams = await teams_cursor.to_list(length=100)
+    teams, next_cursor = await fetch_page(db["teams"], query, [("_id", 1)], limit, cursor)
+    set_next_cursor(response, next_cursor)
     
     # Convert MongoDB docs to TeamOut schema
     return [TeamOut(id=str(team["_id"]), **team) for team in teams]
@@ -124,6 +132,17 @@ async def _is_user_still_leader(db: AsyncIOMotorDatabase, username: str) -> bool
     count = await db["teams"].count_documents({"leader_id": username})
     return count > 0
 
+# This is a helper, NOT an endpoint
+# Task service caches "is user X a member/leader of team Y" decisions, so we tell it
+# whenever the membership of a team changes. If this fails, the cache TTL still applies.
+async def _invalidate_task_access_cache(team_id: str):
+    task_service_url = f"http://task_service:8003/tasks/internal/team-access/{team_id}"
+    try:
+        client = get_http_client()
+        await client.delete(task_service_url)
+    except Exception as e:
+        print(f"Warning: Could not invalidate task service access cache for team {team_id}: {e}")
+
 @router.get("/leader/{username}", response_model=List[TeamOut], tags=["list teams"])
 async def list_teams_led_by_user(
     username: str,
@@ -189,11 +208,12 @@ async def delete_team(
 
     # --- 3. NEW: CLEANUP TASKS (Inter-Service Call) ---
     # We tell the task_service to delete all tasks belonging to this team.
+    # (this also drops task_service's cached access decisions for the team)
     task_service_url = f"http://task_service:8003/tasks/internal/cleanup-team/{team_id}"
     try:
-        async with httpx.AsyncClient() as client:
-            # Fire and forget - we don't strictly need to wait for the result
-            await client.delete(task_service_url)
+        client = get_http_client()
+        # Fire and forget - we don't strictly need to wait for the result
+        await client.delete(task_service_url)
     except Exception as e:
         print(f"Warning: Team deleted, but task cleanup failed: {e}")
     # --------------------------------------------------
@@ -206,9 +226,9 @@ async def delete_team(
         role_payload = {"role": "member"} 
         
         try:
-            async with httpx.AsyncClient() as client:
-                headers = {"Authorization": f"Bearer {admin_user.token}"}
-                await client.patch(demote_url, json=role_payload, headers=headers)
+            client = get_http_client()
+            headers = {"Authorization": f"Bearer {admin_user.token}"}
+            await client.patch(demote_url, json=role_payload, headers=headers)
         except Exception:
             print(f"Warning: Team deleted, but could not demote user {leader_username}.")
 
@@ -236,14 +256,14 @@ async def update_team_details(
     if not update_data:
         raise HTTPException(status_code=400, detail="No update data provided (name or description).")
 
-    # Update the team in the database
-    await db["teams"].update_one(
+    # Update the team in the database and get the fresh document back, in one round trip
+    updated_team_doc = await db["teams"].find_one_and_update(
         {"_id": team.id},
-        {"$set": update_data}
+        {"$set": update_data},
+        return_document=ReturnDocument.AFTER,
     )
-
-    # Get the fresh document from the DB
-    updated_team_doc = await db["teams"].find_one({"_id": team.id})
+    if not updated_team_doc:
+        raise HTTPException(status_code=404, detail="Team not found")
     
     return TeamOut(id=str(updated_team_doc["_id"]), **updated_team_doc)
 
@@ -272,13 +292,13 @@ async def add_member_to_team(
     # We must call the user_service to see if this user is real and active.
     user_service_url = f"http://user_service:8001/users/{new_member_username}"
     try:
-        async with httpx.AsyncClient() as client:
-            # We must use our *own* token to prove we are allowed to see user data
-            auth_header = f"Bearer {current_user.token}" 
-            headers = {"Authorization": auth_header}
-            
-            response = await client.get(user_service_url, headers=headers)
+        client = get_http_client()
+        # We must use our *own* token to prove we are allowed to see user data
+        auth_header = f"Bearer {current_user.token}" 
+        headers = {"Authorization": auth_header}
         
+        response = await client.get(user_service_url, headers=headers)
+
         # If user_service returns 404, the user doesn't exist
         if response.status_code == 404:
             raise HTTPException(status_code=404, detail="User to add not found.")
@@ -296,38 +316,41 @@ async def add_member_to_team(
     # --- 3. Add to Database ---
     # "$addToSet" is a MongoDB operator that adds an item to an array
     # only if it's not already there. It's safer than "$push".
-    result = await db["teams"].update_one(
-        {"_id": team.id},
-        {"$addToSet": {"member_ids": new_member_username}}
+    # The filter only matches if the user isn't a member yet, so None means either
+    # someone added them meanwhile or the team is gone. Otherwise we get the updated team back.
+    updated_team_doc = await db["teams"].find_one_and_update(
+        {"_id": team.id, "member_ids": {"$ne": new_member_username}},
+        {"$addToSet": {"member_ids": new_member_username}},
+        return_document=ReturnDocument.AFTER,
     )
+    member_added = updated_team_doc is not None
+    if not member_added:
+        updated_team_doc = await db["teams"].find_one({"_id": team.id})
+        if not updated_team_doc:
+            raise HTTPException(status_code=404, detail="Team not found")
+    await _invalidate_task_access_cache(str(team.id))
 
     # ======================================================
     # --- 4. NOTIFICATION TRIGGER (NEW) ---
     # ======================================================
-    if result.modified_count > 0:
+    if member_added:
+        # Queued in our outbox and delivered to the Task Service (where notifications live)
+        # in the background, see outbox.py: the request doesn't wait for it
         try:
-            # We call the internal endpoint of the Task Service (where notifications live)
-            notify_url = "http://task_service:8003/tasks/notifications/internal"
-            
-            notification_payload = {
-                "user_id": new_member_username,
-                "title": "Added to Team",
-                "message": f"You have been added to the team '{team.name}'",
-                "link": f"/teams/{str(team.id)}",
-                "type": "TEAM_ADD"
-            }
-            
-            # Fire and forget: We don't want the whole request to fail if the notification fails
-            async with httpx.AsyncClient() as client:
-                await client.post(notify_url, json=notification_payload)
-                
+            await enqueue_notification(
+                db,
+                user_id=new_member_username,
+                title="Added to Team",
+                message=f"You have been added to the team '{team.name}'",
+                link=f"/teams/{str(team.id)}",
+                type="TEAM_ADD",
+            )
         except Exception as e:
             # Log error but proceed to return success for the member add
-            print(f"Failed to send notification: {e}")
+            print(f"Failed to queue notification: {e}")
     # ======================================================
 
     # --- 5. Return the fully updated team ---
-    updated_team_doc = await db["teams"].find_one({"_id": team.id})
     return TeamOut(id=str(updated_team_doc["_id"]), **updated_team_doc)
 
 
@@ -360,13 +383,16 @@ async def remove_member_from_team(
     # --- 3. Remove from Database ---
     # "$pull" is the MongoDB operator to remove a specific item
     # from an array.
-    await db["teams"].update_one(
+    updated_team_doc = await db["teams"].find_one_and_update(
         {"_id": team.id},
-        {"$pull": {"member_ids": username_to_remove}}
+        {"$pull": {"member_ids": username_to_remove}},
+        return_document=ReturnDocument.AFTER,
     )
+    if not updated_team_doc:
+        raise HTTPException(status_code=404, detail="Team not found")
+    await _invalidate_task_access_cache(str(team.id))
 
     # --- 4. Return the fully updated team ---
-    updated_team_doc = await db["teams"].find_one({"_id": team.id})
     return TeamOut(id=str(updated_team_doc["_id"]), **updated_team_doc)
 
 
@@ -410,12 +436,12 @@ async def assign_team_leader(
     # --- Inter-Service Validation: Check if new leader is a real, active user ---
     user_service_url = f"http://user_service:8001/users/{new_leader_username}"
     try:
-        async with httpx.AsyncClient() as client:
-            # We use the Admin's token for the call
-            auth_header = f"Bearer {admin_user.token}"
-            headers = {"Authorization": auth_header}
-            response = await client.get(user_service_url, headers=headers)
-        
+        client = get_http_client()
+        # We use the Admin's token for the call
+        auth_header = f"Bearer {admin_user.token}"
+        headers = {"Authorization": auth_header}
+        response = await client.get(user_service_url, headers=headers)
+
         if response.status_code == 404:
             raise HTTPException(status_code=404, detail=f"User '{new_leader_username}' not found.")
         response.raise_for_status()
@@ -428,13 +454,17 @@ async def assign_team_leader(
         raise HTTPException(status_code=503, detail="User service is unreachable.")
 
     # --- Update MongoDB Database ---
-    await db["teams"].update_one(
+    updated_team_doc = await db["teams"].find_one_and_update(
         {"_id": team.id},
         {
             "$set": {"leader_id": new_leader_username},
             "$addToSet": {"member_ids": new_leader_username}
-        }
+        },
+        return_document=ReturnDocument.AFTER,
     )
+    if not updated_team_doc:
+        raise HTTPException(status_code=404, detail="Team not found")
+    await _invalidate_task_access_cache(str(team.id))
 
     # --- Sync with User Service (Promote/Demote) ---
     auth_header = {"Authorization": f"Bearer {admin_user.token}"}
@@ -443,8 +473,8 @@ async def assign_team_leader(
     if user_data.get("role") != Role.ADMIN: # <-- THE NEW SAFETY CHECK
         try:
             promote_url = f"http://user_service:8001/users/{new_leader_username}/role"
-            async with httpx.AsyncClient() as client:
-                await client.patch(promote_url, json={"role": "team_leader"}, headers=auth_header)
+            client = get_http_client()
+            await client.patch(promote_url, json={"role": "team_leader"}, headers=auth_header)
         except Exception as e:
             print(f"Warning: Could not promote new leader {new_leader_username}. Error: {e}")
         
@@ -453,11 +483,10 @@ async def assign_team_leader(
     if not is_still_leader:
         try:
             demote_url = f"http://user_service:8001/users/{old_leader_username}/role"
-            async with httpx.AsyncClient() as client:
-                await client.patch(demote_url, json={"role": "member"}, headers=auth_header)
+            client = get_http_client()
+            await client.patch(demote_url, json={"role": "member"}, headers=auth_header)
         except Exception as e:
             print(f"Warning: Could not demote old leader {old_leader_username}. Error: {e}")
 
-    # --- Return the updated team ---
-    updated_team_doc = await db["teams"].find_one({"_id": team.id})
+    # --- Return the updated team (as returned by the update above) ---
     return TeamOut(id=str(updated_team_doc["_id"]), **updated_team_doc)
\ No newline at end of file
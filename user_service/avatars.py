@@ -0,0 +1,132 @@
+import io
+import os
+import shutil
+from pathlib import Path
+from typing import Optional
+
+from fastapi import HTTPException
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+# --- Settings ---
+MAX_AVATAR_UPLOAD_BYTES = int(os.getenv("MAX_AVATAR_UPLOAD_BYTES", str(10 * 1024 * 1024))) # 10 MB
+MAX_AVATAR_PIXELS = 40_000_000   # refuse to decode anything bigger (decompression bombs)
+AVATAR_SIZES = (32, 64, 256)     # pre-rendered square sizes, in px
+DEFAULT_AVATAR_SIZE = 256        # served when no ?size is given (what clients got before)
+WEBP_QUALITY = 80
+JPEG_QUALITY = 85
+# Avatars are public and shown on every page: browsers reuse them for this many seconds
+# without asking, then revalidate with If-None-Match (a 304, no body)
+AVATAR_CACHE_MAX_AGE = int(os.getenv("AVATAR_CACHE_MAX_AGE", "300"))
+
+# Layout: user_avatars/<username>/<size>.webp and <size>.jpg
+# The path depends only on the username, so serving an avatar needs no DB lookup.
+AVATAR_DIR = Path("user_avatars")
+AVATAR_DIR.mkdir(exist_ok=True)
+
+FORMATS = {
+    # extension: (Pillow format, save options)
+    "webp": ("WEBP", {"quality": WEBP_QUALITY, "method": 4}),
+    "jpg": ("JPEG", {"quality": JPEG_QUALITY, "optimize": True, "progressive": True}),
+}
+
+Image.MAX_IMAGE_PIXELS = MAX_AVATAR_PIXELS
+
+
+def user_avatar_dir(username: str) -> Optional[Path]:
+    # usernames are free text: never let one escape AVATAR_DIR (e.g. "..")
+    if not username or username.startswith(".") or "/" in username or "\\" in username:
+        return None
+    return AVATAR_DIR / username
+
+
+def legacy_avatar_path(username: str) -> Optional[Path]:
+    """ Avatars uploaded before the pipeline were stored as-is, as <username>_avatar.png/.jpg """
+    if user_avatar_dir(username) is None:
+        return None
+    for ext in (".jpg", ".png"):
+        path = AVATAR_DIR / f"{username}_avatar{ext}"
+        if path.is_file():
+            return path
+    return None
+
+
+def pick_size(requested: Optional[int]) -> int:
+    # smallest rendition that is at least as big as asked for, so it's never upscaled by the browser
+    if requested is None:
+        return DEFAULT_AVATAR_SIZE
+    for size in AVATAR_SIZES:
+        if size >= requested:
+            return size
+    return AVATAR_SIZES[-1]
+
+
+def rendered_avatar_path(username: str, size: int, ext: str) -> Optional[Path]:
+    user_dir = user_avatar_dir(username)
+    if user_dir is None:
+        return None
+    return user_dir / f"{size}.{ext}"
+
+
+def _normalize(data: bytes) -> Image.Image:
+    """ Decodes the upload, applies the EXIF orientation and crops it to a centred RGB square. """
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            if img.width * img.height > MAX_AVATAR_PIXELS:
+                raise HTTPException(status_code=400, detail="The image resolution is too large.")
+            # JPEG only: let the decoder downscale by up to 8x while it decodes, when the photo is
+            # much bigger than our largest size (a phone picture decodes far faster this way)
+            img.draft("RGB", (AVATAR_SIZES[-1] * 2, AVATAR_SIZES[-1] * 2))
+            img = ImageOps.exif_transpose(img)
+            if img.mode in ("RGBA", "LA", "P"):
+                # flatten transparency on white, JPEG has no alpha channel
+                img = img.convert("RGBA")
+                background = Image.new("RGB", img.size, (255, 255, 255))
+                background.paste(img, mask=img.getchannel("A"))
+                img = background
+            else:
+                img = img.convert("RGB")
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError, ValueError):
+        raise HTTPException(status_code=400, detail="Could not read the image file.")
+
+    side = min(img.size)
+    return ImageOps.fit(img, (side, side), method=Image.Resampling.LANCZOS)
+
+
+def render_avatar(username: str, data: bytes):
+    """
+    CPU-heavy, call it through run_in_threadpool.
+    Writes every size in every format; each file is written to a temp name and renamed
+    into place, so a reader never sees a half-written image.
+    """
+    user_dir = user_avatar_dir(username)
+    if user_dir is None:
+        raise HTTPException(status_code=400, detail="Invalid username for an avatar.")
+
+    square = _normalize(data)
+    user_dir.mkdir(exist_ok=True)
+    for size in AVATAR_SIZES:
+        resized = square if square.width == size else square.resize((size, size), Image.Resampling.LANCZOS)
+        for ext, (pil_format, options) in FORMATS.items():
+            target = user_dir / f"{size}.{ext}"
+            temp = user_dir / f".{size}.{ext}.part"
+            resized.save(temp, pil_format, **options)
+            os.replace(temp, target)
+
+    # the original upload isn't kept; drop a pre-pipeline file so it can't shadow the new one
+    remove_legacy_avatar(username)
+
+
+def remove_legacy_avatar(username: str):
+    path = legacy_avatar_path(username)
+    if path is not None:
+        try:
+            os.remove(path)
+        except OSError as e:
+            print(f"Error deleting file: {e}")
+
+
+def delete_avatar_files(username: str):
+    user_dir = user_avatar_dir(username)
+    if user_dir is not None and user_dir.exists():
+        shutil.rmtree(user_dir, ignore_errors=True)
+    remove_legacy_avatar(username)
@@ -1,18 +1,28 @@
 import os
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import declarative_base
+
+from metrics import instrument_sqlalchemy
 
 DB_URI = os.getenv("DB_URI")
 
-engine = create_engine(DB_URI, pool_pre_ping=True, future=True)
-SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
+# The service is fully async, so it talks to MySQL through aiomysql.
+# The .env keeps the usual "mysql+pymysql://" URI; we just swap the driver.
+def _async_uri(uri: str) -> str:
+    for sync_prefix in ("mysql+pymysql://", "mysql://"):
+        if uri.startswith(sync_prefix):
+            return "mysql+aiomysql://" + uri[len(sync_prefix):]
+    return uri
+
+engine = create_async_engine(_async_uri(DB_URI), pool_pre_ping=True)
+# each statement's time is added to the current request's metrics
+instrument_sqlalchemy(engine)
+# expire_on_commit=False: objects stay readable after commit (returned to the client, no lazy reload)
+SessionLocal = async_sessionmaker(bind=engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
 
 # Base is needed for the models
 Base = declarative_base()
 
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
\ No newline at end of file
@@ -0,0 +1,144 @@
+import asyncio
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Tuple
+
+from fastapi import HTTPException, status
+from passlib.hash import bcrypt
+
+# --- Settings ---
+# Cost factor of new hashes. Stored hashes with another cost are re-hashed at the next login.
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# bcrypt is pure CPU: one worker process per core, so hashing uses every core (no GIL)
+# and never competes with the event loop or FastAPI's threadpool
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", str(os.cpu_count() or 1)))
+# Hashing jobs allowed in flight (running + waiting). Past that we answer 429 right away
+# instead of letting logins pile up and time out.
+HASH_QUEUE_LIMIT = int(os.getenv("HASH_QUEUE_LIMIT", str(HASH_WORKERS * 8)))
+
+
+# ---------------------------------------------------------
+# WORKER SIDE (runs in the pool processes, must stay picklable / top-level)
+# ---------------------------------------------------------
+
+def _hash(password: str, rounds: int) -> Tuple[str, float]:
+    started = time.perf_counter()
+    hashed = bcrypt.using(rounds=rounds).hash(password)
+    return hashed, time.perf_counter() - started
+
+def _warm_up():
+    # loads the bcrypt backend in a fresh worker
+    bcrypt.using(rounds=4).hash("warm-up")
+
+def _verify(password: str, hashed: str, rounds: int) -> Tuple[bool, Optional[str], float]:
+    """ Returns (matches, new_hash). new_hash is set when the password matched but was stored with another cost. """
+    started = time.perf_counter()
+    matches = bcrypt.verify(password, hashed)
+    new_hash = None
+    if matches and bcrypt.using(rounds=rounds).needs_update(hashed):
+        new_hash = bcrypt.using(rounds=rounds).hash(password)
+    return matches, new_hash, time.perf_counter() - started
+
+
+# ---------------------------------------------------------
+# SERVICE SIDE
+# ---------------------------------------------------------
+
+class HashingStats:
+    """ Queue depth and latency of the hashing pool, reported by /internal/stats. """
+    def __init__(self, size: int = 1000):
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.rehashed = 0
+        self.total_seconds = deque(maxlen=size)   # queue wait + hashing, as seen by the request
+        self.work_seconds = deque(maxlen=size)    # hashing alone, measured in the worker
+
+    def stats(self) -> dict:
+        def percentile(samples, p):
+            ordered = sorted(samples)
+            if not ordered:
+                return 0.0
+            return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))] * 1000, 3)
+        return {
+            "workers": HASH_WORKERS,
+            "bcrypt_rounds": BCRYPT_ROUNDS,
+            "queue_limit": HASH_QUEUE_LIMIT,
+            "in_flight": self.in_flight,
+            "queued": max(0, self.in_flight - HASH_WORKERS),
+            "max_in_flight": self.max_in_flight,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "rehashed": self.rehashed,
+            "latency_p50_ms": percentile(self.total_seconds, 0.50),
+            "latency_p95_ms": percentile(self.total_seconds, 0.95),
+            "latency_p99_ms": percentile(self.total_seconds, 0.99),
+            "hash_p50_ms": percentile(self.work_seconds, 0.50),
+        }
+
+stats = HashingStats()
+
+
+# Like the HTTP client, one pool for the whole application, created on first use / startup.
+# "spawn" so the workers don't inherit the event loop, DB pool and sockets of this process.
+pool: ProcessPoolExecutor = None
+
+def get_hash_pool() -> ProcessPoolExecutor:
+    global pool
+    if pool is None:
+        pool = ProcessPoolExecutor(max_workers=HASH_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return pool
+
+def start_hash_pool():
+    """ Called on startup: starts the workers now, so the first logins don't pay for spawning them """
+    executor = get_hash_pool()
+    for _ in range(HASH_WORKERS):
+        executor.submit(_warm_up)
+
+def close_hash_pool():
+    global pool
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+        pool = None
+
+
+async def _run(fn, *args):
+    # in_flight is only touched from the event loop, a plain counter is enough
+    if stats.in_flight >= HASH_QUEUE_LIMIT:
+        stats.rejected += 1
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="The server is busy, please try again in a moment.",
+            headers={"Retry-After": "1"},
+        )
+
+    stats.in_flight += 1
+    stats.max_in_flight = max(stats.max_in_flight, stats.in_flight)
+    started = time.perf_counter()
+    try:
+        result = await asyncio.get_running_loop().run_in_executor(get_hash_pool(), fn, *args)
+    finally:
+        stats.in_flight -= 1
+    stats.completed += 1
+    stats.total_seconds.append(time.perf_counter() - started)
+    stats.work_seconds.append(result[-1])
+    return result
+
+
+async def hash_password(password: str) -> str:
+    hashed, _ = await _run(_hash, password, BCRYPT_ROUNDS)
+    return hashed
+
+async def verify_password(password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+    """ Returns (matches, new_hash): store new_hash when it's not None (cost factor changed). """
+    matches, new_hash, _ = await _run(_verify, password, hashed, BCRYPT_ROUNDS)
+    if new_hash is not None:
+        stats.rehashed += 1
+    return matches, new_hash
+
+def get_stats() -> dict:
+    return stats.stats()
@@ -0,0 +1,127 @@
+import os
+import time
+import logging
+import httpx
+
+from metrics import record_dependency
+
+logger = logging.getLogger("user_service")
+
+# --- Settings (all overridable from the .env file) ---
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "5"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "2"))
+HTTP_POOL_TIMEOUT = float(os.getenv("HTTP_POOL_TIMEOUT", "5"))
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "false").lower() in ("1", "true", "yes")
+
+
+class PoolStats:
+    """
+    Counters for the shared client. A request that did not open a TCP connection
+    was served by a pooled keep-alive connection.
+    """
+    def __init__(self):
+        self.requests = 0
+        self.new_connections = 0
+        self.failures = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def record(self, wait_seconds: float, opened_connection: bool, failed: bool):
+        self.requests += 1
+        if opened_connection:
+            self.new_connections += 1
+        if failed:
+            self.failures += 1
+        self.wait_seconds_total += wait_seconds
+        self.wait_seconds_max = max(self.wait_seconds_max, wait_seconds)
+
+    def as_dict(self) -> dict:
+        reused = self.requests - self.new_connections
+        return {
+            "requests": self.requests,
+            "new_connections": self.new_connections,
+            "reused_connections": reused,
+            "reuse_ratio": round(reused / self.requests, 4) if self.requests else 0.0,
+            "failures": self.failures,
+            "pool_wait_seconds_total": round(self.wait_seconds_total, 6),
+            "pool_wait_seconds_avg": round(self.wait_seconds_total / self.requests, 6) if self.requests else 0.0,
+            "pool_wait_seconds_max": round(self.wait_seconds_max, 6),
+        }
+
+
+stats = PoolStats()
+
+
+class InstrumentedTransport(httpx.AsyncHTTPTransport):
+    """
+    Regular httpx transport that uses httpcore's "trace" extension to find out
+    whether a request opened a new connection and how long it waited for one.
+    """
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        started = time.perf_counter()
+        marks = {}
+
+        async def trace(event_name: str, info: dict):
+            if event_name == "connection.connect_tcp.started":
+                marks.setdefault("connect", time.perf_counter())
+            elif event_name.endswith("send_request_headers.started"):
+                marks.setdefault("send", time.perf_counter())
+
+        request.extensions = {**request.extensions, "trace": trace}
+        failed = True
+        try:
+            response = await super().handle_async_request(request)
+            failed = False
+            return response
+        finally:
+            # time spent before we either started dialing or got a pooled connection
+            acquired = marks.get("connect", marks.get("send", time.perf_counter()))
+            stats.record(acquired - started, "connect" in marks, failed)
+            record_dependency("http", time.perf_counter() - started)
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def _build_client() -> httpx.AsyncClient:
+    http2 = HTTP2_ENABLED
+    if http2 and not _http2_available():
+        logger.warning("HTTP2_ENABLED is set but the 'h2' package is missing, falling back to HTTP/1.1")
+        http2 = False
+
+    limits = httpx.Limits(
+        max_connections=HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+    )
+    timeout = httpx.Timeout(HTTP_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT, pool=HTTP_POOL_TIMEOUT)
+    transport = InstrumentedTransport(limits=limits, http2=http2)
+    return httpx.AsyncClient(transport=transport, timeout=timeout)
+
+
+# This is the single HTTP client for the entire application (same idea as the Mongo client in db.py).
+# Connections to team_service are kept alive and reused between requests.
+client: httpx.AsyncClient = None
+
+def get_http_client() -> httpx.AsyncClient:
+    global client
+    if client is None:
+        client = _build_client()
+    return client
+
+async def close_http_client():
+    global client
+    if client is not None:
+        await client.aclose()
+        client = None
+
+def get_stats() -> dict:
+    return stats.as_dict()
@@ -1,9 +1,17 @@
-from fastapi import FastAPI
+import asyncio
+import logging
+
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy import text
 from routes import router as users_router
 from models import Base
-from db import engine
+from db import engine, SessionLocal
+import http_client
+import metrics
+import hashing
+from user_cache import user_cache
+from typeahead import TYPEAHEAD_REFRESH_SECONDS, run_typeahead_refresh, typeahead_index
 
 from dotenv import load_dotenv
 load_dotenv() # load env variables from the .env file
@@ -14,16 +22,60 @@ app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"], allow_credentials=True,
     allow_methods=["*"], allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"], # pagination cursor of list endpoints
 )
+# added last so it's the outermost: the latency includes CORS handling
+app.add_middleware(metrics.MetricsMiddleware)
+
+def _create_missing_indexes(sync_conn):
+    # create_all only creates the indexes of new tables: add the ones declared since
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(sync_conn, checkfirst=True)
+
+# The user search index is built in the background and kept fresh for the lifetime of the app
+background_tasks = []
 
 @app.on_event("startup")
-def on_startup():
-    Base.metadata.create_all(bind=engine)
+async def on_startup():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(_create_missing_indexes)
+    http_client.get_http_client() # pooled client for the team_service calls
+    hashing.start_hash_pool() # worker processes for bcrypt
+    if TYPEAHEAD_REFRESH_SECONDS > 0:
+        background_tasks.append(asyncio.create_task(run_typeahead_refresh(SessionLocal)))
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    for task in background_tasks:
+        task.cancel()
+    await http_client.close_http_client()
+    hashing.close_hash_pool()
+    await engine.dispose()
 
 app.include_router(users_router)
 
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s %(levelname)s [%(name)s] %(message)s",
+)
+
 @app.get("/health")
-def health():
-    with engine.connect() as conn:
-        conn.execute(text("SELECT 1"))
+async def health():
+    async with engine.connect() as conn:
+        await conn.execute(text("SELECT 1"))
     return {"status": "ok"}
+
+@app.get("/internal/stats", include_in_schema=False)
+async def internal_stats():
+    return {
+        "http_client": http_client.get_stats(),
+        "password_hashing": hashing.get_stats(),
+        "user_cache": user_cache.stats(),
+        "user_typeahead": typeahead_index.stats(),
+    }
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
@@ -0,0 +1,217 @@
+"""
+Per-request latency metrics, exposed in the Prometheus text format on GET /metrics.
+
+MetricsMiddleware (a plain ASGI middleware, registered by main.py) records for every request:
+- http_requests_total{method, route, status}
+- http_request_duration_seconds{method, route}: histogram
+- http_requests_in_flight: gauge
+- http_request_dependency_seconds{method, route, dependency}: histogram of the time the request
+  spent in MySQL / downstream HTTP calls, and http_request_dependency_calls_total
+  (how many calls it made)
+Streaming responses (text/event-stream) stay open for minutes: they are counted, but their
+duration is neither put in the latency histogram nor logged as a slow request.
+`route` is the route template ("/users/{username}"), not the path, so the number of series stays
+bounded; requests that match no route are counted under "unmatched".
+
+The dependency time is collected through a context variable holding a list of the request's calls:
+record_dependency() appends (dependency, seconds) to it. The hooks are
+- MySQL: instrument_sqlalchemy(engine) (db.py), cursor execute events. aiomysql runs the
+  statements on the event loop, in the request's task.
+- HTTP: InstrumentedTransport (http_client.py), up to the response headers.
+Calls that run concurrently (asyncio.gather) are summed, so a dependency can take longer than
+the request. Calls made outside a request (background jobs) aren't recorded.
+
+The hot path is a few dict updates and a bisect per request: no lock (everything runs on the
+event loop), the text is only built when /metrics is scraped.
+The counters are per process: scrape every worker.
+"""
+import logging
+import os
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import event
+
+logger = logging.getLogger("user_service")
+
+# --- Settings ---
+# Requests slower than this are logged with their route, status and dependency times (0 disables)
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "1000"))
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+UNMATCHED = "unmatched"
+
+# seconds; the same buckets for the requests and their dependencies
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# (dependency, seconds) of the calls made by the current request, None outside a request
+_request_calls: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar("request_calls", default=None)
+
+
+def record_dependency(dependency: str, seconds: float):
+    calls = _request_calls.get()
+    if calls is not None:
+        calls.append((dependency, seconds))
+
+
+class Histogram:
+    """ label values -> [count per bucket (+Inf last), sum]; cumulated when rendered """
+    def __init__(self, buckets: tuple = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.series: Dict[tuple, list] = {}
+
+    def observe(self, labels: tuple, value: float):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.in_flight = 0
+        self.requests: Dict[tuple, int] = {}
+        self.latency = Histogram()
+        self.dependency_latency = Histogram()
+        self.dependency_calls: Dict[tuple, int] = {}
+
+    def observe(self, method: str, route: str, status: int, seconds: Optional[float], calls: List[Tuple[str, float]]):
+        """ seconds is None for streaming responses: no latency is recorded for them """
+        key = (method, route, status)
+        self.requests[key] = self.requests.get(key, 0) + 1
+        if seconds is not None:
+            self.latency.observe((method, route), seconds)
+        if calls:
+            per_dependency: Dict[str, float] = {}
+            for dependency, call_seconds in calls:
+                per_dependency[dependency] = per_dependency.get(dependency, 0.0) + call_seconds
+                key = (method, route, dependency)
+                self.dependency_calls[key] = self.dependency_calls.get(key, 0) + 1
+            for dependency, total in per_dependency.items():
+                self.dependency_latency.observe((method, route, dependency), total)
+
+    def render(self) -> str:
+        lines = [
+            "# HELP http_requests_in_flight Requests being processed.",
+            "# TYPE http_requests_in_flight gauge",
+            f"http_requests_in_flight {self.in_flight}",
+            "# HELP http_requests_total Requests processed, by route and status.",
+            "# TYPE http_requests_total counter",
+        ]
+        for (method, route, status), count in self.requests.items():
+            lines.append(f"http_requests_total{_labels(method=method, route=route, status=status)} {count}")
+        _render_histogram(lines, "http_request_duration_seconds", "Request latency.",
+                          self.latency, ("method", "route"))
+        _render_histogram(lines, "http_request_dependency_seconds",
+                          "Time a request spent in a dependency (mysql, http), summed over its calls.",
+                          self.dependency_latency, ("method", "route", "dependency"))
+        lines += [
+            "# HELP http_request_dependency_calls_total Calls made to a dependency while processing requests.",
+            "# TYPE http_request_dependency_calls_total counter",
+        ]
+        for (method, route, dependency), count in self.dependency_calls.items():
+            labels = _labels(method=method, route=route, dependency=dependency)
+            lines.append(f"http_request_dependency_calls_total{labels} {count}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels) -> str:
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+def _render_histogram(lines: list, name: str, help: str, histogram: Histogram, label_names: tuple):
+    lines += [f"# HELP {name} {help}", f"# TYPE {name} histogram"]
+    bounds = [repr(bound) for bound in histogram.buckets] + ["+Inf"]
+    for labels, (counts, total) in histogram.series.items():
+        names = dict(zip(label_names, labels))
+        cumulative = 0
+        for bound, count in zip(bounds, counts):
+            cumulative += count
+            lines.append(f"{name}_bucket{_labels(**names, le=bound)} {cumulative}")
+        lines.append(f"{name}_sum{_labels(**names)} {total}")
+        lines.append(f"{name}_count{_labels(**names)} {cumulative}")
+
+
+metrics = RequestMetrics()
+
+
+def render() -> str:
+    return metrics.render()
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        # an exception that escapes the app becomes a 500 (ServerErrorMiddleware, outside of us)
+        status = 500
+        streaming = False
+
+        async def send_with_status(message):
+            nonlocal status, streaming
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                content_type = dict(message.get("headers", [])).get(b"content-type", b"")
+                streaming = content_type.startswith(b"text/event-stream")
+            await send(message)
+
+        calls = []
+        token = _request_calls.set(calls)
+        metrics.in_flight += 1
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            seconds = time.perf_counter() - started
+            metrics.in_flight -= 1
+            _request_calls.reset(token)
+            # the router stores the matched route in the scope
+            route = scope.get("route")
+            route = route.path if route is not None else UNMATCHED
+            # a stream's duration is how long the client stayed connected, not a latency
+            metrics.observe(scope["method"], route, status, None if streaming else seconds, calls)
+            if not streaming and SLOW_REQUEST_MS > 0 and seconds * 1000 >= SLOW_REQUEST_MS:
+                _log_slow_request(scope["method"], route, status, seconds, calls)
+
+
+def _log_slow_request(method: str, route: str, status: int, seconds: float, calls: list):
+    per_dependency: Dict[str, list] = {}
+    for dependency, call_seconds in calls:
+        total = per_dependency.setdefault(dependency, [0, 0.0])
+        total[0] += 1
+        total[1] += call_seconds
+    dependencies = "".join(
+        f" {dependency}_calls={count} {dependency}_ms={total * 1000:.1f}"
+        for dependency, (count, total) in sorted(per_dependency.items())
+    )
+    logger.warning("Slow request method=%s route=%s status=%s duration_ms=%.1f%s",
+                   method, route, status, seconds * 1000, dependencies)
+
+
+def instrument_sqlalchemy(engine):
+    """ Times every statement run by the (async) engine, called by db.py """
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def _started(conn, cursor, statement, parameters, context, executemany):
+        context._metrics_started = time.perf_counter()
+
+    @event.listens_for(engine.sync_engine, "after_cursor_execute")
+    def _finished(conn, cursor, statement, parameters, context, executemany):
+        record_dependency("mysql", time.perf_counter() - context._metrics_started)
+
+    @event.listens_for(engine.sync_engine, "handle_error")
+    def _failed(exception_context):
+        started = getattr(exception_context.execution_context, "_metrics_started", None)
+        if started is not None:
+            record_dependency("mysql", time.perf_counter() - started)
@@ -13,8 +13,9 @@ class User(Base):
     username = Column(String(50), primary_key=True, index=True, nullable=False)
     email = Column(String(100), unique=True, index=True, nullable=False)
     password_hash = Column(String(255), nullable=False)
-    first_name = Column(String(50))
-    last_name = Column(String(50))
+    # indexed for the prefix queries of GET /users/search
+    first_name = Column(String(50), index=True)
+    last_name = Column(String(50), index=True)
     role = Column(SAEnum(Role), default=Role.MEMBER)
     active = Column(Boolean, default=False)
     
@@ -0,0 +1,29 @@
+import base64
+from typing import Optional
+
+from fastapi import HTTPException, Response
+
+# --- Keyset (cursor) pagination for the users listing ---
+# Users are listed in primary key (username) order. The cursor is the last username of
+# the page, base64 encoded (opaque to clients), and the next page is "WHERE username > cursor",
+# which is a range scan on the primary key however deep we are in the table (no OFFSET).
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(username: str) -> str:
+    return base64.urlsafe_b64encode(username.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> str:
+    try:
+        return base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor.")
+
+
+def set_next_cursor(response: Response, next_cursor: Optional[str]):
+    # The body stays a plain list (so existing clients keep working), the cursor travels in a header
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
@@ -1,28 +1,35 @@
 from pathlib import Path
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Query, Request, Response
 from fastapi.security import OAuth2PasswordRequestForm 
-from sqlalchemy.orm import Session
-from typing import Annotated, List
-from schemas import UserCreate, UserOut, Token, TokenData, UserRoleUpdate
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Annotated, List, Optional
+from schemas import UserCreate, UserOut, Token, TokenData, UserRoleUpdate, UsernameBatch, UserLookup, BatchActivateResult
 import httpx
 import shutil
 import os
 from pathlib import Path
 
 from security import (
-    verify_password, 
+    verify_password_and_update, 
     create_access_token, 
     get_password_hash,
     get_current_user,
-    get_current_admin_user
+    get_current_admin_user,
+    get_user_snapshot
 )
+from user_cache import user_cache
+from typeahead import typeahead_index, user_search_query, DEFAULT_SEARCH_LIMIT, MAX_SEARCH_LIMIT
 from models import User, Role
 from db import get_db
-
-# upload directory for user avatars
-AVATAR_DIR = Path("user_avatars")
-AVATAR_DIR.mkdir(exist_ok=True)
+from http_client import get_http_client
+from file_responses import conditional_file_response
+from avatars import (
+    MAX_AVATAR_UPLOAD_BYTES, DEFAULT_AVATAR_SIZE, AVATAR_CACHE_MAX_AGE, render_avatar, pick_size,
+    rendered_avatar_path, legacy_avatar_path, delete_avatar_files
+)
+from pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, encode_cursor, decode_cursor, set_next_cursor
 
 router = APIRouter(prefix="/users")
 
@@ -34,17 +41,24 @@ router = APIRouter(prefix="/users")
 # create_access_token() returns the token, and server gives it back to us.
 # we now hold the token, and it's our responsibility as clients to show the token where we have to for authorization.
 @router.post("/token", response_model=Token, tags=["auth"])
-def login_for_access_token(
+async def login_for_access_token(
     form_data: OAuth2PasswordRequestForm = Depends(), 
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    user = db.query(User).filter(User.username == form_data.username).first()
-    if not user or not verify_password(form_data.password, user.password_hash):
+    user = await db.get(User, form_data.username)
+    password_ok, new_hash = (False, None)
+    if user:
+        password_ok, new_hash = await verify_password_and_update(form_data.password, user.password_hash)
+    if not password_ok:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    if new_hash:
+        # stored with another cost factor: upgrade it now that we know the password
+        user.password_hash = new_hash
+        await db.commit()
     if not user.active:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -55,19 +69,99 @@ def login_for_access_token(
     return {"access_token": access_token, "token_type": "bearer"}
 
 
+# --- BATCH ENDPOINTS ------
+# Declared before the /{username} routes. One request and one query for many users,
+# instead of one GET/PATCH per user (team_service, task_service, the admin users page).
+
+@router.post("/batch/lookup", response_model=List[UserLookup], tags=["users"])
+async def batch_lookup_users(
+    payload: UsernameBatch,
+    db: AsyncSession = Depends(get_db),
+    current_user: UserOut = Depends(get_current_user)
+):
+    """
+    (Logged-in Users Only) Existence, active flag and role of many users at once,
+    in the order requested (duplicates are returned once).
+    """
+    usernames = list(dict.fromkeys(payload.usernames))
+
+    found = {}
+    missing = []
+    for username in usernames:
+        cached = user_cache.get(username)
+        if cached is not None:
+            found[username] = cached
+        else:
+            missing.append(username)
+
+    if missing:
+        # single WHERE username IN (...) on the primary key for everything not cached
+        rows = await db.scalars(select(User).where(User.username.in_(missing)))
+        for row in rows:
+            user = UserOut.model_validate(row)
+            user_cache.set(user)
+            found[user.username] = user
+
+    return [
+        UserLookup(username=u, exists=True, active=found[u].active, role=found[u].role)
+        if u in found else UserLookup(username=u, exists=False)
+        for u in usernames
+    ]
+
+
+@router.post("/batch/activate", response_model=BatchActivateResult, tags=["admin"])
+async def batch_activate_users(
+    payload: UsernameBatch,
+    db: AsyncSession = Depends(get_db),
+    admin_user: UserOut = Depends(get_current_admin_user)
+):
+    """
+    (Admin Only) Activates many users in one transaction.
+    Unlike the single-user endpoint, users that are already active or don't exist
+    are reported instead of failing the whole request.
+    """
+    usernames = list(dict.fromkeys(payload.usernames))
+    print(f"Admin user '{admin_user.username}' is activating {len(usernames)} users")
+
+    rows = (await db.execute(
+        select(User.username, User.active).where(User.username.in_(usernames)).with_for_update()
+    )).all()
+    # MySQL compares usernames case-insensitively: map each requested name to the stored row,
+    # whose username is the one the caches are keyed by
+    stored = {name.lower(): (name, active) for name, active in rows}
+    found = {u: stored[u.lower()] for u in usernames if u.lower() in stored}
+    to_activate = list(dict.fromkeys(name for name, active in found.values() if not active))
+
+    if to_activate:
+        await db.execute(
+            update(User).where(User.username.in_(to_activate)).values(active=True)
+            .execution_options(synchronize_session=False)
+        )
+    await db.commit()
+    for username in to_activate:
+        user_cache.invalidate(username)
+        typeahead_index.patch(username, active=True)
+
+    return BatchActivateResult(
+        activated=to_activate,
+        already_active=[u for u in usernames if u in found and found[u][1]],
+        not_found=[u for u in usernames if u not in found],
+    )
+
+
 # --- ADMIN ENDPOINTS ------
 
 @router.patch("/{username}/activate", response_model=UserOut, tags=["admin"])
-def activate_user(
+async def activate_user(
     username: str,
-    db: Session = Depends(get_db),
-    admin_user: User = Depends(get_current_admin_user)
+    db: AsyncSession = Depends(get_db),
+    admin_user: UserOut = Depends(get_current_admin_user)
 ):
     """
     (Admin Only) Ενεργοποιεί έναν χρήστη.
     """
     print(f"Admin user '{admin_user.username}' is activating '{username}'")
-    user_to_activate = db.query(User).filter(User.username == username).first()
+    user_to_activate = await db.get(User, username)
     
     if not user_to_activate:
         raise HTTPException(status_code=404, detail="User not found")
@@ -76,23 +170,25 @@ def activate_user(
         raise HTTPException(status_code=400, detail="User is already active")
         
     user_to_activate.active = True
-    db.commit()
-    db.refresh(user_to_activate)
+    await db.commit()
+    # the stored username: the path one may differ in case
+    user_cache.invalidate(user_to_activate.username)
+    typeahead_index.patch(user_to_activate.username, active=True)
     return user_to_activate
 
 @router.patch("/{username}/role", response_model=UserOut, tags=["admin"])
-def update_user_role(
+async def update_user_role(
     username: str,
     payload: UserRoleUpdate,
-    db: Session = Depends(get_db),
-    admin_user: User = Depends(get_current_admin_user)
+    db: AsyncSession = Depends(get_db),
+    admin_user: UserOut = Depends(get_current_admin_user)
 ):
     """
     (Admin Only) Changes a user's role.
     Prevents demotion of active Team Leaders and prevents unsupported promotions (Member -> Leader).
     """
     
-    user_to_update = db.query(User).filter(User.username == username).first()
+    user_to_update = await db.get(User, username)
     
     if not user_to_update:
         raise HTTPException(status_code=404, detail="User not found")
@@ -115,13 +211,16 @@ def update_user_role(
     if user_to_update.role == Role.TEAM_LEADER and payload.role == Role.MEMBER:
         
         is_leader = False
+
+        # end the read transaction so the DB connection goes back to the pool while we wait on team_service
+        await db.commit()
         
         # --- ISC: Check Team Service for Active Teams ---
         try:
             url = f"http://team_service:8002/teams/internal/is-leader/{username}"
-            with httpx.Client() as client:
-                response = client.get(url)
-            
+            client = get_http_client()
+            response = await client.get(url)
+
             response.raise_for_status() 
             data = response.json()
             is_leader = data.get("is_leader", False)
@@ -147,21 +246,22 @@ def update_user_role(
             
     # 4. Apply the Role Update (If all checks pass)
     user_to_update.role = payload.role
-    db.commit()
-    db.refresh(user_to_update)
+    await db.commit()
+    user_cache.invalidate(user_to_update.username)
+    typeahead_index.patch(user_to_update.username, role=payload.role)
     return user_to_update
 
 @router.patch("/{username}/deactivate", response_model=UserOut, tags=["admin"])
-def deactivate_user(
+async def deactivate_user(
     username: str,
-    db: Session = Depends(get_db),
-    admin_user: User = Depends(get_current_admin_user)
+    db: AsyncSession = Depends(get_db),
+    admin_user: UserOut = Depends(get_current_admin_user)
 ):
     """
     (Admin Only) Απενεργοποιεί έναν χρήστη.
     """
     print(f"Admin user '{admin_user.username}' is deactivating '{username}'")
-    user_to_deactivate = db.query(User).filter(User.username == username).first()
+    user_to_deactivate = await db.get(User, username)
     
     if not user_to_deactivate:
         raise HTTPException(status_code=404, detail="User not found")
@@ -170,15 +270,16 @@ def deactivate_user(
         raise HTTPException(status_code=403, detail="Cannot deactivate an admin account")
         
     user_to_deactivate.active = False
-    db.commit()
-    db.refresh(user_to_deactivate)
+    await db.commit()
+    user_cache.invalidate(user_to_deactivate.username)
+    typeahead_index.patch(user_to_deactivate.username, active=False)
     return user_to_deactivate
 
 @router.delete("/{username}", status_code=status.HTTP_204_NO_CONTENT, tags=["admin"])
-def delete_user(
+async def delete_user(
     username: str,
-    db: Session = Depends(get_db),
-    admin_user: User = Depends(get_current_admin_user)
+    db: AsyncSession = Depends(get_db),
+    admin_user: UserOut = Depends(get_current_admin_user)
 ):
     """
     (Admin Only) Deletes a user, *after* checking they are not a leader.
@@ -186,13 +287,16 @@ def delete_user(
     print(f"Admin user '{admin_user.username}' is attempting to DELETE '{username}'")
     
     is_leader = False # Default to False
+
+    # the admin check already used the DB: release the connection while we wait on team_service
+    await db.commit()
     
     # --- 1. SAFETY CHECK (Try block is ONLY for the network call) ---
     try:
         url = f"http://team_service:8002/teams/internal/is-leader/{username}"
-        with httpx.Client() as client:
-            response = client.get(url)
-        
+        client = get_http_client()
+        response = await client.get(url)
+
         response.raise_for_status() 
         data = response.json()
         is_leader = data.get("is_leader", False) # Store the result
@@ -217,7 +321,7 @@ def delete_user(
         )
     
     # --- 3. DELETE LOGIC (Now safe to run) ---
-    user_to_delete = db.query(User).filter(User.username == username).first()
+    user_to_delete = await db.get(User, username)
     
     if not user_to_delete:
         raise HTTPException(status_code=404, detail="User not found")
@@ -225,19 +329,25 @@ def delete_user(
     if user_to_delete.role == Role.ADMIN:
         raise HTTPException(status_code=403, detail="Cannot delete an admin account")
         
-    db.delete(user_to_delete)
-    db.commit()
+    stored_username = user_to_delete.username
+    await db.delete(user_to_delete)
+    await db.commit()
+    user_cache.invalidate(stored_username)
+    typeahead_index.remove(stored_username)
+
+    # avatars are served straight from disk, so they must go with the user
+    await run_in_threadpool(delete_avatar_files, stored_username)
     
     return None
 
 # --- USER ENDPOINTS (Ενημερωμένα/Κλειδωμένα) ---
 
 @router.post("", response_model=UserOut, status_code=status.HTTP_201_CREATED, tags=["users"])
-def create_user(payload: UserCreate, db: Session = Depends(get_db)):
+async def create_user(payload: UserCreate, db: AsyncSession = Depends(get_db)):
     # (Αυτό μένει ίδιο - η δημιουργία χρήστη είναι ανοιχτή)
-    if db.query(User).filter(User.username == payload.username).first():
+    if await db.get(User, payload.username):
         raise HTTPException(status_code=400, detail="Username already exists. Please log in.")
-    if db.query(User).filter(User.email == payload.email).first():
+    if await db.scalar(select(User.username).where(User.email == payload.email)):
         raise HTTPException(status_code=400, detail="Email already exists. Please log in.")
 
     user = User(
@@ -245,32 +355,65 @@ def create_user(payload: UserCreate, db: Session = Depends(get_db)):
         email=payload.email,
         first_name=payload.first_name,
         last_name=payload.last_name,
-        password_hash=get_password_hash(payload.password),
+        password_hash=await get_password_hash(payload.password),
         role=Role.MEMBER,
         active=False,
     )
-    db.add(user); db.commit(); db.refresh(user)
+    db.add(user); await db.commit(); await db.refresh(user)
+    typeahead_index.upsert(UserOut.model_validate(user))
     return user
 
 
 @router.get("", response_model=list[UserOut], tags=["users"])
-def list_users(
-    db: Session = Depends(get_db),
+async def list_users(
+    response: Response,
+    db: AsyncSession = Depends(get_db),
     # ΑΛΛΑΓΗ: Πρόσθεσε αυτή τη "κλειδαριά".
     # Αν το token λείπει ή είναι άκυρο, το request σταματάει εδώ.
-    current_user: User = Depends(get_current_user)
+    current_user: UserOut = Depends(get_current_user),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
 ):
     """
     (Logged-in Users Only) Επιστρέφει μια λίστα όλων των χρηστών.
+    Paginated by username: if there are more users, the X-Next-Cursor header holds the cursor of the next page.
     """
     print(f"User '{current_user.username}' is requesting user list.")
-    return db.query(User).all()
+    query = select(User).order_by(User.username)
+    if cursor:
+        query = query.where(User.username > decode_cursor(cursor))
+
+    # fetch one extra row to know if there's a next page
+    users = (await db.scalars(query.limit(limit + 1))).all()
+    if len(users) > limit:
+        users = users[:limit]
+        set_next_cursor(response, encode_cursor(users[-1].username))
+    return users
+
+
+@router.get("/search", response_model=list[UserOut], tags=["users"])
+async def search_users(
+    db: AsyncSession = Depends(get_db),
+    current_user: UserOut = Depends(get_current_user),
+    prefix: str = Query(..., min_length=1, max_length=100),
+    role: Optional[Role] = None,
+    active: Optional[bool] = None,
+    limit: int = Query(DEFAULT_SEARCH_LIMIT, ge=1, le=MAX_SEARCH_LIMIT),
+):
+    """
+    (Logged-in Users Only) Typeahead for the user pickers: users whose username, first/last name
+    ("ann smi" too) or email starts with the prefix, case-insensitive. Username matches first.
+    Served from the in-memory index (see typeahead.py), from MySQL while it's not built.
+    """
+    if typeahead_index.ready:
+        return typeahead_index.search(prefix, role, active, limit)
+    return (await db.scalars(user_search_query(prefix, role, active, limit))).all()
 
 
 @router.get("/me", response_model=UserOut, tags=["users"])
-def get_current_user_me(
+async def get_current_user_me(
     # ΑΛΛΑΓΗ: Ένα νέο, βολικό endpoint
-    current_user: User = Depends(get_current_user)
+    current_user: UserOut = Depends(get_current_user)
 ):
     """
     (Logged-in Users Only) Επιστρέφει τα στοιχεία του 
@@ -280,16 +423,16 @@ def get_current_user_me(
 
 
 @router.get("/{username}", response_model=UserOut, tags=["users"])
-def get_user(
+async def get_user(
     username: str, 
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     # ΑΛΛΑΓΗ: Πρόσθεσε την ίδια "κλειδαριά"
-    current_user: User = Depends(get_current_user)
+    current_user: UserOut = Depends(get_current_user)
 ):
     """
     (Logged-in Users Only) Επιστρέφει τα στοιχεία ενός χρήστη.
     """
-    user = db.query(User).filter(User.username == username).first()
+    user = await get_user_snapshot(db, username)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     return user
@@ -299,8 +442,8 @@ def get_user(
 @router.post("/me/avatar", response_model=UserOut)
 async def upload_my_avatar(
     file: UploadFile = File(...),
-    current_user: TokenData = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: UserOut = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     # 1. Validate File Type
     if file.content_type not in ["image/jpeg", "image/png"]:
@@ -309,68 +452,80 @@ async def upload_my_avatar(
             detail="Invalid file format. Only JPG and PNG are allowed."
         )
 
-    # 2. Generate a consistent filename for this user
-    # We overwrite the previous one to save space.
-    # Extension:
-    ext = ".png" if file.content_type == "image/png" else ".jpg"
-    filename = f"{current_user.username}_avatar{ext}"
-    file_path = AVATAR_DIR / filename
+    # 2. Read it, with a size limit (one extra byte tells us it's over)
+    data = await file.read(MAX_AVATAR_UPLOAD_BYTES + 1)
+    if len(data) > MAX_AVATAR_UPLOAD_BYTES:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Image is too large. The maximum size is {MAX_AVATAR_UPLOAD_BYTES // (1024 * 1024)} MB."
+        )
 
-    # 3. Save to Disk
+    # 3. Normalize and pre-render every size/format, off the event loop (decoding + resizing is CPU work)
     try:
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        await run_in_threadpool(render_avatar, current_user.username, data)
+    except HTTPException:
+        raise
     except Exception:
         raise HTTPException(status_code=500, detail="Could not save image file.")
 
     # 4. Update Database
-    user_row = db.query(User).filter(User.username == current_user.username).first()
-    user_row.avatar_filename = filename
-    db.commit()
-    db.refresh(user_row)
+    user_row = await db.get(User, current_user.username)
+    user_row.avatar_filename = f"{current_user.username}/{DEFAULT_AVATAR_SIZE}.jpg"
+    await db.commit()
+    user_cache.invalidate(current_user.username)
+    typeahead_index.patch(current_user.username, avatar_filename=user_row.avatar_filename)
 
     return user_row
 
 # --- NEW: Get Avatar ---
 @router.get("/{username}/avatar")
-async def get_user_avatar(username: str, db: Session = Depends(get_db)):
-    # 1. Check if user exists (Optional, but good for 404s)
-    user = db.query(User).filter(User.username == username).first()
-    if not user or not user.avatar_filename:
-        # Return a 404 if no custom avatar, Frontend should show default
-        raise HTTPException(status_code=404, detail="Avatar not found")
-
-    # 2. Check if file exists on disk
-    file_path = AVATAR_DIR / user.avatar_filename
-    if not file_path.exists():
-        # Fallback if DB says yes but file is gone
-        raise HTTPException(status_code=404, detail="Avatar file missing")
-
-    return FileResponse(file_path)
+async def get_user_avatar(
+    username: str,
+    request: Request,
+    size: Optional[int] = Query(None, ge=1, le=1024, description="Wanted size in px, the closest bigger rendition is served"),
+):
+    # The files live at a path derived from the username, so there's no user lookup here:
+    # no rendition on disk means no custom avatar (deleting the avatar or the user removes the files).
+    # WebP for browsers that accept it, JPEG otherwise
+    ext = "webp" if "image/webp" in request.headers.get("accept", "") else "jpg"
+    file_path = rendered_avatar_path(username, pick_size(size), ext)
+
+    if file_path is None or not file_path.is_file():
+        # uploaded before the pipeline existed: serve the original until the user uploads again
+        file_path = legacy_avatar_path(username)
+        if file_path is None:
+            # Return a 404 if no custom avatar, Frontend should show default
+            raise HTTPException(status_code=404, detail="Avatar not found")
+
+    # ETag is mtime+size, so re-uploading changes it.
+    # The response depends on Accept (webp or jpg), caches must keep them apart.
+    return conditional_file_response(
+        request,
+        file_path,
+        cache_control=f"public, max-age={AVATAR_CACHE_MAX_AGE}",
+        headers={"Vary": "Accept"},
+    )
 
 # Add this endpoint in the AVATAR section
 @router.delete("/me/avatar", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_my_avatar(
-    current_user: TokenData = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: UserOut = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     # 1. Fetch User
-    user = db.query(User).filter(User.username == current_user.username).first()
+    user = await db.get(User, current_user.username)
     
     # 2. If no avatar, do nothing
     if not user.avatar_filename:
         return None
 
-    # 3. Delete file from disk
-    file_path = AVATAR_DIR / user.avatar_filename
-    try:
-        if file_path.exists():
-            os.remove(file_path)
-    except Exception as e:
-        print(f"Error deleting file: {e}")
+    # 3. Delete files from disk (every rendition, and a pre-pipeline original if there is one)
+    await run_in_threadpool(delete_avatar_files, current_user.username)
 
     # 4. Clear DB field (Reverts to initials on frontend)
     user.avatar_filename = None
-    db.commit()
+    await db.commit()
+    user_cache.invalidate(current_user.username)
+    typeahead_index.patch(current_user.username, avatar_filename=None)
     
     return None
\ No newline at end of file
@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import List, Optional
 from pydantic import BaseModel, EmailStr, Field
 from pydantic import ConfigDict
 from models import Role
@@ -33,4 +33,22 @@ class TokenData(BaseModel):
     role: Role | None = None
 
 class UserRoleUpdate(BaseModel):
-    role: Role # only valid values from the enum
\ No newline at end of file
+    role: Role # only valid values from the enum
+
+# --- batch endpoints (POST /users/batch/...) ---
+MAX_BATCH_SIZE = 500
+
+class UsernameBatch(BaseModel):
+    usernames: List[str] = Field(min_length=1, max_length=MAX_BATCH_SIZE)
+
+class UserLookup(BaseModel):
+    # one per requested username; active/role are only set when the user exists
+    username: str
+    exists:   bool
+    active:   bool = False
+    role:     Optional[Role] = None
+
+class BatchActivateResult(BaseModel):
+    activated:      List[str]
+    already_active: List[str]
+    not_found:      List[str]
@@ -1,14 +1,16 @@
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from passlib.hash import bcrypt
 from datetime import datetime, timedelta, timezone
 from jose import JWTError, jwt
 from pydantic import ValidationError  
-from sqlalchemy.orm import Session  
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional, Tuple
 
 from models import Role, User  
-from schemas import TokenData  
+from schemas import TokenData, UserOut
 from db import get_db  
+import hashing
+from user_cache import user_cache
 import os
 
 # secret key, hashing algorithm, token expiration duration
@@ -18,11 +20,16 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 60
 
 # ---- password hashing ----------
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return bcrypt.verify(plain_password, hashed_password) #checks if the passwd provided in sign in matches the one in the DB
+# bcrypt is deliberately slow (tens of ms of CPU): it runs in the process pool of hashing.py,
+# never on the event loop or in FastAPI's threadpool. Both raise 429 when the pool is saturated.
 
-def get_password_hash(password: str) -> str:
-    return bcrypt.hash(password) #hash passwd provided by user, used in routes.py when user registers
+async def verify_password_and_update(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    # checks if the passwd provided in sign in matches the one in the DB.
+    # the second value is a new hash when the stored one uses another cost factor (BCRYPT_ROUNDS)
+    return await hashing.verify_password(plain_password, hashed_password)
+
+async def get_password_hash(password: str) -> str:
+    return await hashing.hash_password(password) #hash passwd provided by user, used in routes.py when user registers
 
 # ----- JTW token creation
 
@@ -50,10 +57,21 @@ credentials_exception = HTTPException(
     headers={"WWW-Authenticate": "Bearer"},
 )
 
-def get_current_user(
+async def get_user_snapshot(db: AsyncSession, username: str) -> Optional[UserOut]:
+    """ The user as UserOut, from the user cache when possible (see user_cache.py), else from MySQL. """
+    user = user_cache.get(username)
+    if user is None:
+        row = await db.get(User, username)
+        if row is None:
+            return None
+        user = UserOut.model_validate(row)
+        user_cache.set(user)
+    return user
+
+async def get_current_user(
     token: str = Depends(oauth2_scheme), 
-    db: Session = Depends(get_db)
-) -> User:
+    db: AsyncSession = Depends(get_db)
+) -> UserOut:
     #break down token, find user
     try:
         # 1. decode token
@@ -72,8 +90,8 @@ def get_current_user(
         # error if token is invalid or expired
         raise credentials_exception
 
-    # 3. find the user in the db
-    user = db.query(User).filter(User.username == token_data.username).first()
+    # 3. find the user (cached: most requests don't touch the db)
+    user = await get_user_snapshot(db, token_data.username)
     
     if user is None:
         raise credentials_exception
@@ -85,9 +103,9 @@ def get_current_user(
     return user
 
 
-def get_current_admin_user(
-    current_user: User = Depends(get_current_user)
-) -> User:
+async def get_current_admin_user(
+    current_user: UserOut = Depends(get_current_user)
+) -> UserOut:
     if current_user.role != Role.ADMIN:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN, 
@@ -0,0 +1,188 @@
+import asyncio
+import os
+import time
+from bisect import bisect_left, insort
+from typing import Dict, List, Optional
+
+from sqlalchemy import and_, case, or_, select
+
+from models import Role, User
+from schemas import UserOut
+
+# --- Settings ---
+# Rebuilt from MySQL at startup and then every TYPEAHEAD_REFRESH_SECONDS, so users changed
+# by another replica show up too. Changes made by this process are applied right away.
+# 0 disables the index: GET /users/search then always runs the SQL prefix query.
+TYPEAHEAD_REFRESH_SECONDS = float(os.getenv("TYPEAHEAD_REFRESH_SECONDS", "60"))
+# Above this many users the index isn't built (memory), the SQL query is used instead
+TYPEAHEAD_MAX_USERS = int(os.getenv("TYPEAHEAD_MAX_USERS", "200000"))
+DEFAULT_SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 100
+
+# searched in this order: a username match comes before a name match, before an email match
+FIELDS = ("username", "name", "email")
+
+
+def _keys(user: UserOut) -> Dict[str, List[str]]:
+    """ The lowercased strings a prefix can match, per field """
+    first, last = (user.first_name or "").lower(), (user.last_name or "").lower()
+    return {
+        "username": [user.username.lower()],
+        # "ann", "smith" and "ann smi" all find Ann Smith
+        "name": [name for name in {first, last, f"{first} {last}".strip()} if name],
+        "email": [user.email.lower()],
+    }
+
+
+class TypeaheadIndex:
+    """
+    In-memory prefix index of the users for GET /users/search.
+    Per field, a sorted list of (key, username): a prefix is a bisect to the first key >= prefix,
+    then a walk while the keys start with it. Both a lookup and an update are a bisect
+    (plus a list insert/delete), no query to MySQL.
+    Only touched from the event loop, no locking needed.
+    """
+    def __init__(self):
+        self._users: Dict[str, UserOut] = {}
+        self._sorted: Dict[str, list] = {field: [] for field in FIELDS}
+        self.ready = False
+        self.builds = 0
+        self.last_build_ms = 0.0
+        self.lookups = 0
+        self.updates = 0
+
+    def rebuild(self, users: List[UserOut]):
+        self._users = {user.username: user for user in users}
+        sorted_keys = {field: [] for field in FIELDS}
+        for user in users:
+            for field, keys in _keys(user).items():
+                sorted_keys[field].extend((key, user.username) for key in keys)
+        for keys in sorted_keys.values():
+            keys.sort()
+        self._sorted = sorted_keys
+        self.ready = True
+        self.builds += 1
+
+    def _remove_keys(self, user: UserOut):
+        for field, keys in _keys(user).items():
+            entries = self._sorted[field]
+            for key in keys:
+                position = bisect_left(entries, (key, user.username))
+                if position < len(entries) and entries[position] == (key, user.username):
+                    del entries[position]
+
+    def upsert(self, user: UserOut):
+        if not self.ready:
+            return
+        previous = self._users.get(user.username)
+        if previous is not None:
+            self._remove_keys(previous)
+        self._users[user.username] = user
+        for field, keys in _keys(user).items():
+            for key in keys:
+                insort(self._sorted[field], (key, user.username))
+        self.updates += 1
+
+    def patch(self, username: str, **changes):
+        """ For changes that don't touch the searched fields (active, role, avatar) """
+        user = self._users.get(username)
+        if user is not None:
+            self._users[username] = user.model_copy(update=changes)
+            self.updates += 1
+
+    def remove(self, username: str):
+        if not self.ready:
+            return
+        previous = self._users.pop(username, None)
+        if previous is not None:
+            self._remove_keys(previous)
+            self.updates += 1
+
+    def search(self, prefix: str, role: Optional[Role], active: Optional[bool], limit: int) -> List[UserOut]:
+        self.lookups += 1
+        prefix = prefix.lower()
+        found: Dict[str, UserOut] = {}
+        for field in FIELDS:
+            entries = self._sorted[field]
+            position = bisect_left(entries, (prefix, ""))
+            while position < len(entries) and len(found) < limit:
+                key, username = entries[position]
+                if not key.startswith(prefix):
+                    break
+                user = self._users[username]
+                if username not in found and (role is None or user.role == role) and (active is None or user.active == active):
+                    found[username] = user
+                position += 1
+            if len(found) >= limit:
+                break
+        return list(found.values())
+
+    def stats(self) -> dict:
+        return {
+            "ready": self.ready,
+            "users": len(self._users),
+            "builds": self.builds,
+            "last_build_ms": self.last_build_ms,
+            "lookups": self.lookups,
+            "updates": self.updates,
+        }
+
+
+typeahead_index = TypeaheadIndex()
+
+
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def user_search_query(prefix: str, role: Optional[Role], active: Optional[bool], limit: int):
+    """
+    The same search in SQL, when the index isn't available: LIKE 'prefix%' on columns that
+    are indexed (ix_users_username/email/first_name/last_name), so each one is a range scan.
+    "first last" prefixes match like in the index: the first word narrows first_name (range
+    scan), the full name is checked on those rows only. Ordered like the index: username
+    matches, then name matches, then email matches (by username within each).
+    """
+    pattern = _escape_like(prefix) + "%"
+    username_match = User.username.like(pattern, escape="\\")
+    name_match = or_(User.first_name.like(pattern, escape="\\"), User.last_name.like(pattern, escape="\\"))
+    first_word, space, _ = prefix.partition(" ")
+    if space and first_word:
+        full_name = User.first_name + " " + User.last_name
+        name_match = or_(name_match, and_(
+            User.first_name.like(_escape_like(first_word) + "%", escape="\\"),
+            full_name.like(pattern, escape="\\"),
+        ))
+    email_match = User.email.like(pattern, escape="\\")
+
+    query = select(User).where(or_(username_match, name_match, email_match))
+    if role is not None:
+        query = query.where(User.role == role)
+    if active is not None:
+        query = query.where(User.active == active)
+    rank = case((username_match, 0), (name_match, 1), else_=2)
+    return query.order_by(rank, User.username).limit(limit)
+
+
+async def rebuild_typeahead_index(session_factory):
+    started = time.perf_counter()
+    # only the UserOut columns (no password hashes in memory)
+    columns = [getattr(User, field) for field in UserOut.model_fields]
+    async with session_factory() as db:
+        rows = (await db.execute(select(*columns).limit(TYPEAHEAD_MAX_USERS + 1))).mappings().all()
+    if len(rows) > TYPEAHEAD_MAX_USERS:
+        typeahead_index.ready = False
+        print(f"Warning: More than {TYPEAHEAD_MAX_USERS} users, user search uses MySQL only")
+        return
+    typeahead_index.rebuild([UserOut(**row) for row in rows])
+    typeahead_index.last_build_ms = round((time.perf_counter() - started) * 1000, 3)
+
+
+async def run_typeahead_refresh(session_factory):
+    """ Background job started by main.py """
+    while True:
+        try:
+            await rebuild_typeahead_index(session_factory)
+        except Exception as e:
+            print(f"Warning: Could not build the user search index: {e}")
+        await asyncio.sleep(TYPEAHEAD_REFRESH_SECONDS)
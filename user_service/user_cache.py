@@ -0,0 +1,82 @@
+import os
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from schemas import UserOut
+
+# --- Settings ---
+# Entries are dropped as soon as this process changes the user (activate, deactivate, role,
+# delete, avatar). The TTL bounds how stale an entry can be if the row is changed some other
+# way (another replica, a manual SQL update). 0 disables the cache.
+USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", "30"))
+USER_CACHE_MAX_ENTRIES = int(os.getenv("USER_CACHE_MAX_ENTRIES", "10000"))
+
+
+class UserCache:
+    """
+    TTL + LRU cache of username -> UserOut snapshot (role, active, profile fields).
+    Used by get_current_user and GET /users/{username}, so authenticated reads skip MySQL.
+    Snapshots are shared between requests and must not be modified.
+    """
+    def __init__(self, ttl_seconds: float, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_seconds > 0 and self.max_entries > 0
+
+    def get(self, username: str) -> Optional[UserOut]:
+        if not self.enabled:
+            return None
+        entry = self._entries.get(username)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        user, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._entries[username]
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(username)
+        self.hits += 1
+        return user
+
+    def set(self, user: UserOut):
+        if not self.enabled:
+            return
+        self._entries[user.username] = (user, time.monotonic() + self.ttl_seconds)
+        self._entries.move_to_end(user.username)
+
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, username: str):
+        self._entries.pop(username, None)
+        self.invalidations += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "ttl_seconds": self.ttl_seconds,
+            "max_entries": self.max_entries,
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+user_cache = UserCache(USER_CACHE_TTL_SECONDS, USER_CACHE_MAX_ENTRIES)